@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+MODEL_CREATOR_DIRECTORY = Path(__file__).resolve().parent
+
+# Modules imported by the tools that never run a model, none of them should pull TensorFlow in
+LIGHTWEIGHT_MODULES = [
+	"config",
+	"ganalyzer.architectures",
+	"ganalyzer.checkpoint_index",
+	"ganalyzer.run_metadata",
+	"ganalyzer.misc",
+	"sweep_training",
+	"pack_weight_store",
+	"save_stats_plot",
+	"produce_evolution_sample",
+	"reproduction_search",
+]
+
+_MEASURE_STATEMENT = """
+import resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(elapsed, peak_rss / 2 ** 20 if sys.platform == "darwin" else peak_rss / 2 ** 10, "tensorflow" in sys.modules)
+"""
+
+def measure_import(module, repeats):
+	import_seconds = []
+	process_seconds = []
+	peak_rss_mb = 0.0
+	imports_tensorflow = False
+
+	for _ in range(repeats):
+		# A fresh interpreter every time, nothing is already imported or cached in memory
+		start = time.perf_counter()
+		completed = subprocess.run([sys.executable, "-c", _MEASURE_STATEMENT.format(module = module)], cwd = MODEL_CREATOR_DIRECTORY, capture_output = True, text = True)
+		process_seconds.append(time.perf_counter() - start)
+
+		if completed.returncode != 0:
+			raise RuntimeError(f"import {module} failed :\n{completed.stderr}")
+
+		elapsed, peak_rss, tensorflow_loaded = completed.stdout.split()[-3:]
+		import_seconds.append(float(elapsed))
+		peak_rss_mb = max(peak_rss_mb, float(peak_rss))
+		imports_tensorflow = tensorflow_loaded == "True"
+
+	return {
+		"module": module,
+		"import_ms": statistics.median(import_seconds) * 1000,
+		"process_ms": statistics.median(process_seconds) * 1000,
+		"peak_rss_mb": peak_rss_mb,
+		"imports_tensorflow": imports_tensorflow,
+	}
+
+def print_results(results):
+	print(f"{'module':<32}{'import ms':>12}{'process ms':>12}{'peak MB':>10}{'tensorflow':>12}")
+	for result in results:
+		print(f"{result['module']:<32}{result['import_ms']:>12.1f}{result['process_ms']:>12.1f}{result['peak_rss_mb']:>10.0f}{str(result['imports_tensorflow']):>12}")
+
+def main():
+	parser = argparse.ArgumentParser(description = "Median import time and peak memory of the lightweight tools, each in a fresh interpreter.")
+	parser.add_argument("--modules", nargs = "+", default = LIGHTWEIGHT_MODULES)
+	parser.add_argument("--repeats", type = int, default = 5)
+	args = parser.parse_args()
+
+	results = []
+	for module in args.modules:
+		print(f"==> Importing {module} {args.repeats} times")
+		results.append(measure_import(module, args.repeats))
+
+	print()
+	print_results(results)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import argparse
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config import batch_size, latent_dimension_generator
+from ganalyzer.model_config import all_models, model_output_size
+
+def _peak_memory_mb():
+	import tensorflow as tf
+
+	gpus = tf.config.list_logical_devices("GPU")
+	if gpus:
+		return tf.config.experimental.get_memory_info(gpus[0].name)["peak"] / 2 ** 20
+
+	# Every case runs in its own process, so the peak RSS belongs to that case only (kilobytes on Linux)
+	import resource
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+def _benchmark_case(mode, precision, replicas, model_size, image_size, latent_dim, steps, warmup_steps, epoch_images):
+	# Imported here so every case starts from a fresh TensorFlow runtime in its own process
+	import tensorflow as tf
+
+	from ganalyzer.models import get_discriminator, get_generator
+	from train_model import BatchStatisticsAccumulator, build_cross_entropy, build_distribution_strategy, build_optimizers, build_train_step, configure_mixed_precision, strategy_scope
+
+	strategy = build_distribution_strategy("mirrored", cpu_replicas = replicas, gpu_replicas = replicas) if replicas > 1 else None
+
+	policy = None if precision == "float32" else precision
+	configure_mixed_precision(policy)
+
+	with strategy_scope(strategy):
+		generator = get_generator(model_size, image_size, latent_dim)
+		discriminator = get_discriminator(model_size, image_size, latent_dim)
+		generator_optimizer, discriminator_optimizer = build_optimizers(policy)
+
+	train_step = build_train_step(
+		mode,
+		latent_dim = latent_dim,
+		generator = generator,
+		discriminator = discriminator,
+		generator_optimizer = generator_optimizer,
+		discriminator_optimizer = discriminator_optimizer,
+		cross_entropy = build_cross_entropy(),
+		statistics = BatchStatisticsAccumulator(),
+		strategy = strategy,
+	)
+
+	images = tf.random.uniform([batch_size, image_size, image_size, 3], minval = -1.0, maxval = 1.0)
+	batches = tf.data.Dataset.from_tensors(images).repeat()
+	if strategy is not None:
+		batches = strategy.experimental_distribute_dataset(batches)
+	batches = iter(batches)
+
+	for _ in range(warmup_steps):
+		gen_loss, _, _, _ = train_step(next(batches))
+	float(gen_loss)
+
+	start = time.perf_counter()
+	for _ in range(steps):
+		gen_loss, _, _, _ = train_step(next(batches))
+	float(gen_loss)
+	elapsed = time.perf_counter() - start
+
+	steps_per_second = steps / elapsed
+	return {
+		"mode": mode,
+		"precision": precision,
+		"replicas": replicas,
+		"model": model_size,
+		"image_size": image_size,
+		"steps_per_second": steps_per_second,
+		"epoch_seconds": math.ceil(epoch_images / batch_size) / steps_per_second,
+		"peak_memory_mb": _peak_memory_mb(),
+	}
+
+def run_benchmark(modes, precisions, replicas_list, model_sizes, image_sizes, latent_dim, steps, warmup_steps, epoch_images):
+	results = []
+	context = multiprocessing.get_context("spawn")
+
+	for image_size in image_sizes:
+		for model_size in model_sizes:
+			for precision in precisions:
+				for mode in modes:
+					for replicas in replicas_list:
+						print(f"==> Benchmarking {model_size} at {image_size}px in {mode} mode with {precision} on {replicas} replica(s)")
+						with ProcessPoolExecutor(max_workers = 1, mp_context = context) as executor:
+							result = executor.submit(_benchmark_case, mode, precision, replicas, model_size, image_size, latent_dim, steps, warmup_steps, epoch_images).result()
+						print(f"===> {result['steps_per_second']:.2f} steps/s, epoch of {epoch_images} images in {result['epoch_seconds']:.1f} s, peak memory {result['peak_memory_mb']:.0f} MB")
+						results.append(result)
+
+	return results
+
+def print_results(results):
+	print()
+	print(f"{'model':<24}{'image size':>12}{'mode':>8}{'precision':>16}{'replicas':>10}{'steps/s':>12}{'epoch s':>12}{'peak MB':>12}")
+	for result in results:
+		print(f"{result['model']:<24}{result['image_size']:>12}{result['mode']:>8}{result['precision']:>16}{result['replicas']:>10}{result['steps_per_second']:>12.2f}{result['epoch_seconds']:>12.1f}{result['peak_memory_mb']:>12.0f}")
+
+def main():
+	parser = argparse.ArgumentParser(description = "Compare training throughput and memory across step modes, precisions and replica counts.")
+	parser.add_argument("--modes", nargs = "+", default = ["eager", "graph", "xla"])
+	parser.add_argument("--precisions", nargs = "+", default = ["float32"], choices = ["float32", "mixed_float16", "mixed_bfloat16"])
+	parser.add_argument("--replicas", nargs = "+", type = int, default = [1], help = "e.g. 1 2 4 8, more than one uses a MirroredStrategy over CPU devices or the local GPUs")
+	parser.add_argument("--models", nargs = "+", default = all_models)
+	parser.add_argument("--image-sizes", nargs = "+", type = int, default = [model_output_size])
+	parser.add_argument("--latent-dimension", type = int, default = latent_dimension_generator)
+	parser.add_argument("--steps", type = int, default = 20)
+	parser.add_argument("--warmup-steps", type = int, default = 3)
+	parser.add_argument("--epoch-images", type = int, default = 10000, help = "dataset size used to turn steps/s into an epoch time")
+	args = parser.parse_args()
+
+	results = run_benchmark(args.modes, args.precisions, args.replicas, args.models, args.image_sizes, args.latent_dimension, args.steps, args.warmup_steps, args.epoch_images)
+	print_results(results)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+
+from ganalyzer.tensor_transport import compact_array, decode_tensors, encode_tensors
+
+# (height, width, channels) of typical activations sent by /get-model-prediction
+DEFAULT_SHAPES = ["100x100x3", "100x100x16", "50x50x64", "25x25x128", "1x1x500"]
+
+def parse_shape(text):
+	return tuple(int(dim) for dim in text.split("x"))
+
+def _median_ms(function, repeats):
+	durations = []
+	for _ in range(repeats):
+		start = time.perf_counter()
+		function()
+		durations.append(time.perf_counter() - start)
+	return statistics.median(durations) * 1000
+
+def measure_shape(shape, repeats):
+	rng = np.random.default_rng(0)
+	# Generator layers are projected to 0 .. 254 and rounded, discriminator layers are sent as they are
+	activations = {
+		"generator": np.round(rng.uniform(0, 254, shape)).astype(np.float32),
+		"discriminator": rng.standard_normal(shape).astype(np.float32),
+	}
+
+	results = []
+	for which_model, activation in activations.items():
+		json_payload = json.dumps({"output_values": activation.tolist()}).encode("utf-8")
+		binary_payload = encode_tensors({"output_values": compact_array(activation, which_model)})
+
+		results.append({
+			"shape": "x".join(str(dim) for dim in shape),
+			"which_model": which_model,
+			"json_bytes": len(json_payload),
+			"binary_bytes": len(binary_payload),
+			"json_encode_ms": _median_ms(lambda: json.dumps({"output_values": activation.tolist()}), repeats),
+			"binary_encode_ms": _median_ms(lambda: encode_tensors({"output_values": compact_array(activation, which_model)}), repeats),
+			"json_decode_ms": _median_ms(lambda: np.asarray(json.loads(json_payload)["output_values"], dtype = np.float32), repeats),
+			"binary_decode_ms": _median_ms(lambda: decode_tensors(binary_payload), repeats),
+		})
+	return results
+
+def print_results(results):
+	print(f"{'shape':<14}{'model':<15}{'json KB':>10}{'binary KB':>11}{'json enc ms':>13}{'bin enc ms':>12}{'json dec ms':>13}{'bin dec ms':>12}")
+	for result in results:
+		print(
+			f"{result['shape']:<14}{result['which_model']:<15}{result['json_bytes'] / 1024:>10.1f}{result['binary_bytes'] / 1024:>11.1f}"
+			f"{result['json_encode_ms']:>13.2f}{result['binary_encode_ms']:>12.2f}{result['json_decode_ms']:>13.2f}{result['binary_decode_ms']:>12.2f}"
+		)
+
+def main():
+	parser = argparse.ArgumentParser(description = "Payload size and serialization time of the JSON and binary responses of /get-model-prediction.")
+	parser.add_argument("--shapes", nargs = "+", default = DEFAULT_SHAPES, help = "activation shapes as HxWxC")
+	parser.add_argument("--repeats", type = int, default = 20)
+	args = parser.parse_args()
+
+	results = []
+	for shape in args.shapes:
+		print(f"==> Measuring {shape}")
+		results.extend(measure_shape(parse_shape(shape), args.repeats))
+
+	print()
+	print_results(results)
+
+if __name__ == "__main__":
+	main()
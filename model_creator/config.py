@@ -1,85 +1,280 @@
 import os
+from dataclasses import dataclass, fields, replace
+from typing import Optional
 
-from ganalyzer.model_config import *
+from ganalyzer import model_config
 
 # common
 additional_dense_units = 500
 
 latent_dimension_generator_available = [49, 121, 225, 400]  # maybe 49, 100, 196, 400
-latent_dimension_generator = latent_dimension_generator_available[0]
-
-dataset_name = "humans_fifa"  # "cars_2"
-dataset_dimension = str(model_output_size)
-dataset_path = os.path.join("datasets", dataset_name, dataset_dimension)
-
-results_root_path = os.path.join("results", dataset_name)
-models_root_path = os.path.join(results_root_path, "models")
-model_path = os.path.join(models_root_path, model_name + "-ls_" + (4 - len(str(latent_dimension_generator))) * "0" + str(latent_dimension_generator)) #todo isolate in function str_ls
-models_directory = os.path.join(model_path, "models")
-
-models_as_tflite = os.path.join(results_root_path, "models_as_tf_lite")
-
-# Ensure result folders exist for the active model and the shared plots directory
-os.makedirs(models_root_path, exist_ok = True)
-os.makedirs(models_directory, exist_ok = True)
-os.makedirs(models_as_tflite, exist_ok = True)
 
 rgb_images = True
 
 # plotting
 PLOTS_DIRECTORY_NAME = "plots"
-PLOTS_ROOT_DIRECTORY = os.path.join(results_root_path, PLOTS_DIRECTORY_NAME)
-os.makedirs(PLOTS_ROOT_DIRECTORY, exist_ok = True)
-
-IMITATION_ROOT_DIRECTORY = os.path.join(results_root_path, "imitation")
-os.makedirs(IMITATION_ROOT_DIRECTORY, exist_ok = True)
-EVOLUTION_SAMPLE_ROOT_DIRECTORY = os.path.join(results_root_path, "evolution_sample")
-os.makedirs(EVOLUTION_SAMPLE_ROOT_DIRECTORY, exist_ok = True)
-
-PLOTS_HEATMAP_EPOCHS_DIRECTORY = os.path.join(PLOTS_ROOT_DIRECTORY, "heatmap_epochs")
-os.makedirs(PLOTS_HEATMAP_EPOCHS_DIRECTORY, exist_ok = True)
-PLOTS_HEATMAP_MODEL_SIZE_DIRECTORY = os.path.join(PLOTS_ROOT_DIRECTORY, "heatmap_model_size")
-os.makedirs(PLOTS_HEATMAP_MODEL_SIZE_DIRECTORY, exist_ok = True)
-PLOTS_HEATMAP_LATENT_SPACE_SIZE_DIRECTORY = os.path.join(PLOTS_ROOT_DIRECTORY, "heatmap_latent_space_size")
-os.makedirs(PLOTS_HEATMAP_LATENT_SPACE_SIZE_DIRECTORY, exist_ok = True)
-PLOTS_NUMBER_PARAMETERS_DIRECTORY = os.path.join(PLOTS_ROOT_DIRECTORY, "number_parameters")
-os.makedirs(PLOTS_NUMBER_PARAMETERS_DIRECTORY, exist_ok = True)
-
-PATH_LOSS_PLOTS = os.path.join(PLOTS_ROOT_DIRECTORY, "loss")
-os.makedirs(PATH_LOSS_PLOTS, exist_ok = True)
-
-PATH_LOSS_BY_LS_PLOTS = os.path.join(PATH_LOSS_PLOTS, "by_ls_size")
-os.makedirs(PATH_LOSS_BY_LS_PLOTS, exist_ok = True)
-PATH_LOSS_BY_MODEL_PLOTS =  os.path.join(PATH_LOSS_PLOTS, "by_model_name")
-os.makedirs(PATH_LOSS_BY_MODEL_PLOTS, exist_ok = True)
-
-RESULTS_DIRECTORY = model_path
-
-statistics_file_path = os.path.join(model_path, "statistics.csv")
 
 # train
 batch_size = 32
 save_train_epoch_every = 5
+dataset_loading_mode = "in_memory"  # "in_memory" (decode everything before training), "streaming" (tf.data, parallel decode) or "cache" (memory-mapped uint8 .npy built once next to dataset_path)
+shuffle_buffer_size = 2048  # images, only used by the streaming mode
+mixed_precision_policy = None  # None (float32), "mixed_float16" or "mixed_bfloat16", see benchmark_train_step.py --precisions
+train_step_mode = "graph"  # "eager", "graph" (tf.function) or "xla" (tf.function with jit_compile), see benchmark_train_step.py
+asynchronous_checkpointing = True  # write the .keras files and samples on a background thread
+checkpoint_queue_size = 2  # snapshots waiting to be written before training blocks
+checkpoint_storage_format = "keras"  # "keras" (full archive per epoch) or "weights" (architecture json once per run, then a .weights.npz per epoch)
+checkpoint_max_to_keep = 3  # resumable checkpoints (models, optimizers, epoch, random state) kept in training_checkpoints_directory
+number_of_epochs = int(os.environ["GANALYZER_NUMBER_OF_EPOCHS"]) if "GANALYZER_NUMBER_OF_EPOCHS" in os.environ else None  # last epoch to train and save, None trains until interrupted
+training_threads = int(os.environ["GANALYZER_TRAINING_THREADS"]) if "GANALYZER_TRAINING_THREADS" in os.environ else None  # TensorFlow intra-op threads, None lets TensorFlow decide
+training_metrics_split_step = False  # time forward/backward, optimizer apply and statistics separately in training_metrics.csv, adds a sync between them
+profiler_trace_steps = None  # e.g. (20, 30), captures a TensorFlow profiler trace for these steps counted from the launch of the training
+distribution_strategy = None  # None (single device), "mirrored" (local GPUs or number_of_cpu_replicas CPU devices) or "multi_worker_mirrored" (processes listed in TF_CONFIG)
+number_of_cpu_replicas = 1  # logical CPU devices created for "mirrored" when there is no GPU, see benchmark_train_step.py --replicas
 
 # GUI
 show_inside_values = True
 GUI_tkinter = False
 load_quantity_gui = 3#6
+model_loading_workers = 4  # checkpoints deserialized concurrently by ganalyzer.misc.get_all_models
+lazy_model_loading = True  # return handles right away, each model is waited for on its first use
+model_cache_max_parameters = 500_000_000  # parameters kept loaded by ganalyzer.model_cache (about 2 GB in float32), least recently used models are dropped first
+epoch_scrubbing = True  # one model per type whose weights are swapped on epoch changes, every saved epoch is browsable instead of load_quantity_gui of them
+scrubbing_weights_cache_mb = 1024  # weights of visited epochs kept in memory by ganalyzer.epoch_scrubber, shared by every session of the web GUI
+inference_latency_window = 1000  # last calls of each endpoint kept by ganalyzer.inference_engine for its p50 / p99 latencies
+inference_workers = 2  # forward passes of the web GUI run concurrently on this many threads, TensorFlow releases the GIL inside its ops
+inference_max_pending = 16  # requests running or waiting for an inference thread, the next ones are answered 503
+inference_timeout_seconds = 30
+sync_workers = 2  # threads loading the models of /sync-server and the epoch weights of /change-epoch, apart from the inference threads so a slow load never holds one
+sync_max_pending = 16
+sync_timeout_seconds = 300
+max_sessions = 8  # client sessions of the web GUI kept, least recently used first dropped, the models are shared per run and a session only holds its selected epochs
+web_server_threads = 8  # request threads of waitress, see serve_web_GUI.py
+micro_batching = True  # predictions of any session for the same checkpoint (run, model type, epoch) and layers arriving together run as one batch, see ganalyzer.micro_batcher
+micro_batching_max_batch_size = 8
+micro_batching_max_wait_ms = 5  # how long the first request of a batch waits for others, only while a batch of the same key is running
 
 # statistics
-all_models = [
-	entry
-	for entry in sorted(os.listdir(models_root_path))
-	if os.path.isdir(os.path.join(models_root_path, entry))
-]
-
-every_models_statistics_path = [
-	os.path.join(models_root_path, entry) for entry in all_models
-]
-
 nb_epoch_taken_comparison = 5
 nb_comparisons = 100
 
-# Sample outputs
-sample_outputs_root_directory = os.path.join(model_path, "sample_outputs")
-os.makedirs(sample_outputs_root_directory, exist_ok = True)
\ No newline at end of file
+@dataclass(frozen = True)
+class Settings:
+	"""The selected run and every path derived from it, nothing is created or listed until it is asked for."""
+
+	model_name: str = model_config.model_name
+	latent_dimension_generator: int = latent_dimension_generator_available[0]
+	dataset_name: str = "humans_fifa"  # "cars_2"
+	image_size: int = model_config.model_output_size
+	results_directory: str = "results"
+	datasets_directory: str = "datasets"
+
+	@classmethod
+	def from_environment(cls, environment = None):
+		"""Lets a worker process (see sweep_training.py) pick its run without editing this file."""
+		environment = os.environ if environment is None else environment
+		defaults = cls()
+		overrides = {
+			name: type(getattr(defaults, name))(environment[variable])
+			for name, variable in _ENVIRONMENT_VARIABLES.items()
+			if variable in environment
+		}
+		return replace(defaults, **overrides)
+
+	def replace(self, **overrides):
+		return replace(self, **overrides)
+
+	def for_run(self, model_name, latent_dimension):
+		return replace(self, model_name = model_name, latent_dimension_generator = int(latent_dimension))
+
+	@property
+	def dataset_dimension(self):
+		return str(self.image_size)
+
+	@property
+	def dataset_path(self):
+		return os.path.join(self.datasets_directory, self.dataset_name, self.dataset_dimension)
+
+	@property
+	def results_root_path(self):
+		return os.path.join(self.results_directory, self.dataset_name)
+
+	@property
+	def models_root_path(self):
+		return os.path.join(self.results_root_path, "models")
+
+	@property
+	def run_name(self):
+		return f"{self.model_name}-ls_{self.latent_dimension_generator:04d}"
+
+	@property
+	def model_path(self):
+		return os.path.join(self.models_root_path, self.run_name)
+
+	@property
+	def models_directory(self):
+		return os.path.join(self.model_path, "models")
+
+	@property
+	def models_as_tflite(self):
+		return os.path.join(self.results_root_path, "models_as_tf_lite")
+
+	@property
+	def plots_root_directory(self):
+		return os.path.join(self.results_root_path, PLOTS_DIRECTORY_NAME)
+
+	@property
+	def imitation_root_directory(self):
+		return os.path.join(self.results_root_path, "imitation")
+
+	@property
+	def evolution_sample_root_directory(self):
+		return os.path.join(self.results_root_path, "evolution_sample")
+
+	@property
+	def plots_heatmap_epochs_directory(self):
+		return os.path.join(self.plots_root_directory, "heatmap_epochs")
+
+	@property
+	def plots_heatmap_model_size_directory(self):
+		return os.path.join(self.plots_root_directory, "heatmap_model_size")
+
+	@property
+	def plots_heatmap_latent_space_size_directory(self):
+		return os.path.join(self.plots_root_directory, "heatmap_latent_space_size")
+
+	@property
+	def plots_number_parameters_directory(self):
+		return os.path.join(self.plots_root_directory, "number_parameters")
+
+	@property
+	def loss_plots_directory(self):
+		return os.path.join(self.plots_root_directory, "loss")
+
+	@property
+	def loss_by_ls_plots_directory(self):
+		return os.path.join(self.loss_plots_directory, "by_ls_size")
+
+	@property
+	def loss_by_model_plots_directory(self):
+		return os.path.join(self.loss_plots_directory, "by_model_name")
+
+	@property
+	def statistics_file_path(self):
+		return os.path.join(self.model_path, "statistics.csv")
+
+	@property
+	def training_checkpoints_directory(self):
+		return os.path.join(self.model_path, "checkpoints")
+
+	@property
+	def training_metrics_file_path(self):
+		return os.path.join(self.model_path, "training_metrics.csv")
+
+	@property
+	def profiler_trace_directory(self):
+		return os.path.join(self.model_path, "profiler")
+
+	@property
+	def sample_outputs_root_directory(self):
+		return os.path.join(self.model_path, "sample_outputs")
+
+	@property
+	def trained_runs(self):
+		"""Run directories found in models_root_path, listed on every access."""
+		if not os.path.isdir(self.models_root_path):
+			return []
+
+		return [
+			entry
+			for entry in sorted(os.listdir(self.models_root_path))
+			if os.path.isdir(os.path.join(self.models_root_path, entry))
+		]
+
+	@property
+	def every_models_statistics_path(self):
+		return [os.path.join(self.models_root_path, entry) for entry in self.trained_runs]
+
+_ENVIRONMENT_VARIABLES = {
+	"model_name": "GANALYZER_MODEL_NAME",
+	"latent_dimension_generator": "GANALYZER_LATENT_DIMENSION",
+	"dataset_name": "GANALYZER_DATASET_NAME",
+	"image_size": "GANALYZER_IMAGE_SIZE",
+	"results_directory": "GANALYZER_RESULTS_DIRECTORY",
+}
+
+# Module attributes resolved from the settings on first access, "from config import models_directory" keeps working
+_SETTINGS_ATTRIBUTES = {
+	"model_name": "model_name",
+	"latent_dimension_generator": "latent_dimension_generator",
+	"dataset_name": "dataset_name",
+	"dataset_dimension": "dataset_dimension",
+	"dataset_path": "dataset_path",
+	"results_root_path": "results_root_path",
+	"models_root_path": "models_root_path",
+	"model_path": "model_path",
+	"RESULTS_DIRECTORY": "model_path",
+	"models_directory": "models_directory",
+	"models_as_tflite": "models_as_tflite",
+	"PLOTS_ROOT_DIRECTORY": "plots_root_directory",
+	"IMITATION_ROOT_DIRECTORY": "imitation_root_directory",
+	"EVOLUTION_SAMPLE_ROOT_DIRECTORY": "evolution_sample_root_directory",
+	"PLOTS_HEATMAP_EPOCHS_DIRECTORY": "plots_heatmap_epochs_directory",
+	"PLOTS_HEATMAP_MODEL_SIZE_DIRECTORY": "plots_heatmap_model_size_directory",
+	"PLOTS_HEATMAP_LATENT_SPACE_SIZE_DIRECTORY": "plots_heatmap_latent_space_size_directory",
+	"PLOTS_NUMBER_PARAMETERS_DIRECTORY": "plots_number_parameters_directory",
+	"PATH_LOSS_PLOTS": "loss_plots_directory",
+	"PATH_LOSS_BY_LS_PLOTS": "loss_by_ls_plots_directory",
+	"PATH_LOSS_BY_MODEL_PLOTS": "loss_by_model_plots_directory",
+	"statistics_file_path": "statistics_file_path",
+	"training_checkpoints_directory": "training_checkpoints_directory",
+	"training_metrics_file_path": "training_metrics_file_path",
+	"profiler_trace_directory": "profiler_trace_directory",
+	"sample_outputs_root_directory": "sample_outputs_root_directory",
+	"all_models": "trained_runs",
+	"every_models_statistics_path": "every_models_statistics_path",
+}
+
+_settings: Optional[Settings] = None
+
+def get_settings() -> Settings:
+	global _settings
+	if _settings is None:
+		_settings = Settings.from_environment()
+	return _settings
+
+def configure(**overrides) -> Settings:
+	"""Changes the settings of the process.
+
+	The ganalyzer modules and the scripts read the run settings through get_settings() when they are used, so the
+	overrides reach them whenever configure is called. Only a value bound by "from config import models_directory"
+	keeps the settings of the moment it was imported, use get_settings() outside of the constants.
+	"""
+	global _settings
+	_settings = get_settings().replace(**overrides)
+	return _settings
+
+def add_settings_arguments(parser):
+	group = parser.add_argument_group("run selection, defaults to the GANALYZER_* environment variables then config.py")
+	group.add_argument("--model-name", dest = "model_name")
+	group.add_argument("--latent-dimension", dest = "latent_dimension_generator", type = int)
+	group.add_argument("--dataset-name", dest = "dataset_name")
+	group.add_argument("--image-size", dest = "image_size", type = int)
+	group.add_argument("--results-directory", dest = "results_directory")
+
+def configure_from_arguments(arguments) -> Settings:
+	overrides = {
+		settings_field.name: getattr(arguments, settings_field.name)
+		for settings_field in fields(Settings)
+		if getattr(arguments, settings_field.name, None) is not None
+	}
+	return configure(**overrides)
+
+def ensure_directories(*paths):
+	for path in paths:
+		os.makedirs(path, exist_ok = True)
+
+def __getattr__(name):
+	if name in _SETTINGS_ATTRIBUTES:
+		return getattr(get_settings(), _SETTINGS_ATTRIBUTES[name])
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,15 +1,13 @@
 from __future__ import annotations
 
+import argparse
 from pathlib import Path
 from typing import Iterable, Tuple
 
 import tensorflow as tf
 
-from config import models_as_tflite, models_directory
-from ganalyzer.misc import get_list_of_keras_models
-
-def _load_model(model_path):
-	return tf.keras.models.load_model(str(model_path), compile = False)
+from config import add_settings_arguments, configure_from_arguments, get_settings
+from ganalyzer.misc import get_list_of_keras_models, load_model
 
 def _build_concrete_function(model):
 	input_specs = [tf.TensorSpec(shape = [dim if dim is not None else 1 for dim in tensor.shape], dtype = tensor.dtype) for tensor in model.inputs]
@@ -29,7 +27,8 @@ def _configure_converter(concrete_fn, model):
 	return converter
 
 def export_tflite(model_path_keras, model_path_tflite):
-	model = _load_model(model_path_keras)
+	# Converted once, the model is not kept in the cache of the process
+	model = load_model(model_path_keras, cached = False)
 	concrete_function = _build_concrete_function(model)
 	converter = _configure_converter(concrete_function, model)
 	tflite_model = converter.convert()
@@ -41,9 +40,10 @@ def export_tflite(model_path_keras, model_path_tflite):
 def _default_models():
 	last_generator = None
 	last_discriminator = None
+	settings = get_settings()
 
 	for model_name in get_list_of_keras_models():
-		model_path = Path(models_directory) / model_name
+		model_path = Path(settings.models_directory) / model_name
 		if model_name.startswith("discriminator"):
 			last_discriminator = model_path
 		elif model_name.startswith("generator"):
@@ -51,12 +51,16 @@ def _default_models():
 
 	results = []
 	if last_generator is not None:
-		results.append((last_generator, Path(models_as_tflite) / "generator.tflite"))
+		results.append((last_generator, Path(settings.models_as_tflite) / "generator.tflite"))
 	if last_discriminator is not None:
-		results.append((last_discriminator, Path(models_as_tflite) / "discriminator.tflite"))
+		results.append((last_discriminator, Path(settings.models_as_tflite) / "discriminator.tflite"))
 	return results
 
 def main():
+	parser = argparse.ArgumentParser(description = "Convert the latest generator and discriminator of the configured run to TFLite.")
+	add_settings_arguments(parser)
+	configure_from_arguments(parser.parse_args())
+
 	for source, target in _default_models():
 		print(f"Converting {source} -> {target}")
 		export_tflite(source, target)
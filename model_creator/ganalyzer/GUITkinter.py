@@ -7,7 +7,7 @@ import copy
 
 from ganalyzer.ModelViewer import ModelViewer
 from ganalyzer.misc import project_array
-from config import latent_dimension_generator, model_name, rgb_images
+from config import get_settings, rgb_images
 import numpy as np
 
 class GUITkinter:
@@ -53,7 +53,7 @@ class GUITkinter:
 		title_input_hint = tk.Label(self.root, text = "Input", bg = "#666666")
 		title_input_hint.grid(row = 0, column = 0, columnspan = self.n_col, sticky = "we")
 
-		self.input_image_grid_size = int(latent_dimension_generator ** 0.5)
+		self.input_image_grid_size = int(get_settings().latent_dimension_generator ** 0.5)
 		self.max_slider_value = 5
 
 		notebook = ttk.Notebook(self.root)
@@ -121,9 +121,9 @@ class GUITkinter:
 		self.generator_viewer.current_input = np.array([input_raw])
 
 		if rgb_images:
-			predicted_raw = self.generator_viewer.current_model(self.generator_viewer.current_input, training = False)[0, :, :, :]
+			predicted_raw = self.generator_viewer.run_model(self.generator_viewer.current_input)[0, :, :, :]
 		else:
-			predicted_raw = self.generator_viewer.current_model(self.generator_viewer.current_input)[0, :, :, 0]
+			predicted_raw = self.generator_viewer.run_model(self.generator_viewer.current_input)[0, :, :, 0]
 
 		return np.round(project_array(predicted_raw, 254, -1, 1)).astype(np.uint8)
 
@@ -159,10 +159,11 @@ class GUITkinter:
 	def _refresh_prediction_discriminator(self):
 		self.discriminator_viewer.current_input = np.array([((self.generated_image - 127.5) / 127.5).astype(np.float64)])
 		predicted_output = 0
+		model_name = get_settings().model_name
 		if model_name in {"test_0", "test_0B"}:
-			predicted_output = self.discriminator_viewer.current_model.predict(self.discriminator_viewer.current_input)[0][0]
+			predicted_output = self.discriminator_viewer.run_model(self.discriminator_viewer.current_input)[0][0]
 		elif model_name == "test_1":
-			predicted_output = self.discriminator_viewer.current_model.predict(self.discriminator_viewer.current_input)[0][0][0][0]
+			predicted_output = self.discriminator_viewer.run_model(self.discriminator_viewer.current_input)[0][0][0][0]
 		self.discriminator_viewer.image_output_data.config(text = "Prediction : " + str(round(predicted_output, 2)))
 
 	def randomize_all_sliders(self, mu, sigma):
@@ -1,27 +1,36 @@
 import os
+import struct
+import threading
 import time
+import uuid
+from functools import partial
+
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 import config
-from ganalyzer.misc import get_all_models, get_available_epochs, project_array
-from flask import Flask, jsonify, request
+from ganalyzer.checkpoint_index import MODEL_TYPES
+from ganalyzer.epoch_scrubber import EpochScrubber, get_weights_cache
+from ganalyzer.misc import get_all_models, get_available_epochs, model_directory_for, project_array
+from ganalyzer.model_cache import get_model_cache
+from ganalyzer.inference_engine import get_latency_tracker
+from ganalyzer.micro_batcher import MicroBatcher
+from ganalyzer.served_models import LoadedRun, ScrubbedRun, get_closest_model_loaded_index
+from ganalyzer.serving import BoundedExecutor, InvalidRequest, ServerBusy, SessionStore, SharedRegistry
+from ganalyzer.tensor_transport import BINARY_MIMETYPE, compact_array, decode_tensors, encode_tensors
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 import numpy as np
-import tensorflow as tf
 
 def _configure_model_paths(model_name, latent_space_size):
-	config.model_name = model_name
-	config.latent_dimension_generator = latent_space_size
-	config.model_path = os.path.join(
-		config.models_root_path,
-		f"{model_name}-ls_{latent_space_size:04d}",
-	)
-	config.models_directory = os.path.join(config.model_path, "models")
-	os.makedirs(config.models_directory, exist_ok = True)
+	# The settings of the process are left untouched, sessions of the server look at different runs at the same time
+	models_dir = model_directory_for(model_name, latent_space_size)
+	config.ensure_directories(models_dir)
+	return models_dir
 
 def get_models_generator_and_discriminator(model_name, latent_space_size):  # TOdo : remove code duplication
-	_configure_model_paths(model_name, latent_space_size)
+	models_dir = _configure_model_paths(model_name, latent_space_size)
 
-	available_epochs = get_available_epochs(config.models_directory)
+	available_epochs = get_available_epochs(models_dir)
 	generators_list = get_all_models(
 		model_type = "generator",
 		available_epochs = available_epochs,
@@ -36,61 +45,55 @@ def get_models_generator_and_discriminator(model_name, latent_space_size):  # TO
 	)
 	return generators_list, discriminators_list
 
-def get_closest_model_loaded_index(model_index, models_list):
-	models_quantity = len(models_list)
-	if 0 <= model_index < models_quantity and models_list[model_index]:
-		return model_index
+def get_epoch_scrubbers(model_name, latent_space_size):
+	models_dir = _configure_model_paths(model_name, latent_space_size)
+	return EpochScrubber("generator", models_dir), EpochScrubber("discriminator", models_dir)
 
-	lower = model_index - 1
-	upper = model_index + 1
-	while lower >= 0 or upper < models_quantity:
-		if lower >= 0 and models_list[lower]:
-			return lower
-		if upper < models_quantity and models_list[upper]:
-			return upper
-		lower -= 1
-		upper += 1
+def get_layer_index(layer_name):
+	return int(layer_name.split(")")[0])
 
-	raise ValueError("No models available in the provided list.")
+def parse_model_input(vector, which_model):
+	"""Batch of one input from the nested lists sent by the JSON clients."""
+	if which_model == "generator":
+		return np.array([vector[0][0]]).astype(np.float32)
+	if which_model == "discriminator":
+		return np.array([np.array(vector).astype(np.float64)])
+	raise ValueError("Unknown model type.")
 
-def get_value_at_given_layer(generators_list, discriminators_list, current_generator_index, current_discriminator_index, vector, layer_name, which_model):
-	layer_index = int(layer_name.split(")")[0])
-	# print("===*****************", vector, layer_name, which_model, " l_index:", layer_index)
+def get_batch_layers_arrays(extractor, inputs, layer_names, which_model):
+	"""Outputs of every layer of layer_names for the whole batch of inputs, computed by a single forward pass of the extractor of the model."""
+	layer_indexes = [get_layer_index(layer_name) for layer_name in layer_names]
 
 	if which_model == "generator":
-		model = generators_list[current_generator_index]
-		intermediate = tf.keras.Model(inputs = model.inputs, outputs = model.layers[layer_index].output)
+		return [np.round(project_array(layer_output, 254, -1, 1)) for layer_output in extractor(inputs, layer_indexes)]
 
-		inpt = np.array([vector[0][0]]).astype(np.float32)  # todo isolate in a function
+	if which_model == "discriminator":
+		return extractor(inputs, layer_indexes)
 
-		layer_output = np.round(project_array(intermediate.predict(inpt), 254, -1, 1)).tolist()[0]
+	raise ValueError("Unknown model type.")
 
-	elif which_model == "discriminator":
-		model = discriminators_list[current_discriminator_index]
-		intermediate = tf.keras.Model(inputs = model.inputs, outputs = model.layers[layer_index].output)
+def get_layers_arrays(extractor, inputs, layer_names, which_model):
+	"""Outputs of the first input of the batch as 3 dimensional arrays."""
+	return [as_three_dimensions(layer_output[0]) for layer_output in get_batch_layers_arrays(extractor, inputs, layer_names, which_model)]
 
-		inpt = np.array([np.array(vector).astype(np.float64)])  # todo isolate in function
+def get_values_at_given_layers(extractor, vector, layer_names, which_model):
+	inputs = parse_model_input(vector, which_model)
+	return [layer_output.tolist() for layer_output in get_layers_arrays(extractor, inputs, layer_names, which_model)]
 
-		layer_output = intermediate.predict(inpt).tolist()[0]
+def get_value_at_given_layer(extractor, vector, layer_name, which_model):
+	return get_values_at_given_layers(extractor, vector, [layer_name], which_model)[0]
 
-	else:
-		raise ValueError("Unknown model type.")
-
-	ndim = len(shape(layer_output))
-	if ndim == 1:
-		layer_output = [[layer_output]]
-	elif ndim == 2:
-		layer_output = [layer_output]
-	elif ndim == 3:
-		pass
-	else:
-		raise ValueError("number dim unknown")
-	return layer_output
+def as_three_dimensions(layer_output):
+	if layer_output.ndim == 1:
+		return layer_output[np.newaxis, np.newaxis]
+	if layer_output.ndim == 2:
+		return layer_output[np.newaxis]
+	if layer_output.ndim == 3:
+		return layer_output
+	raise ValueError("number dim unknown")
 
-def shape(mat):
-	if not isinstance(mat, list):
-		return ()
-	return (len(mat),) + shape(mat[0]) if mat else (0,)
+def wants_binary_response():
+	return request.args.get("format") == "binary" or request.accept_mimetypes.best == BINARY_MIMETYPE
 
 def get_layers_list(model):
 	list_layers = model.layers
@@ -99,76 +102,266 @@ def get_layers_list(model):
 		result.append(str(i) + ") " + list_layers[i].name)
 	return result
 
-class GUIWebPage(object):
-	def __init__(self):
-		self.generators_list = None
-		self.discriminators_list = None
-
-		self.current_generator_index = -1
-		self.current_discriminator_index = -1
-
-		app = Flask(__name__)
-		CORS(app)
-
-		@app.route("/sync-server", methods = ["POST"])
-		def synchronize_server_with_client():
-			print("sync server")
-			data = request.get_json()
-
-			model_size_synced = str(data.get("model_size", []))
-			latent_space_size_synced = int(data.get("latent_space_size", []))
-			latent_space_size_synced_str = "-ls_" + (4 - len(str(latent_space_size_synced))) * "0" + str(latent_space_size_synced)
-
-			t0 = time.time()
-			self.generators_list, self.discriminators_list = get_models_generator_and_discriminator(model_size_synced, latent_space_size_synced)
-			t1 = time.time()
-			models_quantity = len(self.generators_list)
-			print("==> Time taken to load : ", round(t1 - t0, 2))
-			print("==> Number of loaded models : ", models_quantity)
-
-			print('====> synced with data', model_size_synced, latent_space_size_synced_str)
-
-			return jsonify({
-				"discriminator_layers": get_layers_list(self.discriminators_list[0]),
-				"generator_layers": get_layers_list(self.generators_list[0]),
-				"number_of_models": models_quantity,
-			})
-
-		@app.route("/get-model-prediction", methods = ["POST"])
-		def get_model_prediction():
+DEFAULT_SESSION_ID = "default"
 
-			data = request.get_json()
+def build_served_run(run_key):
+	"""Shared models of one model type of a run, run_key is (model_name, latent_space_size, model_type)."""
+	model_name, latent_space_size, model_type = run_key
+	models_dir = _configure_model_paths(model_name, latent_space_size)
+	if config.epoch_scrubbing:
+		return ScrubbedRun(model_type, models_dir)
 
-			vector = data.get("input_data", [])
-			layer_name = data.get("layer_name", [])
-			which_model = data.get("which_model", [])
-
-			output_values = get_value_at_given_layer(self.generators_list, self.discriminators_list, self.current_generator_index, self.current_discriminator_index, vector, layer_name, which_model)
-
-			#print('*********\n\n shape input',which_model, shape(vector), "shape output", shape(output_values))
-			return jsonify({"output_values": output_values})
-
-		@app.route("/change-epoch", methods = ["POST"])  # todo merge both change epoch in one endpoint
-		def change_epoch():
-			print("change epoch")
-			data = request.get_json()
-
-			epoch_to_look = int(data.get("new_epoch", []))
-			which_model = data.get("which_model", [])
-
-			if which_model == "generator":
-				epoch_found = get_closest_model_loaded_index(epoch_to_look, self.generators_list)
-				self.current_generator_index = epoch_found
-
-			elif which_model == "discriminator":
-				epoch_found = get_closest_model_loaded_index(epoch_to_look, self.discriminators_list)
-				self.current_discriminator_index = epoch_found
-
-			else:
-				epoch_found = 0
-				print("error 403", which_model)
-
-			print('==> change epoch : ', which_model, epoch_to_look, " ( ", epoch_found, ")")
-			return jsonify({"new_epoch_found": epoch_found})
+	models_list = get_all_models(
+		model_type = model_type,
+		available_epochs = get_available_epochs(models_dir),
+		model_name = model_name,
+		latent_space_size = latent_space_size,
+	)
+	return LoadedRun(models_list)
+
+def run_served_model(served_run, saved_epoch, which_model, inputs, layer_names):
+	"""Outputs of layer_names for the batch of inputs, on the model served_run shares between the sessions."""
+	with get_latency_tracker().measure("inference_" + which_model):
+		return get_batch_layers_arrays(partial(served_run, saved_epoch), inputs, layer_names, which_model)
+
+class SessionState(object):
+	"""Run and saved epochs selected by one client.
+
+	The models are shared by every session on the same run (see build_served_run), a session only keeps
+	the epoch it selected for each model type. The lock only guards these fields, never a forward pass.
+	"""
+
+	def __init__(self, served_runs: SharedRegistry):
+		self.served_runs = served_runs
+		self.run_keys = {}
+		self.served = {}
+		self.epochs = {}
+		self.lock = threading.Lock()
+
+	def sync(self, model_size, latent_space_size):
+		run_keys = {model_type: (model_size, latent_space_size, model_type) for model_type in MODEL_TYPES}
+		served = {}
+		try:
+			for model_type, run_key in run_keys.items():
+				served[model_type] = self.served_runs.acquire(run_key)
+		except BaseException:
+			for model_type in served:
+				self.served_runs.release(run_keys[model_type])
+			raise
+
+		with self.lock:
+			previous_run_keys = self.run_keys
+			self.run_keys = run_keys
+			self.served = served
+			self.epochs = {model_type: served_run.latest_epoch for model_type, served_run in served.items()}
+
+		for run_key in previous_run_keys.values():
+			self.served_runs.release(run_key)
+
+	def change_epoch(self, which_model, epoch_to_look):
+		served_run, _, _ = self.current(which_model)
+		# The weights of that epoch are read here, without the lock of the session
+		epoch_found = served_run.resolve(epoch_to_look)
+
+		with self.lock:
+			# A sync to another run since then wins
+			if self.served.get(which_model) is served_run:
+				self.epochs[which_model] = epoch_found
+		return epoch_found
+
+	def current(self, which_model):
+		"""Shared run, its key in the registry and the saved epoch currently selected for which_model."""
+		with self.lock:
+			if which_model not in self.served:
+				raise InvalidRequest("Session not synced, call /sync-server first.")
+			return self.served[which_model], self.run_keys[which_model], self.epochs[which_model]
+
+	def close(self):
+		with self.lock:
+			run_keys = self.run_keys
+			self.run_keys, self.served, self.epochs = {}, {}, {}
+
+		for run_key in run_keys.values():
+			self.served_runs.release(run_key)
+
+def parse_prediction_request():
+	"""which_model, layer names and batch of one input of a /get-model-prediction request, InvalidRequest if any is missing or malformed."""
+	# Binary clients send the input as an encoded tensor named input_data (one sample, no batch dimension), the rest in the query string
+	if request.mimetype == BINARY_MIMETYPE:
+		data = request.args
+		layer_names = data.getlist("layer_name")
+	else:
+		data = request.get_json(silent = True)
+		if not isinstance(data, dict):
+			raise InvalidRequest("Expected a JSON object or a binary payload.")
+		layer_names = data.get("layer_names") or ([data["layer_name"]] if data.get("layer_name") else [])
+
+	which_model = data.get("which_model")
+	if which_model not in MODEL_TYPES:
+		raise InvalidRequest(f"Unknown which_model {which_model!r}, expected one of {MODEL_TYPES}.")
+	if not layer_names or not all(isinstance(layer_name, str) for layer_name in layer_names):
+		raise InvalidRequest("No layer_name given.")
+
+	try:
+		if request.mimetype == BINARY_MIMETYPE:
+			inputs = decode_tensors(request.get_data())["input_data"][np.newaxis]
+		else:
+			inputs = parse_model_input(data.get("input_data", []), which_model)
+	except (KeyError, IndexError, TypeError, ValueError, struct.error) as error:
+		raise InvalidRequest(f"Malformed input_data : {error}") from error
+
+	return data, which_model, layer_names, inputs
+
+def get_session_id(data = None):
+	"""X-Session-Id header, then session_id in the query string or the JSON body, clients sending none share one session."""
+	session_id = request.headers.get("X-Session-Id") or request.args.get("session_id")
+	if not session_id and data is not None and hasattr(data, "get"):
+		session_id = data.get("session_id")
+	return str(session_id or DEFAULT_SESSION_ID)
+
+def create_app(executor = None, sessions = None, batcher = None, sync_executor = None, served_runs = None):
+	"""The endpoints of the web GUI, served by app.run for development or by any WSGI server (see wsgi.py)."""
+	executor = executor or BoundedExecutor(config.inference_workers, config.inference_max_pending)
+	sync_executor = sync_executor or BoundedExecutor(config.sync_workers, config.sync_max_pending, thread_name_prefix = "sync")
+	served_runs = served_runs or SharedRegistry(build_served_run)
+	sessions = sessions or SessionStore(lambda: SessionState(served_runs), config.max_sessions)
+	if batcher is None and config.micro_batching:
+		batcher = MicroBatcher(config.micro_batching_max_batch_size, config.micro_batching_max_wait_ms)
+
+	app = Flask(__name__)
+	CORS(app)
+
+	def run_bounded(function, *args):
+		# Models are only used on the executor threads, a full executor answers 503 instead of queueing without limit
+		return executor.run(function, *args, timeout = config.inference_timeout_seconds)
+
+	@app.errorhandler(InvalidRequest)
+	def invalid_request(error):
+		response = jsonify({"error": str(error)})
+		response.status_code = 400
+		return response
+
+	@app.errorhandler(ServerBusy)
+	@app.errorhandler(FutureTimeoutError)
+	def server_busy(error):
+		# A timed out task keeps its executor slot until it ends, the client retries like for a full executor
+		response = jsonify({"error": str(error) or f"{type(error).__name__}, the server is too busy"})
+		response.status_code = 503
+		response.headers["Retry-After"] = "1"
+		return response
+
+	@app.before_request
+	def start_latency_measure():
+		g.request_start = time.perf_counter()
+
+	@app.after_request
+	def record_latency(response):
+		if request.endpoint is not None and "request_start" in g:
+			get_latency_tracker().record(request.endpoint, time.perf_counter() - g.request_start)
+		return response
+
+	@app.route("/latency", methods = ["GET"])
+	def latency():
+		# p50 / p99 of each endpoint, and of the forward passes alone under inference_<model type>
+		return jsonify(get_latency_tracker().summary())
+
+	@app.route("/server-stats", methods = ["GET"])
+	def server_stats():
+		return jsonify({
+			"executor": executor.stats(),
+			"sync_executor": sync_executor.stats(),
+			"sessions": sessions.stats(),
+			"served_runs": served_runs.stats(),
+			"model_cache": get_model_cache().stats(),
+			"scrubbing_weights_cache": get_weights_cache().stats() if config.epoch_scrubbing else None,
+			"micro_batching": batcher.stats() if batcher is not None else None,
+		})
+
+	@app.route("/new-session", methods = ["POST"])
+	def new_session():
+		return jsonify({"session_id": uuid.uuid4().hex})
+
+	@app.route("/sync-server", methods = ["POST"])
+	def synchronize_server_with_client():
+		print("sync server")
+		data = request.get_json()
+		session_id = get_session_id(data)
+		session = sessions.get(session_id)
+
+		model_size_synced = str(data.get("model_size", []))
+		latent_space_size_synced = int(data.get("latent_space_size", []))
+		latent_space_size_synced_str = "-ls_" + (4 - len(str(latent_space_size_synced))) * "0" + str(latent_space_size_synced)
+
+		t0 = time.time()
+		# Loading a run takes far longer than a forward pass, it has its own threads and timeout
+		sync_executor.run(session.sync, model_size_synced, latent_space_size_synced, timeout = config.sync_timeout_seconds)
+		t1 = time.time()
+		generator_run, _, _ = session.current("generator")
+		discriminator_run, _, _ = session.current("discriminator")
+		models_quantity = generator_run.epochs_quantity
+		print("==> Time taken to load : ", round(t1 - t0, 2))
+		print("==> Number of loaded models : ", models_quantity)
+		print("==> Model cache : ", get_model_cache().stats())
+		print("==> Served runs : ", served_runs.stats())
+
+		print('====> synced with data', model_size_synced, latent_space_size_synced_str, "session", session_id)
+
+		return jsonify({
+			"discriminator_layers": discriminator_run.layer_names,
+			"generator_layers": generator_run.layer_names,
+			"number_of_models": models_quantity,
+		})
+
+	@app.route("/get-model-prediction", methods = ["POST"])
+	def get_model_prediction():
+		data, which_model, layer_names, inputs = parse_prediction_request()
+
+		# Several layers of the same input can be asked at once, they share one forward pass
+		session = sessions.get(get_session_id(data))
+		served_run, run_key, saved_epoch = session.current(which_model)
+		unknown_layer_names = [layer_name for layer_name in layer_names if layer_name not in served_run.layer_names]
+		if unknown_layer_names:
+			raise InvalidRequest(f"Unknown layers {unknown_layer_names} for the {which_model}.")
+		if inputs.shape[1:] != served_run.sample_shape:
+			raise InvalidRequest(f"input_data of shape {inputs.shape[1:]}, the {which_model} expects {served_run.sample_shape}.")
+
+		if batcher is None:
+			batch_outputs = run_bounded(run_served_model, served_run, saved_epoch, which_model, inputs, layer_names)
+		else:
+			# Keyed by checkpoint, every session on the same run, model type, saved epoch and layers shares the batch,
+			# which runs on the shared model of the run without any session lock
+			key = run_key + (saved_epoch, tuple(layer_names))
+			batch_outputs = batcher.run(key, lambda batch: run_bounded(run_served_model, served_run, saved_epoch, which_model, batch, layer_names), inputs, timeout = config.inference_timeout_seconds)
+		layers_arrays = [as_three_dimensions(layer_output[0]) for layer_output in batch_outputs]
+
+		if wants_binary_response():
+			payload = encode_tensors({layer_name: compact_array(layer_array, which_model) for layer_name, layer_array in zip(layer_names, layers_arrays)})
+			return Response(payload, mimetype = BINARY_MIMETYPE)
+
+		if "layer_names" in data:
+			return jsonify({"outputs_values": {layer_name: layer_array.tolist() for layer_name, layer_array in zip(layer_names, layers_arrays)}})
+		return jsonify({"output_values": layers_arrays[0].tolist()})
+
+	@app.route("/change-epoch", methods = ["POST"])  # todo merge both change epoch in one endpoint
+	def change_epoch():
+		print("change epoch")
+		data = request.get_json()
+
+		epoch_to_look = int(data.get("new_epoch", []))
+		which_model = data.get("which_model", [])
+		if which_model not in MODEL_TYPES:
+			raise InvalidRequest(f"Unknown which_model {which_model!r}, expected one of {MODEL_TYPES}.")
+
+		session = sessions.get(get_session_id(data))
+		# Reading the weights of an epoch not visited yet is a disk load, it never holds an inference thread
+		epoch_found = sync_executor.run(session.change_epoch, which_model, epoch_to_look, timeout = config.sync_timeout_seconds)
+
+		print('==> change epoch : ', which_model, epoch_to_look, " ( ", epoch_found, ")")
+		return jsonify({"new_epoch_found": epoch_found})
+
+	return app
 
-		app.run(debug = True)
+class GUIWebPage(object):
+	def __init__(self):
+		self.app = create_app()
+		self.app.run(debug = True)
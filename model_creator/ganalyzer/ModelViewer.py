@@ -6,7 +6,10 @@ from tkinter import ttk
 
 import numpy as np
 from PIL import Image, ImageTk
-import tensorflow as tf
+
+from ganalyzer.epoch_scrubber import EpochScrubber
+from ganalyzer.feature_extractor import FeatureExtractorCache
+from ganalyzer.inference_engine import get_latency_tracker
 
 logger = logging.getLogger(__name__)
 
@@ -24,14 +27,19 @@ class ModelViewer:
 		self.debounce_time = 50
 		self.debounce_id = None
 
+		# Either one model per loaded epoch from get_all_models, or an EpochScrubber swapping the weights of a single model
 		self.models_list = models_list
 		self.models_quantity = len(self.models_list)
 		if self.models_quantity == 0:
 			raise ValueError("ModelViewer requires at least one model to display.")
 
 		self.current_model = None
+		self.current_epoch = None
 		self.current_input = np.full(1, 1)
 
+		# Compiled forward pass giving every layer of the current model, replaced on epoch changes
+		self.feature_extractors = FeatureExtractorCache()
+
 		# Initialize UI
 		self.initialize_title()
 		self.initialize_layout()
@@ -147,8 +155,8 @@ class ModelViewer:
 			return
 
 		try:
-			intermediate = tf.keras.Model(inputs = self.current_model.inputs, outputs = layer.output)
-			layer_output = intermediate.predict(self.current_input)
+			with get_latency_tracker().measure("tkinter_" + self.name.lower() + "_layer"):
+				layer_output = self.run_layers(self.current_input, [index_layer])[0]
 		except Exception:  # pragma: no cover - defensive log
 			logger.exception("Failed to compute intermediate output for layer %s", layer.name)
 			return
@@ -165,6 +173,16 @@ class ModelViewer:
 
 		self.refresh_tk_image(representation, is_color = is_color, tk_image = self.image_inside_data)
 
+	def get_feature_extractor(self):
+		return self.feature_extractors.get(self.name, self.current_epoch, self.current_model)
+
+	def run_layers(self, inputs, layer_indexes):
+		return self.get_feature_extractor()(inputs, layer_indexes)
+
+	def run_model(self, inputs):
+		"""Output of the current model for inputs, the last layer of its feature extractor."""
+		return self.run_layers(inputs, [len(self.current_model.layers) - 1])[0]
+
 	def get_array_representation(self, raw_data):
 		if raw_data.ndim == 3 and raw_data.shape[-1] > 1:
 			raw_data = raw_data.mean(axis = -1)
@@ -230,13 +248,19 @@ class ModelViewer:
 
 		new_epoch_exact = int(float(value))
 
-		try:
-			new_epoch_found = self.get_closest_model_loaded_index(new_epoch_exact)
-		except ValueError:
-			logger.error("Unable to find a loaded model near index %s", new_epoch_exact)
-			return
-
-		self.current_model = self.models_list[new_epoch_found]
+		if isinstance(self.models_list, EpochScrubber):
+			new_epoch_found = self.models_list.select(new_epoch_exact)
+			self.current_model = self.models_list.model
+		else:
+			try:
+				new_epoch_found = self.get_closest_model_loaded_index(new_epoch_exact)
+			except ValueError:
+				logger.error("Unable to find a loaded model near index %s", new_epoch_exact)
+				return
+
+			self.current_model = self.models_list[new_epoch_found]
+		self.current_epoch = new_epoch_found
+		self.get_feature_extractor()
 		self.update_inside_selector()
 
 		if self.name == "Discriminator":
@@ -0,0 +1,414 @@
+from __future__ import annotations
+
+import math
+
+from config import additional_dense_units, get_settings
+from ganalyzer.model_config import model_output_size
+
+def _make_config(*, gen_base, gen_min, disc_seq, disc_fc, gen_ch0, gen_pre_dense = None, extra_conv = False):
+	return {
+		"gen_base": gen_base,
+		"gen_min": gen_min,
+		"disc_seq": disc_seq,
+		"disc_fc": disc_fc,
+		"gen_ch0": gen_ch0,
+		"gen_pre_dense": gen_pre_dense or [],
+		"extra_conv": extra_conv,
+	}
+
+def _clone_configs(configs):
+	return {name: dict(cfg) for name, cfg in configs.items()}
+
+MODEL_CONFIGS_64 = {
+	"model_0_small": _make_config(
+		gen_base = [256, 128, 64, 32, 16, 8],
+		gen_min = 8,
+		disc_seq = [32, 64, 128, 256, 256, 256],
+		disc_fc = lambda image_size: [],
+		gen_ch0 = 256,
+	),
+	"model_1_small_with_h": _make_config(
+		gen_base = [256, 128, 64, 32, 16, 8],
+		gen_min = 8,
+		disc_seq = [32, 64, 128, 256, 256, 256],
+		disc_fc = lambda image_size: [additional_dense_units] * 3,
+		gen_ch0 = 256,
+		gen_pre_dense = [additional_dense_units] * 3,
+	),
+	"model_2_medium": _make_config(
+		gen_base = [336, 168, 84, 42, 21, 10],
+		gen_min = 10,
+		disc_seq = [42, 84, 168, 336, 336, 336],
+		disc_fc = lambda image_size: [image_size * 2],
+		gen_ch0 = 336,
+		gen_pre_dense = [320],
+		extra_conv = True,
+	),
+	"model_3_large": _make_config(
+		gen_base = [416, 208, 104, 52, 26, 13],
+		gen_min = 13,
+		disc_seq = [52, 104, 208, 416, 416, 416],
+		disc_fc = lambda image_size: [image_size * 3],
+		gen_ch0 = 416,
+		gen_pre_dense = [640],
+		extra_conv = True,
+	),
+}
+
+MODEL_CONFIGS_80 = {
+	"model_0_small": _make_config(
+		gen_base = [288, 144, 72, 36, 18, 9],
+		gen_min = 9,
+		disc_seq = [36, 72, 144, 288, 288, 288],
+		disc_fc = lambda image_size: [],
+		gen_ch0 = 288,
+	),
+	"model_1_small_with_h": _make_config(
+		gen_base = [288, 144, 72, 36, 18, 9],
+		gen_min = 9,
+		disc_seq = [36, 72, 144, 288, 288, 288],
+		disc_fc = lambda image_size: [additional_dense_units] * 3,
+		gen_ch0 = 288,
+		gen_pre_dense = [additional_dense_units] * 3,
+	),
+	"model_2_medium": _make_config(
+		gen_base = [384, 192, 96, 48, 24, 12],
+		gen_min = 12,
+		disc_seq = [48, 96, 192, 384, 384, 384],
+		disc_fc = lambda image_size: [image_size * 2],
+		gen_ch0 = 384,
+		gen_pre_dense = [352],
+		extra_conv = True,
+	),
+	"model_3_large": _make_config(
+		gen_base = [480, 240, 120, 60, 30, 15],
+		gen_min = 15,
+		disc_seq = [60, 120, 240, 480, 480, 480],
+		disc_fc = lambda image_size: [image_size * 3],
+		gen_ch0 = 480,
+		gen_pre_dense = [704],
+		extra_conv = True,
+	),
+}
+
+MODEL_CONFIGS_100 = {
+	"model_0_small": _make_config(
+		gen_base = [320, 160, 80, 40, 20, 10],
+		gen_min = 10,
+		disc_seq = [40, 80, 160, 320, 320, 320],
+		disc_fc = lambda image_size: [],
+		gen_ch0 = 320,
+	),
+	"model_1_small_with_h": _make_config(
+		gen_base = [320, 160, 80, 40, 20, 10],
+		gen_min = 10,
+		disc_seq = [40, 80, 160, 320, 320, 320],
+		disc_fc = lambda image_size: [additional_dense_units] * 3,
+		gen_ch0 = 320,
+		gen_pre_dense = [additional_dense_units] * 3,
+	),
+	"model_2_medium": _make_config(
+		gen_base = [424, 212, 106, 53, 26, 14],
+		gen_min = 13,
+		disc_seq = [53, 106, 212, 424, 424, 424],
+		disc_fc = lambda image_size: [image_size * 2],
+		gen_ch0 = 424,
+		gen_pre_dense = [448],
+		extra_conv = True,
+	),
+	"model_3_large": _make_config(
+		gen_base = [528, 264, 132, 66, 33, 17],
+		gen_min = 17,
+		disc_seq = [66, 132, 264, 528, 528, 528],
+		disc_fc = lambda image_size: [image_size * 4],
+		gen_ch0 = 528,
+		gen_pre_dense = [896],
+		extra_conv = True,
+	),
+}
+
+MODEL_CONFIGS_114 = {
+	"model_0_small": _make_config(
+		gen_base = [352, 176, 88, 44, 22, 11, 11],
+		gen_min = 11,
+		disc_seq = [44, 88, 176, 352, 352, 352, 352],
+		disc_fc = lambda image_size: [],
+		gen_ch0 = 352,
+	),
+	"model_1_small_with_h": _make_config(
+		gen_base = [352, 176, 88, 44, 22, 11, 11],
+		gen_min = 11,
+		disc_seq = [44, 88, 176, 352, 352, 352, 352],
+		disc_fc = lambda image_size: [additional_dense_units] * 3,
+		gen_ch0 = 352,
+		gen_pre_dense = [additional_dense_units] * 3,
+	),
+	"model_2_medium": _make_config(
+		gen_base = [472, 236, 118, 59, 30, 15, 15],
+		gen_min = 15,
+		disc_seq = [59, 118, 236, 472, 472, 472, 472],
+		disc_fc = lambda image_size: [96],
+		gen_ch0 = 472,
+		gen_pre_dense = [320],
+		extra_conv = True,
+	),
+	"model_3_large": _make_config(
+		gen_base = [592, 296, 148, 74, 37, 19, 19],
+		gen_min = 19,
+		disc_seq = [74, 148, 296, 592, 592, 592, 592],
+		disc_fc = lambda image_size: [192],
+		gen_ch0 = 592,
+		gen_pre_dense = [640],
+		extra_conv = True,
+	),
+}
+
+MODEL_CONFIGS_120 = {
+	"model_0_small": _make_config(
+		gen_base = [384, 192, 96, 48, 24, 12, 12],
+		gen_min = 12,
+		disc_seq = [48, 96, 192, 384, 384, 384, 384],
+		disc_fc = lambda image_size: [],
+		gen_ch0 = 384,
+	),
+	"model_1_small_with_h": _make_config(
+		gen_base = [384, 192, 96, 48, 24, 12, 12],
+		gen_min = 12,
+		disc_seq = [48, 96, 192, 384, 384, 384, 384],
+		disc_fc = lambda image_size: [additional_dense_units] * 3,
+		gen_ch0 = 384,
+		gen_pre_dense = [additional_dense_units] * 3,
+	),
+	"model_2_medium": _make_config(
+		gen_base = [512, 256, 128, 64, 32, 16, 16],
+		gen_min = 16,
+		disc_seq = [64, 128, 256, 512, 512, 512, 512],
+		disc_fc = lambda image_size: [96],
+		gen_ch0 = 512,
+		gen_pre_dense = [384],
+		extra_conv = True,
+	),
+	"model_3_large": _make_config(
+		gen_base = [640, 320, 160, 80, 40, 20, 20],
+		gen_min = 20,
+		disc_seq = [80, 160, 320, 640, 640, 640, 640],
+		disc_fc = lambda image_size: [192],
+		gen_ch0 = 640,
+		gen_pre_dense = [768],
+		extra_conv = True,
+	),
+}
+
+MODEL_CONFIGS_128 = {
+	"model_0_small": _make_config(
+		gen_base = [416, 208, 104, 52, 26, 13, 13],
+		gen_min = 13,
+		disc_seq = [52, 104, 208, 416, 416, 416, 416],
+		disc_fc = lambda image_size: [],
+		gen_ch0 = 416,
+	),
+	"model_1_small_with_h": _make_config(
+		gen_base = [416, 208, 104, 52, 26, 13, 13],
+		gen_min = 13,
+		disc_seq = [52, 104, 208, 416, 416, 416, 416],
+		disc_fc = lambda image_size: [additional_dense_units] * 3,
+		gen_ch0 = 416,
+		gen_pre_dense = [additional_dense_units] * 3,
+	),
+	"model_2_medium": _make_config(
+		gen_base = [560, 280, 140, 70, 35, 18, 18],
+		gen_min = 18,
+		disc_seq = [70, 140, 280, 560, 560, 560, 560],
+		disc_fc = lambda image_size: [112],
+		gen_ch0 = 560,
+		gen_pre_dense = [448],
+		extra_conv = True,
+	),
+	"model_3_large": _make_config(
+		gen_base = [704, 352, 176, 88, 44, 22, 22],
+		gen_min = 22,
+		disc_seq = [88, 176, 352, 704, 704, 704, 704],
+		disc_fc = lambda image_size: [224],
+		gen_ch0 = 704,
+		gen_pre_dense = [896],
+		extra_conv = True,
+	),
+}
+
+MODEL_CONFIGS_240 = {
+	"model_0_small": _make_config(
+		gen_base = [256, 192, 128, 96, 64, 32],
+		gen_min = 32,
+		disc_seq = [64, 96, 128, 192, 256, 256],
+		disc_fc = lambda image_size: [image_size * 2],
+		gen_ch0 = 512,
+		extra_conv = True,
+	),
+	"model_1_small_with_h": _make_config(
+		gen_base = [256, 192, 128, 96, 64, 32],
+		gen_min = 32,
+		disc_seq = [64, 96, 128, 192, 256, 256],
+		disc_fc = lambda image_size: [additional_dense_units] * 3,
+		gen_ch0 = 512,
+		gen_pre_dense = [additional_dense_units] * 3,
+		extra_conv = True,
+	),
+	"model_2_medium": _make_config(
+		gen_base = [408, 292, 204, 144, 104, 60],
+		gen_min = 60,
+		disc_seq = [84, 144, 204, 292, 408, 408],
+		disc_fc = lambda image_size: [image_size * 3],
+		gen_ch0 = 616,
+		gen_pre_dense = [800],
+		extra_conv = True,
+	),
+	"model_3_large": _make_config(
+		gen_base = [560, 392, 280, 192, 144, 88],
+		gen_min = 88,
+		disc_seq = [104, 192, 280, 392, 560, 560],
+		disc_fc = lambda image_size: [image_size * 4],
+		gen_ch0 = 720,
+		gen_pre_dense = [1600],
+		extra_conv = True,
+	),
+}
+
+MODEL_CONFIGS_BY_SIZE = {
+	64: MODEL_CONFIGS_64,
+	80: MODEL_CONFIGS_80,
+	100: MODEL_CONFIGS_100,
+	114: MODEL_CONFIGS_114,
+	120: MODEL_CONFIGS_120,
+	128: MODEL_CONFIGS_128,
+	240: MODEL_CONFIGS_240,
+}
+
+MODEL_CONFIGS = MODEL_CONFIGS_BY_SIZE[model_output_size]
+
+def num_upsamples_to_reach(img_size, base = 4):
+	if img_size < base:
+		raise ValueError("img_size should be >= 4")
+	cur = base
+	ups = 0
+	while cur < img_size:
+		cur *= 2
+		ups += 1
+	return ups, cur
+
+def filters_for_gen(step_idx, base, min_filter):
+	return base[step_idx] if step_idx < len(base) else max(min_filter, base[-1] // 2)
+
+def filters_for_disc(step_idx, seq):
+	return seq[step_idx] if step_idx < len(seq) else seq[-1]
+
+def downsampling_steps(image_size):
+	steps = 0
+	cur = image_size
+	while cur > 4:
+		cur = math.ceil(cur / 2)
+		steps += 1
+	return steps
+
+def disc_feature_width(seq, image_size):
+	return filters_for_disc(downsampling_steps(image_size) - 1, seq)
+
+def auto_disc_sequence(cfg, image_size):
+	return [filters_for_gen(i, cfg["gen_base"], cfg["gen_min"]) for i in range(downsampling_steps(image_size))]
+
+def scale_filters(seq, scale):
+	return [max(4, int(round(val * scale))) for val in seq]
+
+def resolve_model_config(model_size = None, image_size = None):
+	settings = get_settings()
+	image_size = int(image_size or settings.dataset_dimension)
+	return MODEL_CONFIGS_BY_SIZE[image_size][model_size or settings.model_name], image_size
+
+# Closed form counts of the layers built by ganalyzer.models, equal to count_params() of the built models
+
+def _dense_parameters(inputs, units, use_bias = True):
+	return inputs * units + (units if use_bias else 0)
+
+def _conv_parameters(input_channels, filters, kernel_size, use_bias = True):
+	return kernel_size * kernel_size * input_channels * filters + (filters if use_bias else 0)
+
+def _batch_normalization_parameters(channels):
+	# gamma and beta, plus the moving mean and variance that count_params includes
+	return 4 * channels
+
+def count_generator_parameters(cfg, image_size, latent_dim, base_spatial = 4):
+	ups, reached = num_upsamples_to_reach(image_size, base = base_spatial)
+	parameters = 0
+
+	width = latent_dim
+	for size in cfg.get("gen_pre_dense", []):
+		parameters += _dense_parameters(width, size, use_bias = False) + _batch_normalization_parameters(size)
+		width = size
+
+	ch0 = cfg["gen_ch0"]
+	parameters += _dense_parameters(width, base_spatial * base_spatial * ch0, use_bias = False) + _batch_normalization_parameters(base_spatial * base_spatial * ch0)
+
+	channels = ch0
+	for i in range(ups):
+		filters = filters_for_gen(i, cfg["gen_base"], cfg["gen_min"])
+		parameters += _conv_parameters(channels, filters, 4, use_bias = False) + _batch_normalization_parameters(filters)
+		channels = filters
+
+	if reached != image_size:
+		filters = filters_for_gen(ups, cfg["gen_base"], cfg["gen_min"])
+		parameters += _conv_parameters(channels, filters, 3, use_bias = False)
+		channels = filters
+
+	if cfg.get("extra_conv", False):
+		parameters += _conv_parameters(channels, 32, 3, use_bias = False) + _batch_normalization_parameters(32)
+		channels = 32
+
+	return parameters + _conv_parameters(channels, 3, 3)
+
+def count_discriminator_parameters(image_size, disc_seq, disc_fc, extra_fc_units = 0):
+	parameters = 0
+
+	channels = 3
+	for step in range(downsampling_steps(image_size)):
+		filters = filters_for_disc(step, disc_seq)
+		parameters += _conv_parameters(channels, filters, 5)
+		channels = filters
+
+	width = channels
+	for size in disc_fc(image_size):
+		parameters += _dense_parameters(width, size)
+		width = size
+
+	if extra_fc_units > 0:
+		parameters += _dense_parameters(width, extra_fc_units)
+		width = extra_fc_units
+
+	return parameters + _dense_parameters(width, 1)
+
+def discriminator_architecture(cfg, image_size, latent_dim):
+	"""Filters and extra dense units giving the discriminator about as many parameters as its generator."""
+	disc_seq = cfg["disc_seq"] or auto_disc_sequence(cfg, image_size)
+
+	gen_params = count_generator_parameters(cfg, image_size, latent_dim)
+	base_disc_params = count_discriminator_parameters(image_size, disc_seq, cfg["disc_fc"])
+	if base_disc_params == gen_params:
+		return disc_seq, 0
+
+	# Convolution parameters grow with the square of the filters
+	scaled_seq = scale_filters(disc_seq, math.sqrt(gen_params / base_disc_params))
+	missing = gen_params - count_discriminator_parameters(image_size, scaled_seq, cfg["disc_fc"])
+	if missing <= 0:
+		return scaled_seq, 0
+
+	return scaled_seq, max(0, missing // (disc_feature_width(scaled_seq, image_size) + 1))
+
+def count_parameters(model_type, model_size = None, image_size = None, latent_dim = None):
+	cfg, image_size = resolve_model_config(model_size, image_size)
+	latent_dim = latent_dim or get_settings().latent_dimension_generator
+
+	if model_type == "generator":
+		return count_generator_parameters(cfg, image_size, latent_dim)
+	if model_type == "discriminator":
+		disc_seq, extra_fc_units = discriminator_architecture(cfg, image_size, latent_dim)
+		return count_discriminator_parameters(image_size, disc_seq, cfg["disc_fc"], extra_fc_units)
+
+	raise ValueError(f"Unknown model type {model_type}")
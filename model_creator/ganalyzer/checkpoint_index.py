@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import bisect
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+CHECKPOINT_INDEX_FILENAME = "checkpoint_index.json"
+CHECKPOINT_INDEX_VERSION = 1
+MODEL_TYPES = ("generator", "discriminator")
+
+# .keras archives and .weights.npz snapshots, see ganalyzer.weights_snapshot
+_CHECKPOINT_FILENAME_PATTERN = re.compile(r"^(?P<model_type>generator|discriminator)_epoch_(?P<epoch>\d+)\.(keras|weights\.npz)$")
+
+_indexes: Dict[str, "CheckpointIndex"] = {}
+_indexes_lock = threading.Lock()
+
+def parse_checkpoint_filename(filename):
+	"""Returns (model_type, epoch) for a checkpoint file name, None for any other file."""
+	match = _CHECKPOINT_FILENAME_PATTERN.match(filename)
+	if match is None:
+		return None
+	return match.group("model_type"), int(match.group("epoch"))
+
+def closest_epoch(sorted_epochs: List[int], epoch: int) -> int:
+	if not sorted_epochs:
+		raise ValueError("No available epochs supplied.")
+
+	position = bisect.bisect_left(sorted_epochs, epoch)
+	if position == 0:
+		return sorted_epochs[0]
+	if position == len(sorted_epochs):
+		return sorted_epochs[-1]
+
+	# Ties go to the lower epoch, like the linear scan this replaces
+	before, after = sorted_epochs[position - 1], sorted_epochs[position]
+	return before if epoch - before <= after - epoch else after
+
+def _file_sha256(path):
+	digest = hashlib.sha256()
+	with open(path, "rb") as model_file:
+		for chunk in iter(lambda: model_file.read(2 ** 20), b""):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+class CheckpointIndex:
+	"""Manifest of the checkpoints of one run, kept in checkpoint_index.json next to its models directory.
+
+	The index remembers the mtime of the models directory it describes, any file added or removed
+	behind its back changes that mtime and the index is rebuilt from a listing on its next use. A file
+	overwritten in place leaves that mtime as it is, so the index file written by record is watched
+	too, and the size and mtime of every listed file are checked again whenever the index is re-read.
+	The sha256 of a checkpoint is only computed when asked for, by sha256().
+	"""
+
+	def __init__(self, models_dir):
+		self.models_dir = os.path.abspath(models_dir)
+		self.path = os.path.join(os.path.dirname(self.models_dir), CHECKPOINT_INDEX_FILENAME)
+
+		self._lock = threading.RLock()
+		self._entries: Dict[str, Dict[int, dict]] = {model_type: {} for model_type in MODEL_TYPES}
+		self._epochs: Dict[str, List[int]] = {model_type: [] for model_type in MODEL_TYPES}
+		self._directory_mtime_ns: Optional[int] = None
+		self._index_mtime_ns: Optional[int] = None
+
+	def epochs(self, model_type) -> List[int]:
+		"""Sorted epochs saved for model_type, the returned list must not be modified."""
+		with self._lock:
+			self._refresh_if_stale()
+			return self._epochs[model_type]
+
+	def latest_epoch(self, model_type = None) -> int:
+		with self._lock:
+			self._refresh_if_stale()
+			model_types = MODEL_TYPES if model_type is None else (model_type,)
+			return max((self._epochs[current_type][-1] for current_type in model_types if self._epochs[current_type]), default = 0)
+
+	def closest_epoch(self, model_type, epoch) -> int:
+		return closest_epoch(self.epochs(model_type), epoch)
+
+	def entry(self, model_type, epoch) -> Optional[dict]:
+		with self._lock:
+			self._refresh_if_stale()
+			entry = self._entries[model_type].get(epoch)
+			if entry is not None and self._verify_entry(entry):
+				self._write_if_possible()
+			return self._entries[model_type].get(epoch)
+
+	def sha256(self, model_type, epoch) -> Optional[str]:
+		"""Hash of the checkpoint file, computed on first request then kept in the index until the file changes."""
+		with self._lock:
+			entry = self.entry(model_type, epoch)
+			if entry is None:
+				return None
+
+			if entry.get("sha256") is None:
+				entry["sha256"] = _file_sha256(os.path.join(self.models_dir, entry["filename"]))
+				self._write_if_possible()
+			return entry["sha256"]
+
+	def filenames(self) -> List[str]:
+		with self._lock:
+			self._refresh_if_stale()
+			return sorted(entry["filename"] for entries in self._entries.values() for entry in entries.values())
+
+	def record(self, model_type, epoch, path, parameters = None):
+		"""Adds a checkpoint that was just written, then saves the index."""
+		with self._lock:
+			self._refresh_if_stale()
+			self._entries[model_type][epoch] = self._describe_file(model_type, epoch, os.path.basename(path), parameters)
+			self._sort_epochs()
+			self._directory_mtime_ns = self._current_directory_mtime_ns()
+			self._write()
+
+	def _refresh_if_stale(self):
+		directory_mtime_ns = self._current_directory_mtime_ns()
+		if directory_mtime_ns == self._directory_mtime_ns and self._current_index_mtime_ns() == self._index_mtime_ns:
+			return
+
+		if not self._read() or self._directory_mtime_ns != directory_mtime_ns:
+			self._rebuild()
+			return
+
+		# Files overwritten in place since the index was written
+		if any([self._verify_entry(entry) for entries in self._entries.values() for entry in list(entries.values())]):
+			self._write_if_possible()
+
+	def _verify_entry(self, entry):
+		"""Describes the file of entry again if its size or mtime changed, returns whether it did."""
+		try:
+			stat = os.stat(os.path.join(self.models_dir, entry["filename"]))
+		except FileNotFoundError:
+			# Removed files change the directory mtime, the next refresh rebuilds the index
+			return False
+
+		if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+			return False
+
+		self._entries[entry["model_type"]][entry["epoch"]] = self._describe_file(entry["model_type"], entry["epoch"], entry["filename"], entry.get("parameters"))
+		return True
+
+	def _current_directory_mtime_ns(self):
+		return _mtime_ns(self.models_dir)
+
+	def _current_index_mtime_ns(self):
+		return _mtime_ns(self.path)
+
+	def _read(self):
+		try:
+			with open(self.path, encoding = "utf-8") as index_file:
+				content = json.load(index_file)
+		except (OSError, ValueError):
+			return False
+
+		if content.get("version") != CHECKPOINT_INDEX_VERSION:
+			return False
+
+		self._entries = {model_type: {} for model_type in MODEL_TYPES}
+		for entry in content["checkpoints"]:
+			self._entries[entry["model_type"]][entry["epoch"]] = entry
+		self._sort_epochs()
+		self._directory_mtime_ns = content["directory_mtime_ns"]
+		self._index_mtime_ns = self._current_index_mtime_ns()
+		return True
+
+	def _rebuild(self):
+		print(f"=> rebuilding checkpoint index of {self.models_dir}")
+		previous_entries = self._entries
+		self._entries = {model_type: {} for model_type in MODEL_TYPES}
+
+		filenames = os.listdir(self.models_dir) if os.path.isdir(self.models_dir) else []
+		for filename in filenames:
+			parsed = parse_checkpoint_filename(filename)
+			if parsed is None:
+				continue
+
+			model_type, epoch = parsed
+			previous_entry = previous_entries[model_type].get(epoch)
+			self._entries[model_type][epoch] = self._describe_file(model_type, epoch, filename, None, previous_entry)
+
+		self._sort_epochs()
+		self._directory_mtime_ns = self._current_directory_mtime_ns()
+		self._write_if_possible()
+
+	def _write_if_possible(self):
+		try:
+			self._write()
+		except OSError as error:
+			# Read only results are still usable, the index is then rebuilt by every process
+			print(f"=> could not write {self.path} : {error}")
+
+	def _describe_file(self, model_type, epoch, filename, parameters, previous_entry = None):
+		stat = os.stat(os.path.join(self.models_dir, filename))
+
+		# An unchanged file keeps its entry, with its hash if one was already computed
+		if previous_entry is not None and previous_entry["size"] == stat.st_size and previous_entry["mtime_ns"] == stat.st_mtime_ns:
+			return previous_entry
+
+		return {
+			"model_type": model_type,
+			"epoch": epoch,
+			"filename": filename,
+			"size": stat.st_size,
+			"mtime_ns": stat.st_mtime_ns,
+			"parameters": parameters,
+			"sha256": None,
+		}
+
+	def _sort_epochs(self):
+		self._epochs = {model_type: sorted(entries) for model_type, entries in self._entries.items()}
+
+	def _write(self):
+		content = {
+			"version": CHECKPOINT_INDEX_VERSION,
+			"directory_mtime_ns": self._directory_mtime_ns,
+			"checkpoints": [self._entries[model_type][epoch] for model_type in MODEL_TYPES for epoch in self._epochs[model_type]],
+		}
+
+		temporary_path = self.path + ".tmp"
+		with open(temporary_path, "w", encoding = "utf-8") as index_file:
+			json.dump(content, index_file, indent = 1)
+		os.replace(temporary_path, self.path)
+		self._index_mtime_ns = self._current_index_mtime_ns()
+
+def _mtime_ns(path):
+	try:
+		return os.stat(path).st_mtime_ns
+	except FileNotFoundError:
+		return None
+
+def get_checkpoint_index(models_dir) -> CheckpointIndex:
+	"""One index per models directory and process, its staleness check is a single stat."""
+	key = os.path.abspath(models_dir)
+	with _indexes_lock:
+		if key not in _indexes:
+			_indexes[key] = CheckpointIndex(key)
+		return _indexes[key]
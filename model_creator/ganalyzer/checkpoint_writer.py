@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import atexit
+import queue
+import threading
+from typing import Callable, Optional
+
+import keras
+
+class CheckpointWriter:
+	"""Writes model snapshots on a background thread, training only waits for the weight copy."""
+
+	def __init__(self, generator, discriminator, save_function: Callable, max_pending: int = 2):
+		# The worker owns its own copies of the models, training keeps updating the originals
+		self._generator = keras.models.clone_model(generator)
+		self._discriminator = keras.models.clone_model(discriminator)
+		self._save_function = save_function
+
+		self._queue = queue.Queue(maxsize = max_pending)
+		self._error: Optional[BaseException] = None
+		self._closed = False
+
+		self._thread = threading.Thread(target = self._run, name = "checkpoint-writer", daemon = True)
+		self._thread.start()
+		atexit.register(self.close)
+
+	def submit(self, generator, discriminator, epoch):
+		self._raise_worker_error()
+
+		# get_weights copies the variables to numpy, put blocks while max_pending snapshots are queued
+		self._queue.put((generator.get_weights(), discriminator.get_weights(), epoch))
+
+	def flush(self):
+		self._queue.join()
+		self._raise_worker_error()
+
+	def close(self):
+		if self._closed:
+			return
+
+		self._closed = True
+		self._queue.put(None)
+		self._thread.join()
+		self._raise_worker_error()
+
+	def _run(self):
+		while True:
+			snapshot = self._queue.get()
+			try:
+				if snapshot is None:
+					return
+
+				generator_weights, discriminator_weights, epoch = snapshot
+				self._generator.set_weights(generator_weights)
+				self._discriminator.set_weights(discriminator_weights)
+				self._save_function(self._generator, self._discriminator, epoch)
+			except Exception as error:
+				print(f"===> Failed to write checkpoint : {error}")
+				self._error = error
+			finally:
+				self._queue.task_done()
+
+	def _raise_worker_error(self):
+		if self._error is not None:
+			error, self._error = self._error, None
+			raise RuntimeError("Background checkpoint writer failed") from error
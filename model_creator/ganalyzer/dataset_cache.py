@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+CACHE_FORMAT_VERSION = 1
+CACHE_SUFFIX = ".uint8.npy"
+CACHE_METADATA_SUFFIX = ".uint8.json"
+# Formats both cv2.imread and tf.io.decode_image read, anything else in the dataset directory is skipped
+IMAGE_EXTENSIONS = {".bmp", ".gif", ".jpeg", ".jpg", ".png"}
+
+def read_image(image_path, rgb_images):
+	read_mode = cv2.IMREAD_COLOR if rgb_images else cv2.IMREAD_GRAYSCALE
+	image = cv2.imread(str(image_path), read_mode)
+	if image is None:
+		raise ValueError(f"Failed to load image: {image_path}")
+
+	if rgb_images:
+		image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+	return image
+
+def list_dataset_images(dataset_directory: Path) -> List[Path]:
+	return [path for path in sorted(dataset_directory.iterdir()) if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS]
+
+def get_dataset_fingerprint(image_paths: List[Path], rgb_images) -> str:
+	digest = hashlib.sha256(f"{CACHE_FORMAT_VERSION}:{rgb_images}\n".encode("utf-8"))
+
+	for image_path in image_paths:
+		stat = image_path.stat()
+		digest.update(f"{image_path.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+
+	return digest.hexdigest()
+
+def get_cache_paths(dataset_directory: Path) -> Tuple[Path, Path]:
+	# Stored next to the dataset directory, not inside it, so the image listing never sees the cache
+	return (
+		dataset_directory.with_name(dataset_directory.name + CACHE_SUFFIX),
+		dataset_directory.with_name(dataset_directory.name + CACHE_METADATA_SUFFIX),
+	)
+
+def _is_cache_valid(array_path: Path, metadata_path: Path, fingerprint: str) -> bool:
+	if not (array_path.is_file() and metadata_path.is_file()):
+		return False
+
+	try:
+		metadata = json.loads(metadata_path.read_text(encoding = "utf-8"))
+	except (OSError, ValueError):
+		return False
+
+	return metadata.get("fingerprint") == fingerprint
+
+def build_dataset_cache(image_paths: List[Path], array_path: Path, metadata_path: Path, fingerprint: str, rgb_images) -> None:
+	first_image = _with_channel_axis(read_image(image_paths[0], rgb_images))
+	shape = (len(image_paths), *first_image.shape)
+
+	print(f"==> Building dataset cache {array_path} with shape {shape}")
+
+	# Written image by image through a memory map so the build never holds the dataset in RAM
+	temporary_path = array_path.with_name(array_path.name + ".tmp")
+	images = np.lib.format.open_memmap(temporary_path, mode = "w+", dtype = np.uint8, shape = shape)
+
+	for index, image_path in enumerate(tqdm(image_paths)):
+		image = _with_channel_axis(read_image(image_path, rgb_images))
+		if image.shape != first_image.shape:
+			raise ValueError(f"Image {image_path} has shape {image.shape}, expected {first_image.shape}")
+		images[index] = image
+
+	images.flush()
+	del images
+	os.replace(temporary_path, array_path)
+
+	metadata = {"fingerprint": fingerprint, "shape": list(shape), "dtype": "uint8"}
+	metadata_path.write_text(json.dumps(metadata, indent = 2), encoding = "utf-8")
+
+def load_or_build_dataset_cache(dataset_directory, rgb_images) -> np.ndarray:
+	dataset_directory = Path(dataset_directory)
+	if not dataset_directory.exists():
+		raise FileNotFoundError(f"Dataset path does not exist: {dataset_directory}")
+
+	image_paths = list_dataset_images(dataset_directory)
+	if not image_paths:
+		raise ValueError(f"No images found in dataset path {dataset_directory}")
+
+	fingerprint = get_dataset_fingerprint(image_paths, rgb_images)
+	array_path, metadata_path = get_cache_paths(dataset_directory)
+
+	if not _is_cache_valid(array_path, metadata_path, fingerprint):
+		build_dataset_cache(image_paths, array_path, metadata_path, fingerprint, rgb_images)
+
+	return np.load(array_path, mmap_mode = "r")
+
+def _with_channel_axis(image):
+	return image[..., np.newaxis] if image.ndim == 2 else image
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Hashable, List, Optional
+
+import numpy as np
+
+from config import get_settings, scrubbing_weights_cache_mb
+from ganalyzer.checkpoint_index import closest_epoch
+from ganalyzer.misc import get_available_epochs, get_current_epoch, get_saved_model_path, load_model
+from ganalyzer.weight_store import get_weight_store
+from ganalyzer.weights_snapshot import is_weights_snapshot, read_weights_snapshot
+
+class WeightsCache:
+	"""Weights of visited epochs as numpy arrays, least recently used first dropped past max_bytes."""
+
+	def __init__(self, max_bytes: int):
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+
+		self._weights: "OrderedDict[Hashable, List[np.ndarray]]" = OrderedDict()
+		self._bytes = 0
+		self._lock = threading.Lock()
+
+	def get(self, key) -> Optional[List[np.ndarray]]:
+		with self._lock:
+			weights = self._weights.get(key)
+			if weights is None:
+				self.misses += 1
+				return None
+
+			self._weights.move_to_end(key)
+			self.hits += 1
+			return weights
+
+	def put(self, key, weights: List[np.ndarray]):
+		with self._lock:
+			if key in self._weights:
+				self._weights.move_to_end(key)
+				return
+
+			self._weights[key] = weights
+			self._bytes += sum(array.nbytes for array in weights)
+
+			while self._bytes > self.max_bytes and len(self._weights) > 1:
+				_, evicted_weights = self._weights.popitem(last = False)
+				self._bytes -= sum(array.nbytes for array in evicted_weights)
+
+	def stats(self):
+		with self._lock:
+			return {"entries": len(self._weights), "mb": self._bytes / 2 ** 20, "max_mb": self.max_bytes / 2 ** 20, "hits": self.hits, "misses": self.misses}
+
+_weights_cache: Optional[WeightsCache] = None
+_weights_cache_lock = threading.Lock()
+
+def get_weights_cache() -> WeightsCache:
+	"""The cache shared by every scrubber of the process, scrubbing_weights_cache_mb in total whatever the number of sessions."""
+	global _weights_cache
+	with _weights_cache_lock:
+		if _weights_cache is None:
+			_weights_cache = WeightsCache(int(scrubbing_weights_cache_mb * 2 ** 20))
+		return _weights_cache
+
+class EpochScrubber:
+	"""Keeps one model of model_type and swaps the weights of the selected epoch into it.
+
+	Weights of the epochs already visited are kept as numpy arrays in the weights cache shared by every
+	scrubber of the process (a private one of weights_cache_mb when given), or read from the memory-mapped
+	weight store of the run when it was packed, so every saved epoch of a run can be browsed with the
+	memory of a single model.
+	"""
+
+	def __init__(self, model_type, models_dir: Optional[str] = None, weights_cache_mb: Optional[float] = None):
+		self.model_type = model_type
+		self.models_dir = models_dir or get_settings().models_directory
+		self.available_epochs = get_available_epochs(self.models_dir)
+		if not self.available_epochs:
+			raise ValueError(f"No saved epoch in {self.models_dir}")
+
+		# Slider positions go from 0 to the latest epoch, each one resolves to the closest saved epoch
+		self.epochs_quantity = get_current_epoch(self.models_dir) + 1
+		self.weights_cache = get_weights_cache() if weights_cache_mb is None else WeightsCache(int(weights_cache_mb * 2 ** 20))
+
+		self._lock = threading.Lock()
+		# Sessions looking at the same run share the cached weights of its epochs
+		self._cache_key_prefix = (os.path.abspath(self.models_dir), model_type)
+
+		# The model is modified in place, it must not be the instance shared by ganalyzer.model_cache
+		self.current_epoch = self.available_epochs[-1]
+		self.model = load_model(self._path(self.current_epoch), cached = False)
+		self.weights_cache.put(self._cache_key(self.current_epoch), self.model.get_weights())
+
+	def __len__(self):
+		return self.epochs_quantity
+
+	def select(self, epoch) -> int:
+		"""Swaps in the weights of the saved epoch closest to epoch, returns that saved epoch."""
+		found_epoch = closest_epoch(self.available_epochs, epoch)
+
+		with self._lock:
+			self._swap_in(found_epoch)
+
+		return found_epoch
+
+	def prefetch(self, epoch) -> int:
+		"""Reads the weights of the saved epoch closest to epoch into the weights cache, without touching the model.
+
+		Returns that saved epoch, a later selected() of it then only copies the weights into the model.
+		"""
+		found_epoch = closest_epoch(self.available_epochs, epoch)
+		self._weights_at(found_epoch)
+		return found_epoch
+
+	@contextmanager
+	def selected(self, saved_epoch):
+		"""The model holding the weights of saved_epoch, no other epoch is swapped in before the end of the block.
+
+		Lets several users of one scrubber each look at their own epoch, one forward pass at a time.
+		"""
+		with self._lock:
+			self._swap_in(saved_epoch)
+			yield self.model
+
+	def _swap_in(self, saved_epoch):
+		# Called with the lock held
+		if saved_epoch != self.current_epoch:
+			self.model.set_weights(self._weights_at(saved_epoch))
+			self.current_epoch = saved_epoch
+
+	def _path(self, epoch):
+		return get_saved_model_path(self.model_type, epoch, self.models_dir)
+
+	def _weights_at(self, epoch):
+		# Packed runs are read in place from the memory map, the page cache replaces the weights cache
+		weight_store = get_weight_store(self.models_dir, self.model_type)
+		if weight_store is not None and weight_store.is_current(epoch, self._path(epoch)):
+			return weight_store.weights_at(epoch)
+
+		weights = self.weights_cache.get(self._cache_key(epoch))
+		if weights is not None:
+			return weights
+
+		weights = self._read_weights(epoch)
+		self.weights_cache.put(self._cache_key(epoch), weights)
+		return weights
+
+	def _cache_key(self, epoch):
+		return self._cache_key_prefix + (epoch,)
+
+	def _read_weights(self, epoch):
+		path = self._path(epoch)
+		if is_weights_snapshot(path):
+			return read_weights_snapshot(path)
+		return load_model(path, cached = False).get_weights()
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import micro_batching, micro_batching_max_batch_size
+from ganalyzer.inference_engine import InferenceEngine, batch_sizes_up_to
+
+class FeatureExtractor:
+	"""One model with the output of every layer of model as its outputs, a single forward pass gives any set of layers.
+
+	The extractor shares its layers and variables with model, so it stays valid when an EpochScrubber
+	swaps the weights of another epoch into model.
+	"""
+
+	def __init__(self, model):
+		import tensorflow as tf
+
+		self.model = model
+		self.layer_names = [f"{index}) {layer.name}" for index, layer in enumerate(model.layers)]
+		self.extractor = tf.keras.Model(inputs = model.inputs, outputs = [layer.output for layer in model.layers])
+		# Single inputs are traced and warmed up here, at sync or epoch change, rather than on the first slider move,
+		# the larger batches of the micro batcher only when a server gets concurrent requests
+		self.engine = InferenceEngine(self.extractor, batch_sizes_up_to(micro_batching_max_batch_size) if micro_batching else (1,))
+
+	def __call__(self, inputs, layer_indexes: Sequence[int]) -> List[np.ndarray]:
+		outputs = self.engine(inputs)
+		return [outputs[index] for index in layer_indexes]
+
+class FeatureExtractorCache:
+	"""The extractor of the epoch currently selected for each model type.
+
+	Selecting another epoch evicts the extractor of the previous one, unless both epochs are served by
+	the same model object (epoch scrubbing), in which case the extractor is kept as is.
+	"""
+
+	def __init__(self):
+		self.builds = 0
+		self.reuses = 0
+
+		self._entries: Dict[str, Tuple[int, FeatureExtractor]] = {}
+		self._lock = threading.Lock()
+
+	def get(self, model_type, epoch, model) -> FeatureExtractor:
+		with self._lock:
+			entry = self._entries.get(model_type)
+			if entry is not None and entry[1].model is model:
+				if entry[0] != epoch:
+					self._entries[model_type] = (epoch, entry[1])
+				self.reuses += 1
+				return entry[1]
+
+			# The previous extractor is dropped before building, only one is alive per model type
+			self._entries.pop(model_type, None)
+
+		extractor = FeatureExtractor(model)
+
+		with self._lock:
+			self._entries[model_type] = (epoch, extractor)
+			self.builds += 1
+		return extractor
+
+	def epoch_of(self, model_type) -> Optional[int]:
+		entry = self._entries.get(model_type)
+		return None if entry is None else entry[0]
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+	def stats(self):
+		with self._lock:
+			return {
+				"entries": {model_type: epoch for model_type, (epoch, _) in self._entries.items()},
+				"builds": self.builds,
+				"reuses": self.reuses,
+			}
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Sequence
+
+import numpy as np
+
+from config import inference_latency_window
+
+class InferenceEngine:
+	"""Calls model through concrete tf.functions traced once each for a fixed (batch_size, ...) input shape.
+
+	Unlike model.predict, nothing is built per call (no data adapter, progress bar or distribution loop).
+	A batch is padded up to the smallest size of batch_sizes holding it. The smallest size is traced and
+	warmed up here, the others on their first use, so engines that only ever see single inputs (the Tk GUI,
+	an idle web server) never trace the larger ones. The variables are captured by reference so weights
+	swapped into model later are used by the next call.
+	"""
+
+	def __init__(self, model, batch_sizes: Sequence[int] = (1,)):
+		import tensorflow as tf
+
+		self.model = model
+		self.batch_sizes = sorted(set(batch_sizes))
+		self._to_tensor = tf.convert_to_tensor
+		self._tensor_spec = tf.TensorSpec
+
+		model_input = model.inputs[0]
+		self.sample_shape = tuple(int(dim) for dim in model_input.shape[1:])
+		self.input_dtype = np.dtype(tf.as_dtype(model_input.dtype).as_numpy_dtype)
+		self._tf_input_dtype = model_input.dtype
+
+		@tf.function
+		def forward(inputs):
+			return model(inputs, training = False)
+
+		self._forward = forward
+		self._forwards: Dict[int, object] = {}
+		self._lock = threading.Lock()
+
+		# Warm up, the first call of a concrete function still allocates its buffers
+		self(np.zeros((self.batch_sizes[0],) + self.sample_shape, dtype = self.input_dtype))
+
+	@property
+	def max_batch_size(self):
+		return self.batch_sizes[-1]
+
+	def __call__(self, inputs) -> List[np.ndarray]:
+		inputs = np.asarray(inputs, dtype = self.input_dtype)
+		quantity = inputs.shape[0]
+		batch_size = next((size for size in self.batch_sizes if size >= quantity), None)
+		if batch_size is None:
+			raise ValueError(f"Batch of {quantity} inputs, the engine was traced for at most {self.max_batch_size}")
+
+		if quantity < batch_size:
+			padding = np.zeros((batch_size - quantity,) + inputs.shape[1:], dtype = self.input_dtype)
+			inputs = np.concatenate([inputs, padding])
+
+		outputs = self._concrete_forward(batch_size)(self._to_tensor(inputs))
+		if not isinstance(outputs, (list, tuple)):
+			outputs = [outputs]
+		return [output.numpy()[:quantity] for output in outputs]
+
+	def _concrete_forward(self, batch_size):
+		forward = self._forwards.get(batch_size)
+		if forward is None:
+			with self._lock:
+				forward = self._forwards.get(batch_size)
+				if forward is None:
+					forward = self._forward.get_concrete_function(self._tensor_spec((batch_size,) + self.sample_shape, self._tf_input_dtype))
+					self._forwards[batch_size] = forward
+		return forward
+
+def batch_sizes_up_to(max_batch_size):
+	"""1, 2, 4 .. max_batch_size, padding a batch never more than doubles it."""
+	if max_batch_size < 1:
+		raise ValueError(f"max_batch_size must be at least 1, got {max_batch_size}")
+
+	batch_sizes = []
+	batch_size = 1
+	while batch_size < max_batch_size:
+		batch_sizes.append(batch_size)
+		batch_size *= 2
+	return batch_sizes + [max_batch_size]
+
+class LatencyTracker:
+	"""Durations of the last window calls of each endpoint, summarized as p50 / p99 in milliseconds."""
+
+	def __init__(self, window: int):
+		self.window = window
+		self._durations: Dict[str, Deque[float]] = {}
+		self._counts: Dict[str, int] = {}
+		self._lock = threading.Lock()
+
+	def record(self, name, seconds):
+		with self._lock:
+			self._durations.setdefault(name, deque(maxlen = self.window)).append(seconds)
+			self._counts[name] = self._counts.get(name, 0) + 1
+
+	@contextmanager
+	def measure(self, name):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.record(name, time.perf_counter() - start)
+
+	def summary(self):
+		with self._lock:
+			durations = {name: list(values) for name, values in self._durations.items()}
+			counts = dict(self._counts)
+
+		return {
+			name: {
+				"count": counts[name],
+				"p50_ms": _percentile(values, 50) * 1000,
+				"p99_ms": _percentile(values, 99) * 1000,
+			}
+			for name, values in durations.items()
+		}
+
+def _percentile(values, percent):
+	if len(values) == 1:
+		return values[0]
+	return statistics.quantiles(values, n = 100, method = "inclusive")[percent - 1]
+
+_latency_tracker = LatencyTracker(inference_latency_window)
+
+def get_latency_tracker():
+	return _latency_tracker
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, List, Tuple
+
+import numpy as np
+
+class _Batch:
+	def __init__(self):
+		self.items: List[Tuple[np.ndarray, Future]] = []
+		self.quantity = 0
+		self.closed = threading.Event()
+
+class MicroBatcher:
+	"""Gathers the inputs sent with the same key for up to max_wait_ms, then runs a single call of function on all of them.
+
+	There is no dispatcher thread, the first request of a batch waits for the others and runs the batch,
+	the following ones wait for their slice of the outputs. A batch is run right away once it holds
+	max_batch_size inputs, or when no other batch of its key is running : a request arriving alone is
+	not delayed, batches only form while the model of that key is already busy.
+	"""
+
+	def __init__(self, max_batch_size: int, max_wait_ms: float):
+		self.max_batch_size = max_batch_size
+		self.max_wait_seconds = max_wait_ms / 1000
+		self.batches = 0
+		self.requests = 0
+
+		self._pending: Dict[Hashable, _Batch] = {}
+		self._running: Dict[Hashable, int] = {}
+		self._lock = threading.Lock()
+
+	def run(self, key: Hashable, function: Callable[[np.ndarray], List[np.ndarray]], inputs, timeout = None) -> List[np.ndarray]:
+		"""function maps a batch of inputs to a list of arrays with the same first dimension, returns the rows of inputs."""
+		inputs = np.asarray(inputs)
+		quantity = len(inputs)
+		if quantity > self.max_batch_size:
+			raise ValueError(f"Batch of {quantity} inputs, more than max_batch_size {self.max_batch_size}")
+
+		future = Future()
+		with self._lock:
+			self.requests += 1
+			batch = self._pending.get(key)
+			if batch is not None and batch.quantity + quantity > self.max_batch_size:
+				self._close(key, batch)
+				batch = None
+
+			is_leader = batch is None
+			if is_leader:
+				batch = _Batch()
+				self._pending[key] = batch
+				# Counted from now on, a request coming while this one runs waits for company
+				is_alone = not self._running.get(key)
+				self._running[key] = self._running.get(key, 0) + 1
+
+			batch.items.append((inputs, future))
+			batch.quantity += quantity
+			if batch.quantity >= self.max_batch_size or (is_leader and is_alone):
+				self._close(key, batch)
+
+		if is_leader:
+			batch.closed.wait(self.max_wait_seconds)
+			with self._lock:
+				self._close(key, batch)
+				self.batches += 1
+			try:
+				self._execute(batch, function)
+			finally:
+				with self._lock:
+					self._running[key] -= 1
+					if not self._running[key]:
+						del self._running[key]
+
+		return future.result(timeout = timeout)
+
+	def _close(self, key, batch):
+		# Called with the lock held, the next request of key starts a new batch
+		if self._pending.get(key) is batch:
+			del self._pending[key]
+		batch.closed.set()
+
+	def _execute(self, batch, function):
+		try:
+			outputs = function(np.concatenate([inputs for inputs, _ in batch.items]))
+		except BaseException as error:
+			for _, future in batch.items:
+				future.set_exception(error)
+			return
+
+		start = 0
+		for inputs, future in batch.items:
+			end = start + len(inputs)
+			future.set_result([output[start:end] for output in outputs])
+			start = end
+
+	def stats(self):
+		with self._lock:
+			return {
+				"max_batch_size": self.max_batch_size,
+				"max_wait_ms": self.max_wait_seconds * 1000,
+				"requests": self.requests,
+				"batches": self.batches,
+				"mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+			}
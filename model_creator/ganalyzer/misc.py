@@ -1,12 +1,40 @@
 from __future__ import annotations
 
 import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Optional
 
-import keras
 import numpy as np
 
-from config import load_quantity_gui, models_directory, models_root_path
+from config import checkpoint_storage_format, get_settings, lazy_model_loading, load_quantity_gui, model_loading_workers
+from ganalyzer.checkpoint_index import closest_epoch, get_checkpoint_index, parse_checkpoint_filename
+from ganalyzer.model_cache import get_model_cache
+from ganalyzer.weight_store import get_weight_store
+from ganalyzer.weights_snapshot import WEIGHTS_SNAPSHOT_EXTENSION, build_model_from_architecture, get_architecture_path, is_weights_snapshot, load_weights_snapshot
+
+CHECKPOINT_EXTENSIONS = {"keras": ".keras", "weights": WEIGHTS_SNAPSHOT_EXTENSION}
+
+_model_loading_executor: Optional[ThreadPoolExecutor] = None
+
+class LazyModel:
+	"""Stands for a model still loading in the background, the first use waits for that model only."""
+
+	def __init__(self, future: Future, path: str):
+		self._future = future
+		self.path = path
+
+	def get(self):
+		return self._future.result()
+
+	def is_loaded(self):
+		return self._future.done()
+
+	def __getattr__(self, name):
+		return getattr(self.get(), name)
+
+	def __call__(self, *args, **kwargs):
+		return self.get()(*args, **kwargs)
 
 def get_generator_model_path_at_given_epoch(epoch):
 	return get_model_path_at_given_epoch("generator", epoch)
@@ -14,36 +42,29 @@ def get_generator_model_path_at_given_epoch(epoch):
 def get_discriminator_model_path_at_given_epoch(epoch):
 	return get_model_path_at_given_epoch("discriminator", epoch)
 
-def _model_directory_for(model_name: str, latent_space_size: int) -> str:
-	return os.path.join(
-		models_root_path,
-		f"{model_name}-ls_{latent_space_size:04d}",
-		"models",
-	)
+def model_directory_for(model_name: str, latent_space_size: int) -> str:
+	return get_settings().for_run(model_name, latent_space_size).models_directory
 
-def get_model_path_at_given_epoch(model_type, epoch, models_dir: Optional[str] = None):
-	filename = f"{model_type}_epoch_{epoch:06d}.keras"
-	current_models_directory = models_dir or models_directory
+def get_model_path_at_given_epoch(model_type, epoch, models_dir: Optional[str] = None, storage_format: Optional[str] = None):
+	extension = CHECKPOINT_EXTENSIONS[storage_format or checkpoint_storage_format]
+	filename = f"{model_type}_epoch_{epoch:06d}{extension}"
+	current_models_directory = models_dir or get_settings().models_directory
 	return os.path.join(current_models_directory, filename)
 
-def get_model_path_at_given_epoch_closest_possible(model_type, epoch, available_epochs, models_dir: Optional[str] = None):
-	current_best_distance = None
-	current_best_result = None
-
-	for available_epoch in available_epochs:
-		this_distance = abs(available_epoch - epoch)
-		if current_best_distance is None or current_best_distance > this_distance:
-			current_best_distance = this_distance
-			current_best_result = available_epoch
+def get_saved_model_path(model_type, epoch, models_dir: Optional[str] = None):
+	"""Path of the checkpoint saved at that epoch, in whichever format its run was trained with."""
+	current_models_directory = str(models_dir or get_settings().models_directory)
+	entry = get_checkpoint_index(current_models_directory).entry(model_type, epoch)
+	if entry is None:
+		return get_model_path_at_given_epoch(model_type, epoch, current_models_directory)
+	return os.path.join(current_models_directory, entry["filename"])
 
-	if current_best_result is None:
-		raise ValueError("No available epochs supplied.")
-
-	return get_model_path_at_given_epoch(model_type, current_best_result, models_dir)
+def get_model_path_at_given_epoch_closest_possible(model_type, epoch, available_epochs, models_dir: Optional[str] = None):
+	"""available_epochs must be sorted, as returned by get_available_epochs."""
+	return get_saved_model_path(model_type, closest_epoch(available_epochs, epoch), models_dir)
 
 def get_available_epochs(models_dir: Optional[str] = None):
-	models_list = get_list_of_keras_models(models_dir)
-	return [int(model.split("_")[-1].split(".")[0]) for model in models_list if model.startswith("discriminator")]
+	return get_checkpoint_index(models_dir or get_settings().models_directory).epochs("discriminator")
 
 def _indexes_to_load(models_quantity):
 	if models_quantity == 0:
@@ -62,13 +83,62 @@ def _indexes_to_load(models_quantity):
 	res = sorted(set(indexes))
 	return res
 
-def get_all_models(model_type, available_epochs, model_name, latent_space_size):
-	models_dir = _model_directory_for(model_name, latent_space_size)
+def _get_model_loading_executor():
+	global _model_loading_executor
+	if _model_loading_executor is None:
+		_model_loading_executor = ThreadPoolExecutor(max_workers = model_loading_workers, thread_name_prefix = "model-loader")
+	return _model_loading_executor
+
+def _load_from_weight_store(filename):
+	# Runs packed by pack_weight_store.py are rebuilt from their architecture with weights read from the memory map
+	parsed = parse_checkpoint_filename(os.path.basename(filename))
+	if parsed is None:
+		return None
+
+	model_type, epoch = parsed
+	models_dir = os.path.dirname(filename)
+	weight_store = get_weight_store(models_dir, model_type)
+	architecture_path = get_architecture_path(models_dir, model_type)
+	# A checkpoint saved again after packing wins over the packed weights
+	if weight_store is None or not weight_store.is_current(epoch, filename) or not os.path.exists(architecture_path):
+		return None
+
+	model = build_model_from_architecture(architecture_path)
+	model.set_weights(weight_store.weights_at(epoch))
+	return model
+
+def _load_model_file(filename):
+	start = time.time()
+	model = _load_from_weight_store(filename)
+	if model is None and is_weights_snapshot(filename):
+		model = load_weights_snapshot(filename)
+	elif model is None:
+		# Imported on the first load, tools that only list checkpoints never pay for it
+		import keras
+		model = keras.models.load_model(filename)
+	print(f"=> loaded {filename} in {round(time.time() - start, 2)} s")
+	return model
+
+def load_model(filename, cached = True):
+	"""Loads a checkpoint once per process, later calls return the model kept by ganalyzer.model_cache.
+
+	Callers that modify the model they get, like training, must pass cached = False.
+	"""
+	if not cached:
+		return _load_model_file(str(filename))
+	return get_model_cache().get(filename, _load_model_file)
+
+def get_all_models(model_type, available_epochs, model_name, latent_space_size, lazy = None):
+	"""Loads the checkpoints concurrently, with lazy the LazyModel handles are returned before the loads finish."""
+	lazy = lazy_model_loading if lazy is None else lazy
+	models_dir = model_directory_for(model_name, latent_space_size)
 
 	models_quantity = get_current_epoch(models_dir)
 	indexes = _indexes_to_load(models_quantity)
 
 	result = [None for _ in range(models_quantity)]
+	executor = _get_model_loading_executor()
+	pending_loads = {}
 
 	for current_index in indexes:
 		filename = get_model_path_at_given_epoch_closest_possible(
@@ -78,7 +148,10 @@ def get_all_models(model_type, available_epochs, model_name, latent_space_size):
 			models_dir,
 		)
 		print(f"=> will load {model_type} epoch {current_index}, "f"closest found is : {filename}")
-		result[current_index] = keras.models.load_model(filename)
+		pending_loads[current_index] = (filename, executor.submit(load_model, filename))
+
+	for current_index, (filename, future) in pending_loads.items():
+		result[current_index] = LazyModel(future, filename) if lazy else future.result()
 
 	return result
 
@@ -89,16 +162,7 @@ def project_array(arr, destination_max, project_from, project_to):
 	return arr
 
 def get_list_of_keras_models(models_dir: Optional[str] = None):
-	current_models_directory = models_dir or models_directory
-
-	if not os.path.isdir(current_models_directory):
-		return []
-
-	complete_list = sorted(os.listdir(current_models_directory))
-	return [filename for filename in complete_list if not filename.endswith(".csv")]
+	return get_checkpoint_index(models_dir or get_settings().models_directory).filenames()
 
 def get_current_epoch(models_dir: Optional[str] = None):
-	keras_models = get_list_of_keras_models(models_dir)
-	if not keras_models:
-		return 0
-	return int(keras_models[-1].split("_")[-1].split(".")[0])
+	return get_checkpoint_index(models_dir or get_settings().models_directory).latest_epoch()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+from config import model_cache_max_parameters
+
+CacheKey = Tuple[str, int]
+
+class ModelCache:
+	"""Loaded models keyed by (path, mtime), evicted least recently used first once over max_parameters."""
+
+	def __init__(self, max_parameters: int):
+		self.max_parameters = max_parameters
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+		self._entries: "OrderedDict[CacheKey, Tuple[object, int]]" = OrderedDict()
+		self._total_parameters = 0
+		self._lock = threading.Lock()
+		# One lock per file being loaded, so concurrent requests for it wait for a single load
+		self._loading_locks: Dict[CacheKey, threading.Lock] = {}
+
+	def get(self, path, loader: Callable):
+		path = os.path.abspath(path)
+		key = (path, os.stat(path).st_mtime_ns)
+
+		with self._lock:
+			model = self._lookup(key)
+			if model is not None:
+				return model
+			loading_lock = self._loading_locks.setdefault(key, threading.Lock())
+
+		try:
+			with loading_lock:
+				with self._lock:
+					model = self._lookup(key)
+					if model is not None:
+						return model
+					self.misses += 1
+
+				model = loader(path)
+
+				with self._lock:
+					self._insert(key, model, model.count_params())
+		finally:
+			# Also removed when the loader raises, a path failing to load must not leave its lock behind
+			with self._lock:
+				if self._loading_locks.get(key) is loading_lock:
+					del self._loading_locks[key]
+
+		return model
+
+	def stats(self):
+		with self._lock:
+			return {
+				"entries": len(self._entries),
+				"parameters": self._total_parameters,
+				"max_parameters": self.max_parameters,
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+			}
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self._total_parameters = 0
+
+	def _lookup(self, key):
+		entry = self._entries.get(key)
+		if entry is None:
+			return None
+
+		self._entries.move_to_end(key)
+		self.hits += 1
+		return entry[0]
+
+	def _insert(self, key, model, parameters):
+		# A rewritten file gets a new mtime, its previous version can never be hit again
+		for stale_key in [cached_key for cached_key in self._entries if cached_key[0] == key[0]]:
+			self._remove(stale_key)
+
+		self._entries[key] = (model, parameters)
+		self._total_parameters += parameters
+
+		# The newest model always stays, even when it alone is over the budget
+		while self._total_parameters > self.max_parameters and len(self._entries) > 1:
+			self._remove(next(iter(self._entries)))
+			self.evictions += 1
+
+	def _remove(self, key):
+		_, parameters = self._entries.pop(key)
+		self._total_parameters -= parameters
+
+_model_cache = ModelCache(model_cache_max_parameters)
+
+def get_model_cache() -> ModelCache:
+	return _model_cache
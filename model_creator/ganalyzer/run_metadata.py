@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+from typing import Optional
+
+from config import get_settings
+from ganalyzer.architectures import count_parameters, discriminator_architecture, resolve_model_config
+
+METADATA_FILENAME = "metadata.json"
+METADATA_VERSION = 1
+
+def get_metadata_path(run_directory):
+	return os.path.join(str(run_directory), METADATA_FILENAME)
+
+def parse_run_name(run_name):
+	"""(model size, latent dimension) of a run directory named like model_0_small-ls_0121."""
+	model_size, latent_part = os.path.basename(str(run_name)).rsplit("-ls_", 1)
+	return model_size, int(latent_part)
+
+def _layer_flops(layer):
+	# Multiply-adds of the dense and convolution layers counted as two operations, the other layers are negligible
+	kernel = getattr(layer, "kernel", None)
+	if kernel is None:
+		return 0
+
+	kernel_size = math.prod(int(dim) for dim in kernel.shape)
+	class_name = type(layer).__name__
+	if class_name == "Dense":
+		return 2 * kernel_size
+	if class_name == "Conv2D":
+		return 2 * kernel_size * math.prod(int(dim) for dim in layer.output.shape[1:3])
+	if class_name == "Conv2DTranspose":
+		# Every input position is multiplied by the whole kernel
+		return 2 * kernel_size * math.prod(int(dim) for dim in layer.input.shape[1:3])
+	return 0
+
+def describe_model(model):
+	layers_description = [
+		{
+			"name": layer.name,
+			"class": type(layer).__name__,
+			"output_shape": [None if dim is None else int(dim) for dim in layer.output.shape],
+			"parameters": int(layer.count_params()),
+			"flops": _layer_flops(layer),
+		}
+		for layer in model.layers
+	]
+
+	return {
+		"parameters": int(model.count_params()),
+		"flops": sum(layer["flops"] for layer in layers_description),
+		"layers": layers_description,
+	}
+
+def _serializable_config(cfg, image_size, latent_dim):
+	config_description = dict(cfg)
+	# disc_fc is a function of the image size, the sidecar keeps its result
+	config_description["disc_fc"] = list(cfg["disc_fc"](image_size))
+	disc_seq, extra_fc_units = discriminator_architecture(cfg, image_size, latent_dim)
+	config_description["resolved_disc_seq"] = list(disc_seq)
+	config_description["resolved_disc_extra_fc_units"] = int(extra_fc_units)
+	return config_description
+
+def write_run_metadata(run_directory, *, model_name, image_size, latent_dim, generator, discriminator):
+	cfg, image_size = resolve_model_config(model_name, image_size)
+	metadata = {
+		"version": METADATA_VERSION,
+		"model_name": model_name,
+		"image_size": image_size,
+		"latent_dim": int(latent_dim),
+		"config": _serializable_config(cfg, image_size, latent_dim),
+		"generator": describe_model(generator),
+		"discriminator": describe_model(discriminator),
+	}
+
+	path = get_metadata_path(run_directory)
+	with open(path + ".tmp", "w", encoding = "utf-8") as metadata_file:
+		json.dump(metadata, metadata_file, indent = 1)
+	os.replace(path + ".tmp", path)
+
+def read_run_metadata(run_directory) -> Optional[dict]:
+	try:
+		with open(get_metadata_path(run_directory), encoding = "utf-8") as metadata_file:
+			return json.load(metadata_file)
+	except FileNotFoundError:
+		return None
+
+def get_run_metadata(run_directory) -> dict:
+	"""The sidecar written by training, runs trained before it existed get the same keys from their name."""
+	metadata = read_run_metadata(run_directory)
+	if metadata is not None:
+		return metadata
+
+	model_name, latent_dim = parse_run_name(run_directory)
+	image_size = int(get_settings().dataset_dimension)
+	return {
+		"version": METADATA_VERSION,
+		"model_name": model_name,
+		"image_size": image_size,
+		"latent_dim": latent_dim,
+		"generator": {"parameters": count_parameters("generator", model_name, image_size, latent_dim)},
+		"discriminator": {"parameters": count_parameters("discriminator", model_name, image_size, latent_dim)},
+	}
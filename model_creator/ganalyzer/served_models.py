@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from ganalyzer.epoch_scrubber import EpochScrubber
+from ganalyzer.feature_extractor import FeatureExtractor
+from ganalyzer.misc import LazyModel
+
+def get_closest_model_loaded_index(model_index, models_list):
+	models_quantity = len(models_list)
+	if 0 <= model_index < models_quantity and models_list[model_index]:
+		return model_index
+
+	lower = model_index - 1
+	upper = model_index + 1
+	while lower >= 0 or upper < models_quantity:
+		if lower >= 0 and models_list[lower]:
+			return lower
+		if upper < models_quantity and models_list[upper]:
+			return upper
+		lower -= 1
+		upper += 1
+
+	raise ValueError("No models available in the provided list.")
+
+class ScrubbedRun:
+	"""The EpochScrubber of one model type of a run and the feature extractor of its model, shared by every web session on that run.
+
+	Sessions only keep the saved epoch they selected, each forward pass swaps that epoch in first.
+	"""
+
+	def __init__(self, model_type, models_dir):
+		self.scrubber = EpochScrubber(model_type, models_dir)
+		self.extractor = FeatureExtractor(self.scrubber.model)
+		self.layer_names = self.extractor.layer_names
+		self.sample_shape = self.extractor.engine.sample_shape
+		self.epochs_quantity = len(self.scrubber)
+		self.latest_epoch = self.scrubber.available_epochs[-1]
+
+	def resolve(self, epoch) -> int:
+		"""Saved epoch closest to epoch, its weights are read here rather than during a forward pass."""
+		return self.scrubber.prefetch(epoch)
+
+	def __call__(self, saved_epoch, inputs, layer_indexes: Sequence[int]) -> List[np.ndarray]:
+		with self.scrubber.selected(saved_epoch):
+			return self.extractor(inputs, layer_indexes)
+
+class LoadedRun:
+	"""The checkpoints of one model type of a run loaded by get_all_models, shared by every web session on that run.
+
+	The feature extractor of a checkpoint is built when it is first resolved, the models themselves are
+	the ones of ganalyzer.model_cache.
+	"""
+
+	def __init__(self, models_list):
+		self.models_list = models_list
+		self.epochs_quantity = len(models_list)
+
+		self._extractors: Dict[int, FeatureExtractor] = {}
+		self._lock = threading.Lock()
+
+		self.latest_epoch = get_closest_model_loaded_index(self.epochs_quantity - 1, models_list)
+		extractor = self._extractor(self.latest_epoch)
+		self.layer_names = extractor.layer_names
+		self.sample_shape = extractor.engine.sample_shape
+
+	def resolve(self, epoch) -> int:
+		"""Index of the loaded checkpoint closest to epoch, waiting for its load and building its extractor."""
+		index = get_closest_model_loaded_index(epoch, self.models_list)
+		self._extractor(index)
+		return index
+
+	def __call__(self, saved_epoch, inputs, layer_indexes: Sequence[int]) -> List[np.ndarray]:
+		return self._extractor(saved_epoch)(inputs, layer_indexes)
+
+	def _extractor(self, index):
+		with self._lock:
+			extractor = self._extractors.get(index)
+			if extractor is None:
+				# A LazyModel is replaced by the model it stands for, the extractor needs the Keras model itself
+				model = self.models_list[index]
+				extractor = FeatureExtractor(model.get() if isinstance(model, LazyModel) else model)
+				self._extractors[index] = extractor
+			return extractor
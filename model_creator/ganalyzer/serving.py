@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable
+
+class ServerBusy(Exception):
+	"""Raised instead of queueing more work than the executor accepts, answered with a 503."""
+
+class InvalidRequest(ValueError):
+	"""Request that can not be answered as it was sent, answered with a 400 before any model is used."""
+
+class BoundedExecutor:
+	"""Thread pool accepting at most max_pending tasks, running or waiting, new ones are refused with ServerBusy."""
+
+	def __init__(self, max_workers: int, max_pending: int, thread_name_prefix = "inference"):
+		self.max_workers = max_workers
+		self.max_pending = max_pending
+		self.rejected = 0
+
+		self._executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = thread_name_prefix)
+		self._slots = threading.BoundedSemaphore(max_pending)
+		self._lock = threading.Lock()
+
+	def submit(self, function: Callable, *args, **kwargs):
+		if not self._slots.acquire(blocking = False):
+			with self._lock:
+				self.rejected += 1
+			raise ServerBusy(f"{self.max_pending} tasks already pending")
+
+		try:
+			future = self._executor.submit(function, *args, **kwargs)
+		except BaseException:
+			self._slots.release()
+			raise
+
+		future.add_done_callback(lambda _: self._slots.release())
+		return future
+
+	def run(self, function: Callable, *args, timeout = None, **kwargs):
+		return self.submit(function, *args, **kwargs).result(timeout = timeout)
+
+	def stats(self):
+		with self._lock:
+			return {"max_workers": self.max_workers, "max_pending": self.max_pending, "rejected": self.rejected}
+
+	def shutdown(self):
+		self._executor.shutdown(wait = True)
+
+class SessionStore:
+	"""Per client state created by factory on first use, the least recently used sessions are dropped past max_sessions.
+
+	A dropped session that has a close method is closed, so it can give back what it holds.
+	"""
+
+	def __init__(self, factory: Callable, max_sessions: int):
+		self.factory = factory
+		self.max_sessions = max_sessions
+
+		self._sessions: "OrderedDict[str, object]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, session_id):
+		evicted_sessions = []
+		with self._lock:
+			session = self._sessions.get(session_id)
+			if session is None:
+				session = self.factory()
+				self._sessions[session_id] = session
+				while len(self._sessions) > self.max_sessions:
+					evicted_id, evicted_session = self._sessions.popitem(last = False)
+					evicted_sessions.append(evicted_session)
+					print(f"==> Session {evicted_id} dropped, more than {self.max_sessions} sessions")
+			else:
+				self._sessions.move_to_end(session_id)
+
+		for evicted_session in evicted_sessions:
+			if hasattr(evicted_session, "close"):
+				evicted_session.close()
+		return session
+
+	def stats(self) -> Dict[str, int]:
+		with self._lock:
+			return {"sessions": len(self._sessions), "max_sessions": self.max_sessions}
+
+class SharedRegistry:
+	"""One object per key built by factory(key) on first acquire, shared by every holder and dropped after the last release.
+
+	The build runs without the registry lock, holders of other keys are not blocked by a slow one.
+	"""
+
+	def __init__(self, factory: Callable[[Hashable], object]):
+		self.factory = factory
+		self.builds = 0
+
+		self._entries: Dict[Hashable, _SharedEntry] = {}
+		self._lock = threading.Lock()
+
+	def acquire(self, key):
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				entry = _SharedEntry()
+				self._entries[key] = entry
+			entry.holders += 1
+
+		try:
+			with entry.build_lock:
+				if entry.value is None:
+					entry.value = self.factory(key)
+					with self._lock:
+						self.builds += 1
+		except BaseException:
+			self.release(key, entry)
+			raise
+		return entry.value
+
+	def release(self, key, entry = None):
+		with self._lock:
+			current_entry = self._entries.get(key)
+			if current_entry is None or (entry is not None and current_entry is not entry):
+				return
+
+			current_entry.holders -= 1
+			if current_entry.holders <= 0:
+				del self._entries[key]
+
+	def stats(self):
+		with self._lock:
+			return {
+				"entries": {str(key): entry.holders for key, entry in self._entries.items()},
+				"builds": self.builds,
+			}
+
+class _SharedEntry:
+	def __init__(self):
+		self.value = None
+		self.holders = 0
+		self.build_lock = threading.Lock()
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import json
+import struct
+from typing import Dict
+
+import numpy as np
+
+# Payload : uint32 little-endian header length, JSON header, then the raw little-endian buffers one after the other
+# The header is {"tensors": [{"name", "dtype", "shape", "offset", "nbytes"}, ...]}, offsets count from the end of the header
+BINARY_MIMETYPE = "application/octet-stream"
+
+_HEADER_LENGTH = struct.Struct("<I")
+_TRANSPORT_DTYPES = {"uint8", "float16", "float32"}
+_FLOAT16_MAX = float(np.finfo(np.float16).max)
+
+def compact_array(array, which_model) -> np.ndarray:
+	"""uint8 for the generator, whose layers are projected to 0 .. 254, float16 for the discriminator unless a value does not fit in it."""
+	array = np.asarray(array)
+	if which_model == "generator":
+		return np.clip(np.round(array), 0, 255).astype(np.uint8)
+
+	finite_values = array[np.isfinite(array)]
+	if finite_values.size and np.abs(finite_values).max() > _FLOAT16_MAX:
+		return array.astype("<f4")
+	return array.astype("<f2")
+
+def encode_tensors(tensors: Dict[str, np.ndarray]) -> bytes:
+	buffers = []
+	descriptions = []
+	offset = 0
+	for name, array in tensors.items():
+		array = np.ascontiguousarray(array)
+		if array.dtype.name not in _TRANSPORT_DTYPES:
+			raise ValueError(f"dtype {array.dtype} of {name} can not be sent, use compact_array first")
+
+		buffer = array.astype(array.dtype.newbyteorder("<"), copy = False).tobytes()
+		descriptions.append({"name": name, "dtype": array.dtype.name, "shape": list(array.shape), "offset": offset, "nbytes": len(buffer)})
+		buffers.append(buffer)
+		offset += len(buffer)
+
+	header = json.dumps({"tensors": descriptions}, separators = (",", ":")).encode("utf-8")
+	return b"".join([_HEADER_LENGTH.pack(len(header)), header] + buffers)
+
+def decode_tensors(payload: bytes) -> Dict[str, np.ndarray]:
+	(header_length,) = _HEADER_LENGTH.unpack_from(payload)
+	data_start = _HEADER_LENGTH.size + header_length
+	header = json.loads(payload[_HEADER_LENGTH.size:data_start].decode("utf-8"))
+
+	tensors = {}
+	for description in header["tensors"]:
+		if description["dtype"] not in _TRANSPORT_DTYPES:
+			raise ValueError(f"Unsupported dtype {description['dtype']} for {description['name']}")
+
+		start = data_start + description["offset"]
+		dtype = np.dtype(description["dtype"]).newbyteorder("<")
+		# Read only view on the payload, no copy
+		tensors[description["name"]] = np.frombuffer(payload, dtype = dtype, count = description["nbytes"] // dtype.itemsize, offset = start).reshape(description["shape"])
+	return tensors
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import contextlib
+import csv
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import tensorflow as tf
+
+# train_step is the whole step, split into forward_backward, optimizer_apply and statistics when training_metrics_split_step is set
+TRAINING_PHASES = ("data_loading", "train_step", "forward_backward", "optimizer_apply", "statistics", "checkpointing")
+
+def get_peak_rss_mb() -> Optional[float]:
+	try:
+		import resource
+	except ImportError:
+		return None
+
+	peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Bytes on macOS, kilobytes everywhere else
+	return peak_rss / 2 ** 20 if sys.platform == "darwin" else peak_rss / 2 ** 10
+
+class EpochProfiler:
+	"""Wall clock time spent in every training phase during one epoch."""
+
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		self.durations: Dict[str, float] = defaultdict(float)
+		self.start = time.perf_counter()
+
+	@contextlib.contextmanager
+	def phase(self, name):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.durations[name] += time.perf_counter() - start
+
+	def summary(self, image_count) -> Dict[str, float]:
+		elapsed = time.perf_counter() - self.start
+
+		metrics = {f"{name}_seconds": round(self.durations[name], 4) for name in TRAINING_PHASES}
+		metrics["epoch_seconds"] = round(elapsed, 4)
+		metrics["images_per_second"] = round(image_count / elapsed, 2) if elapsed > 0 else 0.0
+		metrics["peak_rss_mb"] = get_peak_rss_mb()
+		return metrics
+
+class ProfilerTraceWindow:
+	"""Captures a TensorFlow profiler trace from first_step to last_step, counted from the start of the process."""
+
+	def __init__(self, log_directory, steps: Optional[Tuple[int, int]]):
+		self.log_directory = str(log_directory)
+		self.first_step, self.last_step = steps if steps else (None, None)
+		self.active = False
+
+	def before_step(self, step):
+		if step == self.first_step:
+			print(f"===> Starting profiler trace in {self.log_directory}")
+			tf.profiler.experimental.start(self.log_directory)
+			self.active = True
+
+	def after_step(self, step):
+		if self.active and step >= self.last_step:
+			self.close()
+
+	def close(self):
+		if not self.active:
+			return
+
+		tf.profiler.experimental.stop()
+		self.active = False
+		print("===> Profiler trace saved")
+
+def add_training_metrics_entry_to_file(metrics_file_path, epoch, metrics):
+	metrics_path = Path(metrics_file_path)
+	metrics_path.parent.mkdir(parents = True, exist_ok = True)
+
+	file_exists = metrics_path.exists()
+	headers = list(metrics.keys())
+
+	with metrics_path.open(mode = "a", newline = "", encoding = "utf-8") as metrics_file:
+		writer = csv.writer(metrics_file)
+
+		if not file_exists:
+			writer.writerow(["epoch_id", *headers])
+
+		writer.writerow([str(epoch), *[metrics[key] for key in headers]])
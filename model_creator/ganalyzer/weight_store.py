@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+WEIGHT_STORE_VERSION = 2
+WEIGHT_STORE_EXTENSION = ".weights.bin"
+WEIGHT_STORE_INDEX_EXTENSION = ".weights.json"
+_ALIGNMENT = 64
+
+_stores: Dict[str, Tuple[int, Optional["WeightStore"]]] = {}
+_stores_lock = threading.Lock()
+
+def get_weight_store_paths(models_dir, model_type):
+	run_directory = os.path.dirname(os.path.abspath(models_dir))
+	return (
+		os.path.join(run_directory, model_type + WEIGHT_STORE_EXTENSION),
+		os.path.join(run_directory, model_type + WEIGHT_STORE_INDEX_EXTENSION),
+	)
+
+def describe_source(path):
+	stat = os.stat(path)
+	return {"filename": os.path.basename(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def write_weight_store(models_dir, model_type, weight_names: Sequence[Tuple[str, str]], epoch_weights: Iterable[Tuple[int, List[np.ndarray], str]]):
+	"""Packs the weights of every epoch back to back in one file, weight_names holds a (layer, weight) pair per array.
+
+	epoch_weights yields (epoch, weights, checkpoint path) with weights in get_weights order, one epoch at a time.
+	The size and mtime of each checkpoint are kept so a checkpoint saved again after packing is not shadowed.
+	"""
+	data_path, index_path = get_weight_store_paths(models_dir, model_type)
+	epochs = []
+	offsets = []
+	sources = []
+	weights_description = None
+
+	with open(data_path + ".tmp", "wb") as data_file:
+		for epoch, weights, source_path in epoch_weights:
+			if weights_description is None:
+				weights_description = [
+					{"layer": layer_name, "name": weight_name, "shape": list(array.shape), "dtype": array.dtype.str}
+					for (layer_name, weight_name), array in zip(weight_names, weights)
+				]
+
+			epoch_offsets = []
+			for array in weights:
+				# Aligned so every array can be viewed in place with its own dtype
+				data_file.write(b"\0" * (-data_file.tell() % _ALIGNMENT))
+				epoch_offsets.append(data_file.tell())
+				data_file.write(np.ascontiguousarray(array).tobytes())
+
+			epochs.append(epoch)
+			offsets.append(epoch_offsets)
+			sources.append(describe_source(source_path))
+			print(f"=> packed {model_type} epoch {epoch}")
+
+	index = {"version": WEIGHT_STORE_VERSION, "epochs": epochs, "weights": weights_description or [], "offsets": offsets, "sources": sources}
+	with open(index_path + ".tmp", "w", encoding = "utf-8") as index_file:
+		json.dump(index, index_file)
+
+	os.replace(data_path + ".tmp", data_path)
+	os.replace(index_path + ".tmp", index_path)
+
+class WeightStore:
+	"""Read only view over a packed weight file, arrays are returned as views of the memory map."""
+
+	def __init__(self, data_path, index_path):
+		with open(index_path, encoding = "utf-8") as index_file:
+			index = json.load(index_file)
+		if index["version"] != WEIGHT_STORE_VERSION:
+			raise ValueError(f"Unsupported weight store version {index['version']} in {index_path}")
+
+		self.epochs: List[int] = index["epochs"]
+		self.weights: List[dict] = index["weights"]
+		self._positions = {epoch: position for position, epoch in enumerate(self.epochs)}
+		self._offsets = index["offsets"]
+		self._sources = index["sources"]
+		self._data = np.memmap(data_path, dtype = np.uint8, mode = "r") if self.epochs else None
+
+	def __contains__(self, epoch):
+		return epoch in self._positions
+
+	def matches_source(self, epoch, path) -> bool:
+		"""Whether the checkpoint at path is still the file this epoch was packed from.
+
+		A checkpoint deleted after packing is served from the store, one saved again (resumed or retrained run) is not.
+		"""
+		try:
+			current_source = describe_source(path)
+		except FileNotFoundError:
+			return True
+
+		packed_source = self._sources[self._positions[epoch]]
+		return current_source["size"] == packed_source["size"] and current_source["mtime_ns"] == packed_source["mtime_ns"]
+
+	def is_current(self, epoch, path) -> bool:
+		return epoch in self and self.matches_source(epoch, path)
+
+	def layer_names(self) -> List[str]:
+		return list(dict.fromkeys(weight["layer"] for weight in self.weights))
+
+	def weight_at(self, epoch, weight_index) -> np.ndarray:
+		description = self.weights[weight_index]
+		dtype = np.dtype(description["dtype"])
+		offset = self._offsets[self._positions[epoch]][weight_index]
+		size = int(np.prod(description["shape"], dtype = np.int64)) * dtype.itemsize
+		return self._data[offset:offset + size].view(dtype).reshape(description["shape"])
+
+	def weights_at(self, epoch) -> List[np.ndarray]:
+		"""Every weight of that epoch in get_weights order, ready for set_weights, without copying."""
+		return [self.weight_at(epoch, weight_index) for weight_index in range(len(self.weights))]
+
+	def layer_norms(self, layer_names: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+		"""L2 norm of all the weights of each layer, as an array over self.epochs."""
+		layer_names = self.layer_names() if layer_names is None else list(layer_names)
+		squared_sums = {layer_name: np.zeros(len(self.epochs)) for layer_name in layer_names}
+
+		for weight_index, description in enumerate(self.weights):
+			if description["layer"] not in squared_sums:
+				continue
+
+			for position, epoch in enumerate(self.epochs):
+				array = self.weight_at(epoch, weight_index).astype(np.float64)
+				squared_sums[description["layer"]][position] += np.dot(array.ravel(), array.ravel())
+
+		return {layer_name: np.sqrt(squared_sum) for layer_name, squared_sum in squared_sums.items()}
+
+def get_weight_store(models_dir, model_type) -> Optional[WeightStore]:
+	"""The packed store of that run if pack_weight_store.py was run for it, reopened when it is packed again."""
+	data_path, index_path = get_weight_store_paths(models_dir, model_type)
+	try:
+		index_mtime_ns = os.stat(index_path).st_mtime_ns
+	except FileNotFoundError:
+		return None
+
+	with _stores_lock:
+		cached = _stores.get(index_path)
+		if cached is None or cached[0] != index_mtime_ns:
+			try:
+				cached = (index_mtime_ns, WeightStore(data_path, index_path))
+			except (KeyError, ValueError) as error:
+				# Stores packed before the checkpoint sources were recorded can not be checked, the checkpoints are used instead
+				print(f"=> ignoring {index_path}, run pack_weight_store.py again : {error}")
+				cached = (index_mtime_ns, None)
+			_stores[index_path] = cached
+		return cached[1]
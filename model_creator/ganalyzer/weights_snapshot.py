@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import functools
+import os
+from typing import List
+
+import numpy as np
+
+WEIGHTS_SNAPSHOT_EXTENSION = ".weights.npz"
+ARCHITECTURE_EXTENSION = ".architecture.json"
+
+def get_architecture_path(models_dir, model_type):
+	# Next to the models directory, the checkpoint index only lists the epoch files
+	return os.path.join(os.path.dirname(os.path.abspath(models_dir)), model_type + ARCHITECTURE_EXTENSION)
+
+def is_weights_snapshot(path):
+	return str(path).endswith(WEIGHTS_SNAPSHOT_EXTENSION)
+
+def save_architecture(model, path):
+	"""Written once per run, the architecture never changes between epochs."""
+	if os.path.exists(path):
+		return
+
+	temporary_path = path + ".tmp"
+	with open(temporary_path, "w", encoding = "utf-8") as architecture_file:
+		architecture_file.write(model.to_json())
+	os.replace(temporary_path, path)
+
+def save_weights_snapshot(model, path):
+	temporary_path = path + ".tmp"
+	with open(temporary_path, "wb") as weights_file:
+		np.savez(weights_file, *model.get_weights())
+	os.replace(temporary_path, path)
+
+def read_weights_snapshot(path) -> List[np.ndarray]:
+	with np.load(path) as weights_file:
+		return [weights_file[f"arr_{index}"] for index in range(len(weights_file.files))]
+
+@functools.lru_cache(maxsize = None)
+def _read_architecture(path):
+	with open(path, encoding = "utf-8") as architecture_file:
+		return architecture_file.read()
+
+@functools.lru_cache(maxsize = None)
+def _architecture_template(path):
+	# Built from the json once per architecture, never handed out, the loaded models are clones of it
+	import keras
+	return keras.models.model_from_json(_read_architecture(path))
+
+def build_model_from_architecture(path):
+	import keras
+	return keras.models.clone_model(_architecture_template(os.path.abspath(path)))
+
+def load_weights_snapshot(path):
+	"""A clone of the architecture of its run, with the weights of that epoch swapped in.
+
+	Callers that keep one model and change its epoch (ganalyzer.epoch_scrubber) only call read_weights_snapshot.
+	"""
+	model_type = os.path.basename(path).split("_epoch_")[0]
+	model = build_model_from_architecture(get_architecture_path(os.path.dirname(path), model_type))
+	model.set_weights(read_weights_snapshot(path))
+	return model
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+def post_json(url, payload, session_id, timeout):
+	request = urllib.request.Request(
+		url,
+		data = json.dumps(payload).encode("utf-8"),
+		headers = {"Content-Type": "application/json", "X-Session-Id": session_id},
+		method = "POST",
+	)
+	with urllib.request.urlopen(request, timeout = timeout) as response:
+		return json.loads(response.read())
+
+class LoadTestResults:
+	def __init__(self):
+		self.durations = []
+		self.rejected = 0
+		self.errors = 0
+		self._lock = threading.Lock()
+
+	def record(self, seconds):
+		with self._lock:
+			self.durations.append(seconds)
+
+	def count_rejected(self):
+		with self._lock:
+			self.rejected += 1
+
+	def count_error(self):
+		with self._lock:
+			self.errors += 1
+
+def run_client(args, results, deadline):
+	# Every client is its own session, like separate browser tabs
+	session_id = uuid.uuid4().hex if args.sessions == "separate" else "load_test"
+	sync = post_json(f"{args.url}/sync-server", {"model_size": args.model_size, "latent_space_size": args.latent_space_size}, session_id, args.timeout)
+	layer_name = sync["generator_layers"][args.layer]
+
+	while time.perf_counter() < deadline:
+		latent_vector = [random.gauss(0, 1) for _ in range(args.latent_space_size)]
+		payload = {"input_data": [[latent_vector]], "layer_name": layer_name, "which_model": "generator"}
+
+		start = time.perf_counter()
+		try:
+			post_json(f"{args.url}/get-model-prediction", payload, session_id, args.timeout)
+			results.record(time.perf_counter() - start)
+		except urllib.error.HTTPError as error:
+			if error.code == 503:
+				results.count_rejected()
+			else:
+				results.count_error()
+		except (urllib.error.URLError, TimeoutError):
+			results.count_error()
+
+def print_results(results, concurrency, duration):
+	durations = sorted(results.durations)
+	print(f"==> Concurrency : {concurrency}, duration : {duration:.1f} s")
+	print(f"==> Requests served : {len(durations)} ({len(durations) / duration:.1f} requests/s)")
+	print(f"==> Rejected (503) : {results.rejected}, errors : {results.errors}")
+	if len(durations) >= 2:
+		percentiles = statistics.quantiles(durations, n = 100, method = "inclusive")
+		print(f"==> Latency p50 : {percentiles[49] * 1000:.1f} ms, p99 : {percentiles[98] * 1000:.1f} ms")
+
+def main():
+	parser = argparse.ArgumentParser(description = "Requests/s of /get-model-prediction at a fixed number of concurrent clients.")
+	parser.add_argument("--url", default = "http://127.0.0.1:5000")
+	parser.add_argument("--concurrency", type = int, default = 8)
+	parser.add_argument("--duration", type = float, default = 30, help = "seconds")
+	parser.add_argument("--model-size", default = "model_0_small")
+	parser.add_argument("--latent-space-size", type = int, default = 121)
+	parser.add_argument("--layer", type = int, default = -1, help = "index of the generator layer requested, the output by default")
+	parser.add_argument("--sessions", choices = ["separate", "shared"], default = "separate")
+	parser.add_argument("--timeout", type = float, default = 60)
+	args = parser.parse_args()
+
+	results = LoadTestResults()
+	start = time.perf_counter()
+	deadline = start + args.duration
+	with ThreadPoolExecutor(max_workers = args.concurrency) as executor:
+		futures = [executor.submit(run_client, args, results, deadline) for _ in range(args.concurrency)]
+		for future in futures:
+			future.result()
+
+	print_results(results, args.concurrency, time.perf_counter() - start)
+
+if __name__ == "__main__":
+	main()
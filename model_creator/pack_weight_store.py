@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import argparse
+import os
+
+from config import add_settings_arguments, configure_from_arguments
+from ganalyzer.checkpoint_index import MODEL_TYPES, get_checkpoint_index
+from ganalyzer.misc import get_saved_model_path, load_model
+from ganalyzer.weight_store import get_weight_store, write_weight_store
+from ganalyzer.weights_snapshot import get_architecture_path, is_weights_snapshot, read_weights_snapshot, save_architecture
+
+def _weight_names(model):
+	layer_names = {id(weight): layer.name for layer in model.layers for weight in layer.weights}
+	return [(layer_names.get(id(weight), ""), weight.name) for weight in model.weights]
+
+def _read_epoch_weights(models_dir, model_type, epochs):
+	for epoch in epochs:
+		path = get_saved_model_path(model_type, epoch, models_dir)
+		if is_weights_snapshot(path):
+			yield epoch, read_weights_snapshot(path), path
+		else:
+			yield epoch, load_model(path, cached = False).get_weights(), path
+
+def pack_run(models_dir, model_type):
+	epochs = get_checkpoint_index(models_dir).epochs(model_type)
+	if not epochs:
+		print(f"==> No {model_type} saved in {models_dir}, skipped")
+		return
+
+	# The architecture is saved too, .keras runs did not have one outside of their archives
+	model = load_model(get_saved_model_path(model_type, epochs[0], models_dir), cached = False)
+	save_architecture(model, get_architecture_path(models_dir, model_type))
+
+	write_weight_store(models_dir, model_type, _weight_names(model), _read_epoch_weights(models_dir, model_type, epochs))
+
+def print_layer_norms(models_dir, model_type):
+	weight_store = get_weight_store(models_dir, model_type)
+	if weight_store is None:
+		return
+
+	print(f"==> Weight norms of {model_type} at epochs {weight_store.epochs[0]} .. {weight_store.epochs[-1]}")
+	for layer_name, norms in weight_store.layer_norms().items():
+		print(f"{layer_name:<40}" + " ".join(f"{norm:.3f}" for norm in norms))
+
+def main():
+	parser = argparse.ArgumentParser(description = "Pack the weights of every epoch of a run into one memory-mapped file per model type.")
+	parser.add_argument("--runs", nargs = "+", help = "run directories, e.g. model_0_small-ls_0121, every trained run by default")
+	parser.add_argument("--model-types", nargs = "+", default = list(MODEL_TYPES), choices = MODEL_TYPES)
+	parser.add_argument("--norms", action = "store_true", help = "print the weight norm of every layer across the packed epochs")
+	add_settings_arguments(parser)
+	args = parser.parse_args()
+	settings = configure_from_arguments(args)
+
+	for run in args.runs or settings.trained_runs:
+		models_dir = os.path.join(settings.models_root_path, run, "models")
+		for model_type in args.model_types:
+			print(f"==> Packing {run} {model_type}")
+			pack_run(models_dir, model_type)
+			if args.norms:
+				print_layer_norms(models_dir, model_type)
+
+if __name__ == "__main__":
+	main()
@@ -1,21 +1,23 @@
-from save_stats_plot import MODELS_ROOT_PATH, RESULTS_ROOT_PATH
-import keras
+from pathlib import Path
+
 import numpy as np
 import cv2
-from keras.preprocessing.image import img_to_array
-from config import rgb_images
+
+from config import get_settings, rgb_images
+from ganalyzer.misc import get_saved_model_path, load_model
+from ganalyzer.run_metadata import get_run_metadata
 
 def get_fake_images_sample(generator_name, length_evolution, nb_changes):
 	gen_epoch = 300
 	print('Generating fake images using ', generator_name, gen_epoch)
 	epoch_number = int(str(gen_epoch).replace("epoch_", ""))
 
-	generator_path = MODELS_ROOT_PATH / generator_name / "models" / f"generator_epoch_{epoch_number:06d}.keras"
-	output_dir = RESULTS_ROOT_PATH / "evolution_sample"
+	generator_path = get_saved_model_path("generator", epoch_number, Path(get_settings().models_root_path) / generator_name / "models")
+	output_dir = Path(get_settings().results_root_path) / "evolution_sample"
 	output_dir.mkdir(parents = True, exist_ok = True)
 
-	generator = keras.models.load_model(generator_path)
-	ls_size = int(generator_name.split("_")[-1])
+	generator = load_model(generator_path)
+	ls_size = get_run_metadata(Path(get_settings().models_root_path) / generator_name)["latent_dim"]
 
 	latent_vector = np.random.normal(0.0, 1.0, size = (1, ls_size))
 
@@ -33,7 +35,7 @@ def get_fake_images_sample(generator_name, length_evolution, nb_changes):
 			image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
 			image = np.expand_dims(image, axis = -1)
 
-		new_image = img_to_array(image.astype("float32"))
+		new_image = image.astype("float32")
 		output_image = new_image
 
 		output_image = (output_image + 1.0) / 2.0  ##temp fix 1
@@ -46,6 +48,7 @@ def get_fake_images_sample(generator_name, length_evolution, nb_changes):
 		output_path = output_dir / f"evo_{i + 1:04d}.png"
 		cv2.imwrite(str(output_path), output_image)
 
-length_evolution = 100
-nb_changes = 10
-get_fake_images_sample("model_1_small_with_h-ls_0121", length_evolution, nb_changes)
+if __name__ == "__main__":
+	length_evolution = 100
+	nb_changes = 10
+	get_fake_images_sample("model_1_small_with_h-ls_0121", length_evolution, nb_changes)
@@ -1,10 +1,12 @@
-from config import rgb_images
-from save_stats_plot import MODELS_ROOT_PATH, RESULTS_ROOT_PATH
-import keras
+from pathlib import Path
+
 import numpy as np
 import random
 import cv2
-from keras.preprocessing.image import img_to_array
+
+from config import get_settings, rgb_images
+from ganalyzer.misc import get_saved_model_path, load_model
+from ganalyzer.run_metadata import get_run_metadata
 
 def apply_model(generator, latent_vector):
 	latent_array = np.expand_dims(np.asarray(latent_vector, dtype = "float32"), axis = 0)
@@ -15,7 +17,7 @@ def apply_model(generator, latent_vector):
 		image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
 		image = np.expand_dims(image, axis = -1)
 
-	new_image = img_to_array(image.astype("float32"))
+	new_image = image.astype("float32")
 	output_image = new_image
 
 	output_image = (output_image + 1.0) / 2.0  ##temp fix 1
@@ -98,14 +100,15 @@ def main_search(generator_name, quantity_initial_random, quantity_genetic_evolut
 	# open generator
 	gen_epoch = 300
 	epoch_number = int(str(gen_epoch).replace("epoch_", ""))
-	generator_path = MODELS_ROOT_PATH / generator_name / "models" / f"generator_epoch_{epoch_number:06d}.keras"
-	output_dir = RESULTS_ROOT_PATH / "imitation"
-	generator = keras.models.load_model(generator_path)
-	ls_size = int(generator_name.split("_")[-1])
+	generator_path = get_saved_model_path("generator", epoch_number, Path(get_settings().models_root_path) / generator_name / "models")
+	output_dir = Path(get_settings().results_root_path) / "imitation"
+	generator = load_model(generator_path)
+	ls_size = get_run_metadata(Path(get_settings().models_root_path) / generator_name)["latent_dim"]
 
 	# open goal image
 	goal_image_path = output_dir / "goal_image.png"
-	goal = keras.utils.img_to_array(keras.utils.load_img(goal_image_path))
+	# Same RGB float32 array keras.utils.load_img gave, without importing keras before the generator is loaded
+	goal = cv2.cvtColor(cv2.imread(str(goal_image_path), cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB).astype("float32")
 
 	best_latent_vector = search_random(generator, goal, ls_size, quantity_initial_random)
 
@@ -117,4 +120,5 @@ def main_search(generator_name, quantity_initial_random, quantity_genetic_evolut
 	print('==> Result : ', best_latent_vector)
 	print("==> Total diff : ", get_difference_with_original(generator, best_latent_vector, goal))
 
-main_search("model_1_small_with_h-ls_0121", 1000, 1000, 3)
\ No newline at end of file
+if __name__ == "__main__":
+	main_search("model_1_small_with_h-ls_0121", 1000, 1000, 3)
\ No newline at end of file
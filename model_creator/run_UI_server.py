@@ -1,10 +1,13 @@
 
-from config import GUI_tkinter
+from config import GUI_tkinter, epoch_scrubbing
 from ganalyzer.GUITkinter import GUITkinter
-from ganalyzer.GUIWebPage import GUIWebPage, get_models_generator_and_discriminator
+from ganalyzer.GUIWebPage import GUIWebPage, get_epoch_scrubbers, get_models_generator_and_discriminator
 
 if GUI_tkinter:
-	generators_list, discriminators_list = get_models_generator_and_discriminator("model_0_small", 121)
+	if epoch_scrubbing:
+		generators_list, discriminators_list = get_epoch_scrubbers("model_0_small", 121)
+	else:
+		generators_list, discriminators_list = get_models_generator_and_discriminator("model_0_small", 121)
 
 	main_gui = GUITkinter(generators_list, discriminators_list)
 
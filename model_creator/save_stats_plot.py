@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import argparse
 import csv
 from dataclasses import dataclass
 from pathlib import Path
@@ -8,31 +9,18 @@ import matplotlib
 import colorsys
 import numpy as np
 import random
-import cv2
-import keras
-from keras.preprocessing.image import img_to_array
 import statistics
-from tensorflow.keras.models import load_model
 
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
-from config import PLOTS_ROOT_DIRECTORY, every_models_statistics_path, results_root_path, rgb_images, nb_comparisons, dataset_path, latent_dimension_generator, latent_dimension_generator_available, models_directory, models_root_path, nb_epoch_taken_comparison, PLOTS_HEATMAP_EPOCHS_DIRECTORY, \
-	PLOTS_HEATMAP_MODEL_SIZE_DIRECTORY, PLOTS_HEATMAP_LATENT_SPACE_SIZE_DIRECTORY, RESULTS_DIRECTORY, PATH_LOSS_PLOTS, PATH_LOSS_BY_LS_PLOTS, PATH_LOSS_BY_MODEL_PLOTS, PLOTS_NUMBER_PARAMETERS_DIRECTORY
+from config import add_settings_arguments, configure_from_arguments, ensure_directories, get_settings, rgb_images, nb_comparisons, latent_dimension_generator_available, nb_epoch_taken_comparison
+from ganalyzer.checkpoint_index import get_checkpoint_index
+from ganalyzer.misc import get_saved_model_path, load_model
 from ganalyzer.model_config import all_models
+from ganalyzer.run_metadata import get_run_metadata
 
 STATISTICS_FILENAME = "statistics.csv"
-PLOTS_ROOT_DIRECTORY_PATH = Path(PLOTS_ROOT_DIRECTORY)
-RESULTS_ROOT_PATH = Path(results_root_path)
-MODELS_ROOT_PATH = Path(models_root_path)
-DATASET_PATH = Path(dataset_path)
-PLOTS_NUMBER_PARAMETERS_PATH = Path(PLOTS_NUMBER_PARAMETERS_DIRECTORY)
-PLOTS_HEATMAP_EPOCHS_PATH = Path(PLOTS_HEATMAP_EPOCHS_DIRECTORY)
-PLOTS_HEATMAP_MODEL_SIZE_PATH = Path(PLOTS_HEATMAP_MODEL_SIZE_DIRECTORY)
-PLOTS_HEATMAP_LATENT_SPACE_SIZE_PATH = Path(PLOTS_HEATMAP_LATENT_SPACE_SIZE_DIRECTORY)
-PATH_LOSS_PLOTS_PATH = Path(PATH_LOSS_PLOTS)
-PATH_LOSS_PLOTS_BY_LS_PATH = Path(PATH_LOSS_BY_LS_PLOTS)
-PATH_LOSS_PLOTS_BY_MODEL_PATH = Path(PATH_LOSS_BY_MODEL_PLOTS)
 
 @dataclass
 class Statistics:
@@ -124,8 +112,8 @@ def _plot_combined_losses(color_list, stats_by_model):
 			discriminator_series.append((model_name, stats.discriminator_loss))
 
 	# original
-	_plot_loss_series(color_list, generator_series, PATH_LOSS_PLOTS_PATH / "every_generator_loss.jpg", "Generator Loss Over Epochs")
-	_plot_loss_series(color_list, discriminator_series, PATH_LOSS_PLOTS_PATH / "every_discriminator_loss.jpg", "Discriminator Loss Over Epochs")
+	_plot_loss_series(color_list, generator_series, Path(get_settings().loss_plots_directory) / "every_generator_loss.jpg", "Generator Loss Over Epochs")
+	_plot_loss_series(color_list, discriminator_series, Path(get_settings().loss_plots_directory) / "every_discriminator_loss.jpg", "Discriminator Loss Over Epochs")
 
 	# by model_sizes
 	for current_plot_model in all_models:
@@ -136,7 +124,7 @@ def _plot_combined_losses(color_list, stats_by_model):
 				this_generator_series.append(current_elem_in_series)
 
 		color_list = get_colors_associated(generate_colors(len(this_generator_series)), [name[0] for name in this_generator_series])
-		_plot_loss_series(color_list, this_generator_series, PATH_LOSS_PLOTS_BY_MODEL_PATH / str(current_plot_model + "_generator_loss.jpg"), "Generator Loss Over Epochs for " + current_plot_model)
+		_plot_loss_series(color_list, this_generator_series, Path(get_settings().loss_by_model_plots_directory) / str(current_plot_model + "_generator_loss.jpg"), "Generator Loss Over Epochs for " + current_plot_model)
 
 		print('===> Current plot discriminator', current_plot_model)
 		this_discriminator_series = []
@@ -145,7 +133,7 @@ def _plot_combined_losses(color_list, stats_by_model):
 				this_discriminator_series.append(current_elem_in_series)
 
 		color_list = get_colors_associated(generate_colors(len(this_discriminator_series)), [name[0] for name in this_discriminator_series])
-		_plot_loss_series(color_list, this_discriminator_series, PATH_LOSS_PLOTS_BY_MODEL_PATH / str(current_plot_model + "_discriminator_loss.jpg"), "Discriminator Loss Over Epochs for " + current_plot_model)
+		_plot_loss_series(color_list, this_discriminator_series, Path(get_settings().loss_by_model_plots_directory) / str(current_plot_model + "_discriminator_loss.jpg"), "Discriminator Loss Over Epochs for " + current_plot_model)
 
 	# by ls_size
 	ls_sizes_as_string = [get_ls_name(curr_ls) for curr_ls in latent_dimension_generator_available]
@@ -158,7 +146,7 @@ def _plot_combined_losses(color_list, stats_by_model):
 				this_generator_series.append(current_elem_in_series)
 
 		color_list = get_colors_associated(generate_colors(len(this_generator_series)), [name[0] for name in this_generator_series])
-		_plot_loss_series(color_list, this_generator_series, PATH_LOSS_PLOTS_BY_LS_PATH / str(current_plot_ls_size + "_generator_loss.jpg"), "Generator Loss Over Epochs for " + current_plot_ls_size)
+		_plot_loss_series(color_list, this_generator_series, Path(get_settings().loss_by_ls_plots_directory) / str(current_plot_ls_size + "_generator_loss.jpg"), "Generator Loss Over Epochs for " + current_plot_ls_size)
 
 		print('===> Current plot discriminator', current_plot_ls_size)
 		this_discriminator_series = []
@@ -167,32 +155,16 @@ def _plot_combined_losses(color_list, stats_by_model):
 				this_discriminator_series.append(current_elem_in_series)
 
 		color_list = get_colors_associated(generate_colors(len(this_generator_series)), [name[0] for name in this_generator_series])
-		_plot_loss_series(color_list, this_discriminator_series, PATH_LOSS_PLOTS_BY_LS_PATH / str(current_plot_ls_size + "_discriminator_loss.jpg"), "Discriminator Loss Over Epochs for " + current_plot_ls_size)
+		_plot_loss_series(color_list, this_discriminator_series, Path(get_settings().loss_by_ls_plots_directory) / str(current_plot_ls_size + "_discriminator_loss.jpg"), "Discriminator Loss Over Epochs for " + current_plot_ls_size)
 
 def get_number_parameters(model_name, model_type = "discriminator"):
-	model_path = MODELS_ROOT_PATH / model_name / "models"
-	complete_models_list = sorted([path for path in model_path.iterdir() if path.is_file()])
-
-	if not complete_models_list:
-		return 0
-
-	if model_type == "discriminator":
-		total_path = complete_models_list[0]
-	elif model_type == "generator":
-		total_path = complete_models_list[-1]
-	else:
-		return 0
-
-	model = load_model(total_path)
-	nb_params = sum([layer.count_params() for layer in model.layers if layer.trainable])
-	return nb_params
+	return get_run_metadata(Path(get_settings().models_root_path) / model_name)[model_type]["parameters"]
 
 def _get_model_indexes(model_name):
-	model_size = model_name.split("-")[0]
-	latent_size = int(model_name.split("-")[1].split("_")[1])
+	metadata = get_run_metadata(Path(get_settings().models_root_path) / model_name)
 
-	idx_x = all_models.index(model_size)
-	idx_y = [str(elem) for elem in latent_dimension_generator_available].index(str(latent_size))
+	idx_x = all_models.index(metadata["model_name"])
+	idx_y = latent_dimension_generator_available.index(metadata["latent_dim"])
 
 	return idx_x, idx_y
 
@@ -264,7 +236,7 @@ def _plot_median_time_per_epoch(stats_by_model, output_dir):  # todo merge with
 def _collect_statistics_by_model():
 	stats_by_model = {}
 
-	for model_directory in every_models_statistics_path:
+	for model_directory in get_settings().every_models_statistics_path:
 		directory_path = Path(model_directory)
 		csv_path = directory_path / STATISTICS_FILENAME
 		if not csv_path.exists():
@@ -288,27 +260,32 @@ def get_colors_associated(colors_list, stats):
 
 	return result
 
-def _generate_combined_statistics_plots():
+def _generate_combined_statistics_plots(stats_only = False):
 	stats_by_model = _collect_statistics_by_model()
 
-	PLOTS_ROOT_DIRECTORY_PATH.mkdir(parents = True, exist_ok = True)
+	ensure_directories(Path(get_settings().plots_root_directory), Path(get_settings().plots_number_parameters_directory), Path(get_settings().plots_heatmap_epochs_directory), Path(get_settings().plots_heatmap_model_size_directory), Path(get_settings().plots_heatmap_latent_space_size_directory), Path(get_settings().loss_by_ls_plots_directory), Path(get_settings().loss_by_model_plots_directory))
 
 	colors_list_with_names = get_colors_associated(generate_colors(len(stats_by_model)), [name for name in stats_by_model.keys()])
 
-	save_all_comparisons_models()
+	# The comparison heatmaps are the only plots running models, everything else reads statistics.csv and metadata.json
+	if not stats_only:
+		save_all_comparisons_models()
 
 	_plot_combined_losses(colors_list_with_names, stats_by_model)
 
-	_plot_current_number_epoch(stats_by_model, PLOTS_ROOT_DIRECTORY_PATH)
+	_plot_current_number_epoch(stats_by_model, Path(get_settings().plots_root_directory))
 
-	_plot_number_parameters(stats_by_model, PLOTS_NUMBER_PARAMETERS_PATH, "discriminator")
-	_plot_number_parameters(stats_by_model, PLOTS_NUMBER_PARAMETERS_PATH, "generator")
+	_plot_number_parameters(stats_by_model, Path(get_settings().plots_number_parameters_directory), "discriminator")
+	_plot_number_parameters(stats_by_model, Path(get_settings().plots_number_parameters_directory), "generator")
 
-	_plot_median_time_per_epoch(stats_by_model, PLOTS_ROOT_DIRECTORY_PATH)
+	_plot_median_time_per_epoch(stats_by_model, Path(get_settings().plots_root_directory))
 
 def get_real_images_sample():
+	import cv2
+	from keras.preprocessing.image import img_to_array
+
 	print('getting real images ')
-	dataset_directory = DATASET_PATH
+	dataset_directory = Path(get_settings().dataset_path)
 
 	image_paths = [path for path in sorted(dataset_directory.iterdir()) if path.is_file()]
 
@@ -331,13 +308,16 @@ def get_real_images_sample():
 	return images
 
 def get_fake_images_sample(generator_name, generator_epoch):
+	import cv2
+	from keras.preprocessing.image import img_to_array
+
 	print('Generating fake images using ', generator_name, generator_epoch)
 	epoch_number = int(str(generator_epoch).replace("epoch_", ""))
 
-	generator_path = MODELS_ROOT_PATH / generator_name / "models" / f"generator_epoch_{epoch_number:06d}.keras"
+	generator_path = get_saved_model_path("generator", epoch_number, Path(get_settings().models_root_path) / generator_name / "models")
 
-	generator = keras.models.load_model(generator_path)
-	ls_size = int(generator_name.split("_")[-1])
+	generator = load_model(generator_path)
+	ls_size = get_run_metadata(Path(get_settings().models_root_path) / generator_name)["latent_dim"]
 	latent_vectors = np.random.normal(0.0, 1.0, size = (nb_comparisons, ls_size))
 
 	generated_images = generator(latent_vectors, training = False).numpy()
@@ -361,9 +341,9 @@ def get_accuracy_on_images(model_name, model_epoch, images_set, is_real_images):
 
 	epoch_number = int(str(model_epoch).replace("epoch_", ""))
 
-	model_path = MODELS_ROOT_PATH / model_name / "models" / f"discriminator_epoch_{epoch_number:06d}.keras"
+	model_path = get_saved_model_path("discriminator", epoch_number, Path(get_settings().models_root_path) / model_name / "models")
 
-	discriminator = keras.models.load_model(model_path)
+	discriminator = load_model(model_path)
 	images_array = np.asarray(images_set, dtype = np.float32)
 	predictions = np.squeeze(discriminator(images_array, training = False).numpy())
 
@@ -406,33 +386,12 @@ def save_all_comparisons_models():
 	produce_heatmap_latent_space()
 
 def get_number_epoch_in_given_setting(setting):
-	setting_models_directory = MODELS_ROOT_PATH / setting / "models"
-
-	if not setting_models_directory.exists():
-		return 0
-
-	max_epoch = 0
-
-	for model_file in setting_models_directory.iterdir():
-		if not model_file.is_file():
-			continue
-
-		if not model_file.name.endswith(".keras"):
-			continue
-
-		try:
-			current_epoch = int(model_file.stem.split("_")[-1])
-		except ValueError:
-			continue
-
-		max_epoch = max(max_epoch, current_epoch)
-
-	return max_epoch
+	return get_checkpoint_index(Path(get_settings().models_root_path) / setting / "models").latest_epoch()
 
 def produce_heatmap_epoch():
-	available_settings = [entry.name for entry in MODELS_ROOT_PATH.iterdir() if entry.is_dir()]
-	if PLOTS_ROOT_DIRECTORY_PATH.name in available_settings:
-		available_settings.remove(PLOTS_ROOT_DIRECTORY_PATH.name)
+	available_settings = [entry.name for entry in Path(get_settings().models_root_path).iterdir() if entry.is_dir()]
+	if Path(get_settings().plots_root_directory).name in available_settings:
+		available_settings.remove(Path(get_settings().plots_root_directory).name)
 
 	for current_setting in available_settings:
 		print("====> Current setting : ", current_setting)
@@ -447,7 +406,7 @@ def produce_heatmap_epoch():
 				comparisons_elements.append((current_setting, epoch_name))
 				current_epoch = current_epoch + step
 
-			save_comparisons_models(comparisons_elements, PLOTS_HEATMAP_EPOCHS_PATH, current_setting)
+			save_comparisons_models(comparisons_elements, Path(get_settings().plots_heatmap_epochs_directory), current_setting)
 
 def get_epoch_name(current_epoch):  # TODO use this in train etc
 	return "epoch_" + ((6 - len(str(current_epoch))) * "0") + str(current_epoch)
@@ -472,7 +431,7 @@ def produce_heatmap_model_size():
 
 			print("==> Current model : ", current_model, " nb epochs ", epoch_name, " result ", new_elem)
 
-		save_comparisons_models(comparisons_elements, PLOTS_HEATMAP_MODEL_SIZE_PATH, "ls_size =  " + str(current_latent_dimension_generator))
+		save_comparisons_models(comparisons_elements, Path(get_settings().plots_heatmap_model_size_directory), "ls_size =  " + str(current_latent_dimension_generator))
 
 def produce_heatmap_latent_space():
 	for current_model in all_models:
@@ -486,7 +445,7 @@ def produce_heatmap_latent_space():
 			new_elem = (total_name, epoch_name)
 			comparisons_elements.append(new_elem)
 
-		save_comparisons_models(comparisons_elements, PLOTS_HEATMAP_LATENT_SPACE_SIZE_PATH, "model_size " + current_model)
+		save_comparisons_models(comparisons_elements, Path(get_settings().plots_heatmap_latent_space_size_directory), "model_size " + current_model)
 
 def generate_colors(n):
 	colors = []
@@ -540,9 +499,18 @@ def save_comparisons_models(comparisons_elements, directory, setting_name):
 			ax.text(j, i, str(round(data_as_percentage, 1)) + "%", ha = "center", va = "center", color = color, fontsize = 4)
 
 	plt.subplots_adjust(bottom = 0.6)
-	# plt.savefig(Path(PLOTS_ROOT_DIRECTORY_PATH, "heatmap.png"), dpi = 300)
+	# plt.savefig(Path(get_settings().plots_root_directory, "heatmap.png"), dpi = 300)
 	plt.savefig(Path(directory) / f"{setting_name}.png", dpi = 300)
 	plt.close()
 
+def main():
+	parser = argparse.ArgumentParser(description = "Plot the statistics of every trained run.")
+	parser.add_argument("--stats-only", action = "store_true", help = "only the plots made from statistics.csv and metadata.json, without loading TensorFlow or any checkpoint")
+	add_settings_arguments(parser)
+	args = parser.parse_args()
+	configure_from_arguments(args)
+
+	_generate_combined_statistics_plots(stats_only = args.stats_only)
+
 if __name__ == "__main__":
-	_generate_combined_statistics_plots()
+	main()
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import argparse
+
+from config import add_settings_arguments, configure_from_arguments, web_server_threads
+
+def main():
+	parser = argparse.ArgumentParser(description = "Serve the web GUI with waitress instead of the Flask development server.")
+	parser.add_argument("--host", default = "127.0.0.1")
+	parser.add_argument("--port", type = int, default = 5000)
+	parser.add_argument("--threads", type = int, default = web_server_threads)
+	add_settings_arguments(parser)
+	args = parser.parse_args()
+	configure_from_arguments(args)
+
+	import waitress
+	from wsgi import app
+
+	print(f"==> Serving the web GUI on {args.host}:{args.port} with {args.threads} threads")
+	waitress.serve(app, host = args.host, port = args.port, threads = args.threads)
+
+if __name__ == "__main__":
+	main()
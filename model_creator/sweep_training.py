@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from config import latent_dimension_generator_available
+from ganalyzer.misc import get_current_epoch, model_directory_for
+from ganalyzer.model_config import all_models
+
+MODEL_CREATOR_DIRECTORY = Path(__file__).resolve().parent
+
+@dataclass
+class SweepRun:
+	model_name: str
+	latent_dimension: int
+
+	@property
+	def name(self):
+		return f"{self.model_name}-ls_{self.latent_dimension:04d}"
+
+	@property
+	def models_directory(self):
+		return model_directory_for(self.model_name, self.latent_dimension)
+
+def get_sweep_runs(model_names, latent_dimensions, number_of_epochs) -> List[SweepRun]:
+	runs = []
+
+	for model_name in model_names:
+		for latent_dimension in latent_dimensions:
+			run = SweepRun(model_name, latent_dimension)
+
+			# get_current_epoch is relative to the working directory, like every path of config.py
+			current_epoch = get_current_epoch(str(MODEL_CREATOR_DIRECTORY / run.models_directory))
+			if current_epoch >= number_of_epochs:
+				print(f"==> {run.name} already reached epoch {current_epoch}, skipped")
+				continue
+
+			print(f"==> {run.name} will resume from epoch {current_epoch}")
+			runs.append(run)
+
+	return runs
+
+def get_core_sets(workers, cores_per_worker) -> List[Optional[List[int]]]:
+	if not hasattr(os, "sched_getaffinity"):
+		return [None] * workers
+
+	available_cores = sorted(os.sched_getaffinity(0))
+	if cores_per_worker * workers > len(available_cores):
+		raise ValueError(f"{workers} workers with {cores_per_worker} cores each need more than the {len(available_cores)} available cores")
+
+	return [available_cores[index * cores_per_worker:(index + 1) * cores_per_worker] for index in range(workers)]
+
+def launch_run(run: SweepRun, cores, threads, number_of_epochs):
+	# Every run is its own process, config.py reads its run from the environment instead of shared globals
+	environment = dict(
+		os.environ,
+		GANALYZER_MODEL_NAME = run.model_name,
+		GANALYZER_LATENT_DIMENSION = str(run.latent_dimension),
+		GANALYZER_NUMBER_OF_EPOCHS = str(number_of_epochs),
+		GANALYZER_TRAINING_THREADS = str(threads),
+		OMP_NUM_THREADS = str(threads),
+	)
+
+	log_path = MODEL_CREATOR_DIRECTORY / Path(run.models_directory).parent / "train.log"
+	log_path.parent.mkdir(parents = True, exist_ok = True)
+	log_file = log_path.open("a", encoding = "utf-8")
+
+	preexec_fn = None
+	if cores is not None:
+		preexec_fn = lambda: os.sched_setaffinity(0, cores)
+
+	process = subprocess.Popen(
+		[sys.executable, "train_model.py"],
+		cwd = MODEL_CREATOR_DIRECTORY,
+		env = environment,
+		stdout = log_file,
+		stderr = subprocess.STDOUT,
+		preexec_fn = preexec_fn,
+	)
+	return process, log_file
+
+def run_sweep(runs: List[SweepRun], workers, cores_per_worker, number_of_epochs, poll_interval = 5.0):
+	free_core_sets = get_core_sets(workers, cores_per_worker)
+	pending_runs = list(runs)
+	running = {}
+	failed_runs = []
+
+	while pending_runs or running:
+		while pending_runs and free_core_sets:
+			run = pending_runs.pop(0)
+			cores = free_core_sets.pop(0)
+			print(f"==> Starting {run.name} on cores {cores}")
+			running[run.name] = (run, cores, *launch_run(run, cores, cores_per_worker, number_of_epochs))
+
+		time.sleep(poll_interval)
+
+		for name, (run, cores, process, log_file) in list(running.items()):
+			return_code = process.poll()
+			if return_code is None:
+				continue
+
+			log_file.close()
+			free_core_sets.append(cores)
+			del running[name]
+
+			if return_code == 0:
+				print(f"==> {name} finished")
+			else:
+				print(f"==> {name} failed with exit code {return_code}, see its train.log")
+				failed_runs.append(run)
+
+	return failed_runs
+
+def main():
+	parser = argparse.ArgumentParser(description = "Train every (model, latent size) combination, several runs in parallel.")
+	parser.add_argument("--models", nargs = "+", default = all_models)
+	parser.add_argument("--latent-dimensions", nargs = "+", type = int, default = latent_dimension_generator_available)
+	parser.add_argument("--epochs", type = int, default = 100, help = "last epoch of every run, unfinished runs resume from their latest checkpoint")
+	parser.add_argument("--workers", type = int, default = 2)
+	parser.add_argument("--cores-per-worker", type = int, default = max(1, (os.cpu_count() or 1) // 2))
+	args = parser.parse_args()
+
+	runs = get_sweep_runs(args.models, args.latent_dimensions, args.epochs)
+	failed_runs = run_sweep(runs, args.workers, args.cores_per_worker, args.epochs)
+
+	if failed_runs:
+		print("==> Failed runs : ", ", ".join(run.name for run in failed_runs))
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
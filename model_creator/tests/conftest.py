@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts import config and ganalyzer from model_creator, the tests do the same
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from ganalyzer.checkpoint_index import CheckpointIndex, closest_epoch, parse_checkpoint_filename
+
+@pytest.mark.parametrize("epoch, expected", [
+	(-5, 0),
+	(0, 0),
+	(4, 0),
+	(5, 0),
+	(6, 10),
+	(10, 10),
+	(17, 20),
+	(25, 20),
+	(1000, 30),
+])
+def test_closest_epoch_prefers_the_lower_one_on_ties(epoch, expected):
+	assert closest_epoch([0, 10, 20, 30], epoch) == expected
+
+def test_closest_epoch_of_a_single_epoch():
+	assert closest_epoch([7], 0) == 7
+	assert closest_epoch([7], 100) == 7
+
+def test_closest_epoch_without_epochs():
+	with pytest.raises(ValueError):
+		closest_epoch([], 3)
+
+def _save(models_dir, filename, content = b"weights"):
+	with open(models_dir / filename, "wb") as model_file:
+		model_file.write(content)
+
+def test_index_closest_epoch_per_model_type(tmp_path):
+	models_dir = tmp_path / "models"
+	models_dir.mkdir()
+	for epoch in (0, 10, 20):
+		_save(models_dir, f"generator_epoch_{epoch}.keras")
+	_save(models_dir, "discriminator_epoch_5.weights.npz")
+	_save(models_dir, "notes.txt")
+
+	index = CheckpointIndex(str(models_dir))
+
+	assert index.epochs("generator") == [0, 10, 20]
+	assert index.epochs("discriminator") == [5]
+	assert index.closest_epoch("generator", 14) == 10
+	assert index.closest_epoch("generator", 16) == 20
+	assert index.closest_epoch("discriminator", 100) == 5
+	assert index.latest_epoch() == 20
+
+def test_index_notices_new_checkpoints(tmp_path):
+	models_dir = tmp_path / "models"
+	models_dir.mkdir()
+	_save(models_dir, "generator_epoch_0.keras")
+	index = CheckpointIndex(str(models_dir))
+	assert index.closest_epoch("generator", 50) == 0
+
+	_save(models_dir, "generator_epoch_40.keras")
+	# The directory mtime may not move within its resolution, make sure it does
+	stat = os.stat(models_dir)
+	os.utime(models_dir, ns = (stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+	assert index.closest_epoch("generator", 50) == 40
+
+def test_parse_checkpoint_filename():
+	assert parse_checkpoint_filename("generator_epoch_12.keras") == ("generator", 12)
+	assert parse_checkpoint_filename("discriminator_epoch_3.weights.npz") == ("discriminator", 3)
+	assert parse_checkpoint_filename("generator_epoch_12.h5") is None
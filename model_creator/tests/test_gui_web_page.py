@@ -0,0 +1,70 @@
+import threading
+
+import numpy as np
+
+from ganalyzer.GUIWebPage import create_app
+from ganalyzer.micro_batcher import MicroBatcher
+from ganalyzer.serving import BoundedExecutor, SharedRegistry
+
+class _ServedRun:
+	"""Stands for the shared models of a run, the first forward pass blocks until released."""
+
+	def __init__(self, run_key):
+		self.layer_names = ["0) input", "1) dense"]
+		self.sample_shape = (3,)
+		self.epochs_quantity = 5
+		self.latest_epoch = 4
+		self.batch_sizes = []
+		self.first_started = threading.Event()
+		self.release_first = threading.Event()
+
+	def resolve(self, epoch):
+		return min(max(epoch, 0), self.latest_epoch)
+
+	def __call__(self, saved_epoch, inputs, layer_indexes):
+		self.batch_sizes.append(len(inputs))
+		if len(self.batch_sizes) == 1:
+			self.first_started.set()
+			self.release_first.wait(5)
+		return [inputs * saved_epoch for _ in layer_indexes]
+
+def _post(app, session_id, route, payload):
+	return app.test_client().post(route, json = payload, headers = {"X-Session-Id": session_id})
+
+def _predict(app, session_id, value):
+	payload = {"which_model": "discriminator", "layer_name": "1) dense", "input_data": [value] * 3}
+	return _post(app, session_id, "/get-model-prediction", payload).get_json()["output_values"]
+
+def test_sessions_on_the_same_checkpoint_share_models_and_batches():
+	served_runs = SharedRegistry(_ServedRun)
+	executor = BoundedExecutor(max_workers = 2, max_pending = 4)
+	app = create_app(
+		executor = executor,
+		batcher = MicroBatcher(max_batch_size = 2, max_wait_ms = 5000),
+		served_runs = served_runs,
+	)
+	try:
+		for session_id in ("a", "b"):
+			assert _post(app, session_id, "/sync-server", {"model_size": "model_0_small", "latent_space_size": 3}).status_code == 200
+			assert _post(app, session_id, "/change-epoch", {"which_model": "discriminator", "new_epoch": 2}).get_json() == {"new_epoch_found": 2}
+		assert served_runs.stats()["builds"] == 2
+
+		served_run = served_runs.acquire(("model_0_small", 3, "discriminator"))
+		results = {}
+		first = threading.Thread(target = lambda: results.update(first = _predict(app, "a", 1.0)))
+		first.start()
+		assert served_run.first_started.wait(5)
+
+		# The checkpoint is busy, the requests of both sessions are gathered into one batch of two
+		threads = [threading.Thread(target = lambda session_id = session_id, value = value: results.update({session_id: _predict(app, session_id, value)})) for session_id, value in (("a", 2.0), ("b", 3.0))]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join(timeout = 10)
+		served_run.release_first.set()
+		first.join(timeout = 10)
+
+		assert served_run.batch_sizes == [1, 2]
+		assert results == {"first": [[[2.0] * 3]], "a": [[[4.0] * 3]], "b": [[[6.0] * 3]]}
+	finally:
+		executor.shutdown()
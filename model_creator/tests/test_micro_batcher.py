@@ -0,0 +1,150 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from ganalyzer.inference_engine import batch_sizes_up_to
+from ganalyzer.micro_batcher import MicroBatcher
+
+def _doubled(batch_sizes):
+	def function(batch):
+		batch_sizes.append(len(batch))
+		return [batch * 2, batch + 1]
+	return function
+
+def _run_concurrently(targets):
+	threads = [threading.Thread(target = target) for target in targets]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join(timeout = 10)
+
+def test_lone_request_runs_without_waiting():
+	batcher = MicroBatcher(max_batch_size = 8, max_wait_ms = 5000)
+	batch_sizes = []
+
+	start = time.perf_counter()
+	outputs = batcher.run("key", _doubled(batch_sizes), np.array([[1.0, 2.0]]))
+
+	assert time.perf_counter() - start < 1
+	assert batch_sizes == [1]
+	np.testing.assert_array_equal(outputs[0], [[2.0, 4.0]])
+	np.testing.assert_array_equal(outputs[1], [[2.0, 3.0]])
+
+def test_leader_waits_for_requests_arriving_while_the_key_is_busy():
+	batcher = MicroBatcher(max_batch_size = 8, max_wait_ms = 200)
+	batch_sizes = []
+	first_started = threading.Event()
+	release_first = threading.Event()
+	results = {}
+
+	def slow(batch):
+		batch_sizes.append(len(batch))
+		first_started.set()
+		release_first.wait(5)
+		return [batch]
+
+	def run(name, value, function):
+		results[name] = batcher.run("key", function, np.array([[value]]))
+
+	first = threading.Thread(target = run, args = ("first", 0.0, slow))
+	first.start()
+	assert first_started.wait(5)
+
+	# The key is busy, the next leader waits max_wait_ms and the others join its batch
+	def release_later():
+		time.sleep(0.05)
+		release_first.set()
+
+	_run_concurrently([lambda value = value: run(value, float(value), _doubled(batch_sizes)) for value in range(1, 4)] + [release_later])
+	first.join(timeout = 10)
+
+	assert sorted(batch_sizes) == [1, 3]
+	for value in range(1, 4):
+		np.testing.assert_array_equal(results[value][0], [[value * 2.0]])
+	assert batcher.stats()["batches"] == 2
+
+def test_batch_closes_at_max_batch_size_without_waiting_for_max_wait():
+	batcher = MicroBatcher(max_batch_size = 2, max_wait_ms = 5000)
+	batch_sizes = []
+	first_started = threading.Event()
+	release_first = threading.Event()
+
+	def slow(batch):
+		first_started.set()
+		release_first.wait(5)
+		return [batch]
+
+	first = threading.Thread(target = batcher.run, args = ("key", slow, np.zeros((1, 1))))
+	first.start()
+	assert first_started.wait(5)
+
+	start = time.perf_counter()
+	_run_concurrently([lambda: batcher.run("key", _doubled(batch_sizes), np.zeros((1, 1))) for _ in range(2)])
+	elapsed = time.perf_counter() - start
+	release_first.set()
+	first.join(timeout = 10)
+
+	assert batch_sizes == [2]
+	assert elapsed < 1
+
+def test_exception_reaches_every_request_of_the_batch():
+	batcher = MicroBatcher(max_batch_size = 3, max_wait_ms = 5000)
+	errors = []
+	first_started = threading.Event()
+	release_first = threading.Event()
+
+	def slow(batch):
+		first_started.set()
+		release_first.wait(5)
+		return [batch]
+
+	def failing(batch):
+		raise RuntimeError("forward pass failed")
+
+	def run():
+		try:
+			batcher.run("key", failing, np.zeros((1, 1)))
+		except RuntimeError as error:
+			errors.append(error)
+
+	first = threading.Thread(target = batcher.run, args = ("key", slow, np.zeros((1, 1))))
+	first.start()
+	assert first_started.wait(5)
+
+	_run_concurrently([run for _ in range(3)])
+	release_first.set()
+	first.join(timeout = 10)
+
+	assert len(errors) == 3
+	assert all(str(error) == "forward pass failed" for error in errors)
+
+def test_keys_are_batched_separately():
+	batcher = MicroBatcher(max_batch_size = 8, max_wait_ms = 5)
+	batch_sizes = []
+
+	batcher.run("a", _doubled(batch_sizes), np.zeros((2, 1)))
+	batcher.run("b", _doubled(batch_sizes), np.zeros((3, 1)))
+
+	assert batch_sizes == [2, 3]
+
+def test_inputs_larger_than_max_batch_size_are_refused():
+	batcher = MicroBatcher(max_batch_size = 2, max_wait_ms = 5)
+
+	with pytest.raises(ValueError):
+		batcher.run("key", _doubled([]), np.zeros((3, 1)))
+
+@pytest.mark.parametrize("max_batch_size, expected", [
+	(1, [1]),
+	(2, [1, 2]),
+	(6, [1, 2, 4, 6]),
+	(8, [1, 2, 4, 8]),
+])
+def test_batch_sizes_up_to(max_batch_size, expected):
+	assert batch_sizes_up_to(max_batch_size) == expected
+
+@pytest.mark.parametrize("max_batch_size", [0, -1])
+def test_batch_sizes_up_to_refuses_sizes_below_one(max_batch_size):
+	with pytest.raises(ValueError):
+		batch_sizes_up_to(max_batch_size)
@@ -0,0 +1,58 @@
+import pytest
+
+from ganalyzer.model_cache import ModelCache
+
+class _Model:
+	def __init__(self, parameters):
+		self.parameters = parameters
+
+	def count_params(self):
+		return self.parameters
+
+def _checkpoint(tmp_path, name):
+	path = tmp_path / name
+	path.write_bytes(b"weights")
+	return str(path)
+
+def test_models_are_loaded_once(tmp_path):
+	cache = ModelCache(max_parameters = 100)
+	path = _checkpoint(tmp_path, "generator_epoch_0.keras")
+	loads = []
+
+	def loader(loaded_path):
+		loads.append(loaded_path)
+		return _Model(10)
+
+	assert cache.get(path, loader) is cache.get(path, loader)
+	assert len(loads) == 1
+	assert cache.stats()["hits"] == 1
+
+def test_least_recently_used_models_are_evicted_over_the_budget(tmp_path):
+	cache = ModelCache(max_parameters = 25)
+	paths = [_checkpoint(tmp_path, f"generator_epoch_{epoch}.keras") for epoch in range(3)]
+	first = cache.get(paths[0], lambda _: _Model(10))
+	cache.get(paths[1], lambda _: _Model(10))
+
+	# The first one is used again, the second is the one evicted for the third
+	assert cache.get(paths[0], lambda _: _Model(10)) is first
+	cache.get(paths[2], lambda _: _Model(10))
+
+	assert cache.stats()["evictions"] == 1
+	assert cache.stats()["parameters"] == 20
+	assert cache.get(paths[0], lambda _: _Model(10)) is first
+
+def test_failed_loads_do_not_leave_their_lock_behind(tmp_path):
+	cache = ModelCache(max_parameters = 100)
+	path = _checkpoint(tmp_path, "generator_epoch_0.keras")
+
+	def failing_loader(_):
+		raise OSError("corrupted checkpoint")
+
+	for _ in range(3):
+		with pytest.raises(OSError):
+			cache.get(path, failing_loader)
+
+	assert cache._loading_locks == {}
+	assert cache.stats()["entries"] == 0
+	assert cache.get(path, lambda _: _Model(10)).count_params() == 10
+	assert cache._loading_locks == {}
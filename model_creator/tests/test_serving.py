@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from ganalyzer.serving import BoundedExecutor, ServerBusy, SessionStore, SharedRegistry
+
+def test_executor_refuses_tasks_past_max_pending():
+	executor = BoundedExecutor(max_workers = 1, max_pending = 2)
+	release = threading.Event()
+	try:
+		running = executor.submit(release.wait)
+		waiting = executor.submit(release.wait)
+
+		with pytest.raises(ServerBusy):
+			executor.submit(release.wait)
+		assert executor.stats()["rejected"] == 1
+
+		release.set()
+		assert running.result(timeout = 5) and waiting.result(timeout = 5)
+	finally:
+		release.set()
+		executor.shutdown()
+
+def test_executor_frees_slots_of_finished_tasks():
+	executor = BoundedExecutor(max_workers = 1, max_pending = 1)
+	try:
+		assert executor.run(lambda value: value * 2, 21, timeout = 5) == 42
+		assert executor.run(lambda value: value + 1, 41, timeout = 5) == 42
+		assert executor.stats()["rejected"] == 0
+	finally:
+		executor.shutdown()
+
+def test_executor_slot_is_freed_when_the_task_raises():
+	executor = BoundedExecutor(max_workers = 1, max_pending = 1)
+
+	def fail():
+		raise RuntimeError("boom")
+
+	try:
+		with pytest.raises(RuntimeError):
+			executor.run(fail, timeout = 5)
+		assert executor.run(lambda: "ok", timeout = 5) == "ok"
+	finally:
+		executor.shutdown()
+
+def test_session_store_creates_one_state_per_id():
+	store = SessionStore(dict, max_sessions = 4)
+
+	assert store.get("a") is store.get("a")
+	assert store.get("a") is not store.get("b")
+	assert store.stats() == {"sessions": 2, "max_sessions": 4}
+
+def test_session_store_drops_least_recently_used():
+	store = SessionStore(object, max_sessions = 2)
+	first = store.get("a")
+	second = store.get("b")
+
+	# a is used again, so b is the least recently used one when c arrives
+	assert store.get("a") is first
+	store.get("c")
+
+	assert store.stats()["sessions"] == 2
+	assert store.get("a") is first
+	assert store.get("b") is not second
+
+def test_session_store_closes_dropped_sessions():
+	closed = []
+
+	class _Session:
+		def close(self):
+			closed.append(self)
+
+	store = SessionStore(_Session, max_sessions = 1)
+	first = store.get("a")
+	store.get("b")
+
+	assert closed == [first]
+
+def test_shared_registry_builds_one_object_per_key():
+	registry = SharedRegistry(lambda key: object())
+
+	first = registry.acquire("run")
+	assert registry.acquire("run") is first
+	assert registry.acquire("other") is not first
+	assert registry.stats() == {"entries": {"run": 2, "other": 1}, "builds": 2}
+
+def test_shared_registry_drops_objects_after_the_last_release():
+	registry = SharedRegistry(lambda key: object())
+	first = registry.acquire("run")
+	registry.acquire("run")
+
+	registry.release("run")
+	assert registry.acquire("run") is first
+	registry.release("run")
+	registry.release("run")
+
+	assert registry.stats()["entries"] == {}
+	assert registry.acquire("run") is not first
+
+def test_shared_registry_failed_builds_are_not_kept():
+	attempts = []
+
+	def factory(key):
+		attempts.append(key)
+		if len(attempts) == 1:
+			raise OSError("missing checkpoint")
+		return key
+
+	registry = SharedRegistry(factory)
+	with pytest.raises(OSError):
+		registry.acquire("run")
+
+	assert registry.stats() == {"entries": {}, "builds": 0}
+	assert registry.acquire("run") == "run"
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from ganalyzer.tensor_transport import compact_array, decode_tensors, encode_tensors
+
+def test_round_trip_keeps_names_dtypes_shapes_and_values():
+	tensors = {
+		"0) dense": np.arange(12, dtype = np.uint8).reshape(3, 4),
+		"1) conv": np.linspace(-1, 1, 24, dtype = np.float16).reshape(2, 3, 4),
+		"2) output": np.array([[1e6, -2.5]], dtype = np.float32),
+		"3) empty": np.zeros((0, 5), dtype = np.float32),
+	}
+
+	decoded = decode_tensors(encode_tensors(tensors))
+
+	assert list(decoded) == list(tensors)
+	for name, array in tensors.items():
+		assert decoded[name].dtype == array.dtype
+		assert decoded[name].shape == array.shape
+		np.testing.assert_array_equal(decoded[name], array)
+
+def test_encode_refuses_dtypes_not_compacted():
+	with pytest.raises(ValueError):
+		encode_tensors({"values": np.zeros(3, dtype = np.float64)})
+
+def test_generator_outputs_are_sent_as_uint8():
+	compacted = compact_array(np.array([-3.0, 0.4, 126.6, 254.0, 300.0]), "generator")
+
+	assert compacted.dtype == np.uint8
+	np.testing.assert_array_equal(compacted, [0, 0, 127, 254, 255])
+
+def test_discriminator_outputs_are_never_sent_as_uint8():
+	compacted = compact_array(np.array([0.0, 1.0, 255.0]), "discriminator")
+
+	assert compacted.dtype == np.float16
+	np.testing.assert_array_equal(compacted, [0.0, 1.0, 255.0])
+
+def test_values_out_of_the_float16_range_stay_float32():
+	compacted = compact_array(np.array([1.0, 70000.0, -1e9]), "discriminator")
+
+	assert compacted.dtype == np.float32
+	assert np.all(np.isfinite(compacted))
+	np.testing.assert_array_equal(compacted, [1.0, 70000.0, -1e9])
@@ -1,26 +1,37 @@
 from __future__ import annotations
 
+import argparse
+import contextlib
 import csv
+import os
 import shutil
 import time
-from collections import defaultdict
 from pathlib import Path
 import random
 from typing import Dict, Iterable, Mapping
 
-import cv2
 import numpy as np
 import tensorflow as tf
 from PIL import Image
 from keras.preprocessing.image import img_to_array
-from tensorflow import keras
 from tqdm import tqdm
 
-from config import (batch_size, dataset_path, latent_dimension_generator, rgb_images, sample_outputs_root_directory, save_train_epoch_every, statistics_file_path)
-from ganalyzer.misc import (get_current_epoch, get_discriminator_model_path_at_given_epoch, get_generator_model_path_at_given_epoch)
+from config import (add_settings_arguments, asynchronous_checkpointing, batch_size, checkpoint_max_to_keep, checkpoint_storage_format, checkpoint_queue_size, configure_from_arguments, distribution_strategy, dataset_loading_mode, ensure_directories, get_settings, mixed_precision_policy, number_of_cpu_replicas, number_of_epochs, profiler_trace_steps, rgb_images, save_train_epoch_every, shuffle_buffer_size, train_step_mode, training_metrics_split_step, training_threads)
+from ganalyzer.checkpoint_index import get_checkpoint_index
+from ganalyzer.checkpoint_writer import CheckpointWriter
+from ganalyzer.dataset_cache import list_dataset_images, load_or_build_dataset_cache, read_image
+from ganalyzer.misc import (get_current_epoch, get_model_path_at_given_epoch, get_saved_model_path, load_model)
 from ganalyzer.models import get_discriminator, get_generator
+from ganalyzer.run_metadata import write_run_metadata
+from ganalyzer.training_metrics import EpochProfiler, ProfilerTraceWindow, add_training_metrics_entry_to_file
+from ganalyzer.weights_snapshot import get_architecture_path, save_architecture, save_weights_snapshot
 
 SAMPLE_OUTPUT_PREFIX = "sample_output_epoch_"
+TRAIN_STEP_MODES = ("eager", "graph", "xla")
+DATASET_LOADING_MODES = ("in_memory", "streaming", "cache")
+MIXED_PRECISION_POLICIES = (None, "mixed_float16", "mixed_bfloat16")
+DISTRIBUTION_STRATEGIES = (None, "mirrored", "multi_worker_mirrored")
+STATISTICS_KEYS = ("median_real", "median_fake", "mean_real", "mean_fake", "gen_loss", "disc_loss")
 
 def save_train_images(generated_images):
 	for i in range(batch_size):
@@ -30,8 +41,9 @@ def save_train_images(generated_images):
 		Image.fromarray(this_img.astype(np.uint8), 'RGB').save(filename, format = 'PNG')
 		print(f"Image saved to {filename}")
 
-def _train_step(images, *, latent_dim, generator, discriminator, generator_optimizer, discriminator_optimizer, cross_entropy):
-	noise = tf.random.normal([batch_size, latent_dim], mean = 0.0, stddev = 1.0)
+def _compute_gradients(images, *, latent_dim, generator, discriminator, generator_optimizer, discriminator_optimizer, cross_entropy, noise_generator):
+	# Sized from the images so every replica generates as many fakes as it got real images
+	noise = noise_generator.normal([tf.shape(images)[0], latent_dim], mean = 0.0, stddev = 1.0)
 
 	with tf.GradientTape() as gen_tape, tf.GradientTape() as disc_tape:
 		generated_images = generator(noise, training = True)
@@ -44,71 +56,424 @@ def _train_step(images, *, latent_dim, generator, discriminator, generator_optim
 		gen_loss = generator_loss(fake_output, cross_entropy)
 		dis_loss = discriminator_loss(fake_output, real_output, cross_entropy)
 
-	gradients_of_generator = gen_tape.gradient(gen_loss, generator.trainable_variables)
-	gradients_of_discriminator = disc_tape.gradient(dis_loss, discriminator.trainable_variables)
+		scaled_gen_loss = _scale_loss(generator_optimizer, gen_loss)
+		scaled_dis_loss = _scale_loss(discriminator_optimizer, dis_loss)
+
+	gradients_of_generator = _unscale_gradients(generator_optimizer, gen_tape.gradient(scaled_gen_loss, generator.trainable_variables))
+	gradients_of_discriminator = _unscale_gradients(discriminator_optimizer, disc_tape.gradient(scaled_dis_loss, discriminator.trainable_variables))
+
+	return (gradients_of_generator, gradients_of_discriminator), (gen_loss, dis_loss, fake_output, real_output)
+
+def _apply_gradients(gradients, *, generator, discriminator, generator_optimizer, discriminator_optimizer):
+	gradients_of_generator, gradients_of_discriminator = gradients
 
 	generator_optimizer.apply_gradients(zip(gradients_of_generator, generator.trainable_variables))
 	discriminator_optimizer.apply_gradients(zip(gradients_of_discriminator, discriminator.trainable_variables))
 
-	return gen_loss, dis_loss, fake_output, real_output
+def _train_step(images, *, latent_dim, generator, discriminator, generator_optimizer, discriminator_optimizer, cross_entropy, noise_generator):
+	gradients, outputs = _compute_gradients(images, latent_dim = latent_dim, generator = generator, discriminator = discriminator, generator_optimizer = generator_optimizer, discriminator_optimizer = discriminator_optimizer, cross_entropy = cross_entropy, noise_generator = noise_generator)
+	_apply_gradients(gradients, generator = generator, discriminator = discriminator, generator_optimizer = generator_optimizer, discriminator_optimizer = discriminator_optimizer)
+
+	return outputs
+
+def _scale_loss(optimizer, loss):
+	if not isinstance(optimizer, tf.keras.mixed_precision.LossScaleOptimizer):
+		return loss
+
+	# tf.keras 2 names it get_scaled_loss, Keras 3 names it scale_loss
+	if hasattr(optimizer, "get_scaled_loss"):
+		return optimizer.get_scaled_loss(loss)
+	return optimizer.scale_loss(loss)
+
+def _unscale_gradients(optimizer, gradients):
+	# Keras 3 unscales inside apply_gradients and has no get_unscaled_gradients
+	if isinstance(optimizer, tf.keras.mixed_precision.LossScaleOptimizer) and hasattr(optimizer, "get_unscaled_gradients"):
+		return optimizer.get_unscaled_gradients(gradients)
+	return gradients
+
+def configure_mixed_precision(policy):
+	if policy not in MIXED_PRECISION_POLICIES:
+		raise ValueError(f"Unknown mixed precision policy: {policy}, expected one of {MIXED_PRECISION_POLICIES}")
+
+	tf.keras.mixed_precision.set_global_policy(policy or "float32")
+
+def _build_optimizer(policy):
+	optimizer = tf.keras.optimizers.RMSprop(learning_rate = 0.0001, clipvalue = 1.0)
+
+	# bfloat16 has the float32 exponent range, only float16 needs loss scaling
+	if policy == "mixed_float16":
+		return tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+	return optimizer
+
+def build_optimizers(policy):
+	return _build_optimizer(policy), _build_optimizer(policy)
+
+class BatchStatisticsAccumulator:
+	"""Running sums of the per-batch statistics, kept in variables so a batch never waits on the host."""
+
+	def __init__(self):
+		self.totals = {key: tf.Variable(0.0, dtype = tf.float64, trainable = False) for key in STATISTICS_KEYS}
+		self.batch_count = tf.Variable(0, dtype = tf.int64, trainable = False)
+		self.image_count = tf.Variable(0, dtype = tf.int64, trainable = False)
+
+	def update(self, gen_loss, dis_loss, fake_output, real_output):
+		batch_statistics = _collect_batch_statistics(gen_loss, dis_loss, fake_output, real_output)
+
+		for key in STATISTICS_KEYS:
+			self.totals[key].assign_add(tf.cast(batch_statistics[key], tf.float64))
+		self.batch_count.assign_add(1)
+		self.image_count.assign_add(tf.cast(tf.shape(real_output)[0], tf.int64))
+
+	def result(self):
+		running_totals = {key: float(self.totals[key].numpy()) for key in STATISTICS_KEYS}
+		return running_totals, int(self.batch_count.numpy())
+
+	def reset(self):
+		for total in self.totals.values():
+			total.assign(0.0)
+		self.batch_count.assign(0)
+		self.image_count.assign(0)
+
+class TrainingCheckpoint:
+	"""Models, optimizers, epoch counter and random state, saved with a tf.train.CheckpointManager."""
+
+	def __init__(self, generator, discriminator, generator_optimizer, discriminator_optimizer, directory = None, strategy = None):
+		for optimizer, model in ((generator_optimizer, generator), (discriminator_optimizer, discriminator)):
+			# Creates the optimizer slots now so a restore fills them immediately instead of on the first step
+			if hasattr(optimizer, "build"):
+				optimizer.build(model.trainable_variables)
+
+		self.epoch = tf.Variable(0, dtype = tf.int64, trainable = False)
+		self.data_seed = tf.Variable(random.randrange(2 ** 31), dtype = tf.int64, trainable = False)
+		self.noise_generator = tf.random.Generator.from_non_deterministic_state()
+
+		self.checkpoint = tf.train.Checkpoint(
+			generator = generator,
+			discriminator = discriminator,
+			generator_optimizer = generator_optimizer,
+			discriminator_optimizer = discriminator_optimizer,
+			epoch = self.epoch,
+			data_seed = self.data_seed,
+			noise_generator = self.noise_generator,
+		)
+
+		# Every worker takes part in the save, the ones that are not the chief write to their own directory and delete it afterwards
+		self.directory = str(directory or get_settings().training_checkpoints_directory)
+		self.is_chief = is_chief(strategy)
+		self.write_directory = self.directory if self.is_chief else worker_temporary_directory(self.directory, strategy)
+		self.manager = tf.train.CheckpointManager(self.checkpoint, self.write_directory, max_to_keep = checkpoint_max_to_keep)
+
+	def restore(self):
+		# Always from the checkpoints of the chief, the only ones kept
+		latest_checkpoint = tf.train.latest_checkpoint(self.directory)
+		if latest_checkpoint is None:
+			return False
+
+		print("==> Restoring training checkpoint : ", latest_checkpoint)
+		self.checkpoint.restore(latest_checkpoint).assert_existing_objects_matched()
+		return True
+
+	def save(self, next_epoch):
+		self.epoch.assign(next_epoch)
+		if self.is_chief:
+			self.manager.save(checkpoint_number = next_epoch, options = _checkpoint_options())
+			return
+
+		# Synchronous, the directory is removed right after
+		self.manager.save(checkpoint_number = next_epoch)
+		tf.io.gfile.rmtree(self.write_directory)
+
+	def seed_dataset_shuffling(self):
+		# The shuffle order then only depends on the saved seed and the epoch the run resumed from
+		tf.random.set_seed(int(self.data_seed.numpy()) + int(self.epoch.numpy()))
+
+def _checkpoint_options():
+	if not asynchronous_checkpointing:
+		return None
+
+	try:
+		return tf.train.CheckpointOptions(experimental_enable_async_checkpoint = True)
+	except TypeError:
+		# Older TensorFlow releases have no asynchronous checkpoints
+		return None
+
+def build_distribution_strategy(name, cpu_replicas = 1, gpu_replicas = None):
+	"""Returns None for single device training, must be called before TensorFlow initializes its devices.
+
+	"mirrored" uses the first gpu_replicas GPUs, every visible one when None, or cpu_replicas logical CPU devices without GPU.
+	"""
+	if name not in DISTRIBUTION_STRATEGIES:
+		raise ValueError(f"Unknown distribution strategy: {name}, expected one of {DISTRIBUTION_STRATEGIES}")
+
+	if name is None:
+		return None
+
+	if name == "multi_worker_mirrored":
+		# The local worker processes are described by the TF_CONFIG environment variable
+		return tf.distribute.MultiWorkerMirroredStrategy()
+
+	gpus = tf.config.list_physical_devices("GPU")
+	if gpus:
+		if gpu_replicas is None:
+			return tf.distribute.MirroredStrategy()
+		if gpu_replicas > len(gpus):
+			raise ValueError(f"{gpu_replicas} GPU replicas requested, only {len(gpus)} GPUs are visible")
+		return tf.distribute.MirroredStrategy(devices = [f"/gpu:{index}" for index in range(gpu_replicas)])
+
+	# Without GPUs, the CPU is split into logical devices that each hold one replica
+	cpu = tf.config.list_physical_devices("CPU")[0]
+	tf.config.set_logical_device_configuration(cpu, [tf.config.LogicalDeviceConfiguration() for _ in range(cpu_replicas)])
+	return tf.distribute.MirroredStrategy(devices = [device.name for device in tf.config.list_logical_devices("CPU")])
+
+def strategy_scope(strategy):
+	return contextlib.nullcontext() if strategy is None else strategy.scope()
+
+def _task_type_and_id(strategy):
+	# Only multi worker strategies have a cluster resolver
+	cluster_resolver = getattr(strategy, "cluster_resolver", None) if strategy is not None else None
+	if cluster_resolver is None:
+		return None, None
+	return cluster_resolver.task_type, cluster_resolver.task_id
+
+def is_chief(strategy):
+	"""Whether this process writes the files of the run, always true without a multi worker strategy."""
+	task_type, task_id = _task_type_and_id(strategy)
+	if task_type is None or task_type == "chief":
+		return True
+
+	# Without a chief task in TF_CONFIG, the first worker plays its role
+	has_chief_task = "chief" in strategy.cluster_resolver.cluster_spec().as_dict()
+	return not has_chief_task and task_type == "worker" and task_id == 0
+
+def worker_temporary_directory(directory, strategy):
+	_, task_id = _task_type_and_id(strategy)
+	return os.path.join(str(directory), f"worker_temp_{task_id}")
+
+def _merge_replica_results(strategy, per_replica_results):
+	gen_loss, dis_loss, fake_output, real_output = per_replica_results
+
+	# Each replica divided its loss by the global batch size, so the sum is the mean over the whole batch
+	return (
+		strategy.reduce(tf.distribute.ReduceOp.SUM, gen_loss, axis = None),
+		strategy.reduce(tf.distribute.ReduceOp.SUM, dis_loss, axis = None),
+		strategy.gather(fake_output, axis = 0),
+		strategy.gather(real_output, axis = 0),
+	)
 
-def train(current_epoch, dataset, cross_entropy, latent_dim, generator, discriminator, generator_optimizer, discriminator_optimizer):
-	epoch = current_epoch
-	pending_statistics = []
+def _build_split_train_step(mode, profiler, *, latent_dim, generator, discriminator, generator_optimizer, discriminator_optimizer, cross_entropy, statistics, noise_generator):
+	def compute_gradients(images):
+		return _compute_gradients(images, latent_dim = latent_dim, generator = generator, discriminator = discriminator, generator_optimizer = generator_optimizer, discriminator_optimizer = discriminator_optimizer, cross_entropy = cross_entropy, noise_generator = noise_generator)
 
-	while True:
-		print("==> current epoch : ", epoch)
+	def apply_gradients(gradients):
+		_apply_gradients(gradients, generator = generator, discriminator = discriminator, generator_optimizer = generator_optimizer, discriminator_optimizer = discriminator_optimizer)
 
-		start = time.time()
-		running_totals = defaultdict(float)
-		batch_count = 0
+	update_statistics = statistics.update if statistics is not None else None
+
+	if mode != "eager":
+		compute_gradients = tf.function(compute_gradients, jit_compile = mode == "xla")
+		apply_gradients = tf.function(apply_gradients, jit_compile = mode == "xla")
+		if update_statistics is not None:
+			update_statistics = tf.function(update_statistics)
+
+	def train_step(images):
+		# Reading a value back makes every phase wait for its own work instead of billing it to the next one
+		with profiler.phase("forward_backward"):
+			gradients, outputs = compute_gradients(images)
+			float(outputs[0])
+
+		with profiler.phase("optimizer_apply"):
+			apply_gradients(gradients)
+			int(discriminator_optimizer.iterations.numpy())
+
+		if update_statistics is not None:
+			with profiler.phase("statistics"):
+				update_statistics(*outputs)
+				int(statistics.batch_count.numpy())
+
+		return outputs
+
+	return train_step
+
+def build_train_step(mode, *, latent_dim, generator, discriminator, generator_optimizer, discriminator_optimizer, cross_entropy, statistics = None, noise_generator = None, strategy = None, profiler = None):
+	"""With a profiler, the step is compiled as separate gradient and optimizer functions so both can be timed."""
+	if mode not in TRAIN_STEP_MODES:
+		raise ValueError(f"Unknown train step mode: {mode}, expected one of {TRAIN_STEP_MODES}")
+
+	if noise_generator is None:
+		with strategy_scope(strategy):
+			noise_generator = tf.random.Generator.from_non_deterministic_state()
+
+	if profiler is not None:
+		if strategy is not None:
+			raise ValueError("Split train step timing is not supported with a distribution strategy")
+		return _build_split_train_step(mode, profiler, latent_dim = latent_dim, generator = generator, discriminator = discriminator, generator_optimizer = generator_optimizer, discriminator_optimizer = discriminator_optimizer, cross_entropy = cross_entropy, statistics = statistics, noise_generator = noise_generator)
+
+	def replica_step(images):
+		return _train_step(images, latent_dim = latent_dim, generator = generator, discriminator = discriminator, generator_optimizer = generator_optimizer, discriminator_optimizer = discriminator_optimizer, cross_entropy = cross_entropy, noise_generator = noise_generator)
+
+	def train_step(images):
+		if strategy is None:
+			gen_loss, dis_loss, fake_output, real_output = replica_step(images)
+		else:
+			gen_loss, dis_loss, fake_output, real_output = _merge_replica_results(strategy, strategy.run(replica_step, args = (images,)))
+
+		if statistics is not None:
+			statistics.update(gen_loss, dis_loss, fake_output, real_output)
 
-		for batch in dataset:
-			gen_loss, dis_loss, fake_output, real_output = _train_step(batch, latent_dim = latent_dim, generator = generator, discriminator = discriminator, generator_optimizer = generator_optimizer, discriminator_optimizer = discriminator_optimizer, cross_entropy = cross_entropy, )
+		return gen_loss, dis_loss, fake_output, real_output
 
-			batch_stats = _collect_batch_statistics(gen_loss, dis_loss, fake_output, real_output)
+	if mode == "eager":
+		return train_step
 
-			for key, value in batch_stats.items():
-				running_totals[key] += value
+	if strategy is not None:
+		# XLA can not compile strategy.run, reduce and gather, only the computation of each replica is compiled
+		if mode == "xla":
+			replica_step = tf.function(replica_step, jit_compile = True)
 
-			batch_count += 1
+		# Distributed batches are PerReplica values, their signature comes from the first call
+		return tf.function(train_step)
+
+	# The batch dimension stays unknown so the smaller last batch of an epoch does not trigger a retrace
+	image_shape = tuple(discriminator.inputs[0].shape[1:])
+	input_signature = [tf.TensorSpec(shape = (None, *image_shape), dtype = tf.float32)]
+
+	return tf.function(train_step, input_signature = input_signature, jit_compile = mode == "xla")
+
+def train(current_epoch, dataset, cross_entropy, latent_dim, generator, discriminator, generator_optimizer, discriminator_optimizer, training_checkpoint, strategy = None):
+	epoch = current_epoch
+	statistics = BatchStatisticsAccumulator()
+	profiler = EpochProfiler()
+
+	print("==> Train step mode : ", train_step_mode)
+	train_step = build_train_step(train_step_mode, latent_dim = latent_dim, generator = generator, discriminator = discriminator, generator_optimizer = generator_optimizer, discriminator_optimizer = discriminator_optimizer, cross_entropy = cross_entropy, statistics = statistics, noise_generator = training_checkpoint.noise_generator, strategy = strategy, profiler = profiler if training_metrics_split_step else None)
+
+	chief = is_chief(strategy)
+	checkpoint_writer = None
+	if asynchronous_checkpointing:
+		# Every worker copies the weights (a collective operation with several workers), only the chief writes them
+		save_function = (lambda gen, disc, saved_epoch: _write_models(gen, disc, saved_epoch, latent_dim)) if chief else _discard_models
+		checkpoint_writer = CheckpointWriter(generator, discriminator, save_function, max_pending = checkpoint_queue_size)
+
+	trace_window = ProfilerTraceWindow(get_settings().profiler_trace_directory, profiler_trace_steps if chief else None)
+
+	try:
+		_train_epochs(epoch, dataset, train_step, statistics, profiler, trace_window, generator, discriminator, latent_dim, checkpoint_writer, training_checkpoint, strategy)
+	finally:
+		trace_window.close()
+		if checkpoint_writer is not None:
+			print("==> Waiting for pending checkpoints")
+			checkpoint_writer.close()
+
+def _train_epochs(epoch, dataset, train_step, statistics, profiler, trace_window, generator, discriminator, latent_dim, checkpoint_writer, training_checkpoint, strategy = None):
+	chief = is_chief(strategy)
+	pending_statistics = []
+	global_step = 0
+
+	while number_of_epochs is None or epoch <= number_of_epochs:
+		print("==> current epoch : ", epoch)
+
+		start = time.time()
+		profiler.reset()
+		statistics.reset()
+
+		batches = iter(dataset)
+		while True:
+			with profiler.phase("data_loading"):
+				batch = next(batches, None)
+			if batch is None:
+				break
+
+			trace_window.before_step(global_step)
+			with profiler.phase("train_step"):
+				train_step(batch)
+			trace_window.after_step(global_step)
+			global_step += 1
+
+		# Reading the totals waits for the last step, so the epoch time still covers all the work
+		with profiler.phase("statistics"):
+			running_totals, batch_count = statistics.result()
 
 		time_taken = float(np.round(time.time() - start, 2))
 		print("===> Time taken : ", time_taken)
+		if time_taken > 0:
+			print("===> Steps per second : ", round(batch_count / time_taken, 2))
 
 		averaged_stats = _average_statistics(running_totals, batch_count)
 		averaged_stats["time"] = time_taken
 		pending_statistics.append((epoch, averaged_stats))
 
-		if _should_save_models(epoch):
-			_save_models(generator, discriminator, epoch, latent_dim)
-			add_statistics_entries_to_file(pending_statistics)
+		if _should_save_models(epoch) or epoch == number_of_epochs:
+			with profiler.phase("checkpointing"):
+				_save_models(generator, discriminator, epoch, latent_dim, checkpoint_writer, strategy)
+				training_checkpoint.save(epoch + 1)
+			if chief:
+				add_statistics_entries_to_file(pending_statistics)
 			pending_statistics.clear()
 
+		if chief:
+			add_training_metrics_entry_to_file(get_settings().training_metrics_file_path, epoch, profiler.summary(int(statistics.image_count.numpy())))
+
 		epoch += 1
 
 def _should_save_models(epoch):
 	return epoch == 0 or epoch % save_train_epoch_every == 0
 
-def _save_models(generator, discriminator, epoch, latent_dim):
+def _save_models(generator, discriminator, epoch, latent_dim, checkpoint_writer = None, strategy = None):
+	if checkpoint_writer is not None:
+		print("===> queueing models for saving")
+		checkpoint_writer.submit(generator, discriminator, epoch)
+		return
+
+	if is_chief(strategy):
+		_write_models(generator, discriminator, epoch, latent_dim)
+		return
+
+	# Saving reads the variables of every worker, so the others save the same way then delete what they wrote
+	temporary_directory = worker_temporary_directory(get_settings().model_path, strategy)
+	_write_models(generator, discriminator, epoch, latent_dim, os.path.join(temporary_directory, "models"), os.path.join(temporary_directory, "sample_outputs"), record_index = False)
+	shutil.rmtree(temporary_directory, ignore_errors = True)
+
+def _discard_models(generator, discriminator, epoch):
+	pass
+
+def _write_models(generator, discriminator, epoch, latent_dim, models_dir = None, samples_dir = None, record_index = True):
 	print("===> saving models")
-	generator.save(get_generator_model_path_at_given_epoch(epoch))
-	discriminator.save(get_discriminator_model_path_at_given_epoch(epoch))
-	save_generator_samples(generator, epoch, latent_dim)
+	models_dir = models_dir or get_settings().models_directory
+	os.makedirs(models_dir, exist_ok = True)
+	generator_path = get_model_path_at_given_epoch("generator", epoch, models_dir)
+	discriminator_path = get_model_path_at_given_epoch("discriminator", epoch, models_dir)
+
+	if checkpoint_storage_format == "weights":
+		for model, model_type, path in ((generator, "generator", generator_path), (discriminator, "discriminator", discriminator_path)):
+			save_architecture(model, get_architecture_path(models_dir, model_type))
+			save_weights_snapshot(model, path)
+	else:
+		generator.save(generator_path)
+		discriminator.save(discriminator_path)
 
-def _collect_batch_statistics(gen_loss, dis_loss, fake_output, real_output):
-	real_output_np = real_output.numpy()
-	fake_output_np = fake_output.numpy()
+	if record_index:
+		checkpoint_index = get_checkpoint_index(models_dir)
+		checkpoint_index.record("generator", epoch, generator_path, generator.count_params())
+		checkpoint_index.record("discriminator", epoch, discriminator_path, discriminator.count_params())
 
+	save_generator_samples(generator, epoch, latent_dim, root_directory = samples_dir)
+
+def _collect_batch_statistics(gen_loss, dis_loss, fake_output, real_output):
 	return {
-		"median_real": float(np.median(real_output_np)),
-		"median_fake": float(np.median(fake_output_np)),
-		"mean_real": float(np.mean(real_output_np)),
-		"mean_fake": float(np.mean(fake_output_np)),
-		"gen_loss": float(gen_loss.numpy()),
-		"disc_loss": float(dis_loss.numpy()),
+		"median_real": _batch_median(real_output),
+		"median_fake": _batch_median(fake_output),
+		"mean_real": tf.reduce_mean(real_output),
+		"mean_fake": tf.reduce_mean(fake_output),
+		"gen_loss": gen_loss,
+		"disc_loss": dis_loss,
 	}
 
+def _batch_median(values):
+	# Same definition as np.median: mean of the two middle values when the count is even
+	sorted_values = tf.sort(tf.reshape(values, [-1]))
+	count = tf.size(sorted_values)
+	return (sorted_values[(count - 1) // 2] + sorted_values[count // 2]) / 2
+
 def _average_statistics(running_totals, batch_count):
 	if batch_count == 0:
 		return dict(running_totals)
@@ -119,7 +484,7 @@ def add_statistics_entries_to_file(entries):
 	if not entries:
 		return
 
-	statistics_path = Path(statistics_file_path)
+	statistics_path = Path(get_settings().statistics_file_path)
 	statistics_path.parent.mkdir(parents = True, exist_ok = True)
 
 	file_exists = statistics_path.exists()
@@ -134,25 +499,26 @@ def add_statistics_entries_to_file(entries):
 		for epoch, new_stats in entries:
 			writer.writerow([str(epoch), *[new_stats[key] for key in headers]])
 
+def build_cross_entropy():
+	# Per example losses, averaged by compute_average_loss over the global batch of every replica
+	return tf.keras.losses.BinaryCrossentropy(from_logits = False, reduction = "none")
+
 def generator_loss(fake_output, cross_entropy):
-	return cross_entropy(tf.ones_like(fake_output), fake_output)
+	return tf.nn.compute_average_loss(cross_entropy(tf.ones_like(fake_output), fake_output))
 
 def discriminator_loss(fake_output, real_output, cross_entropy):
-	fake_loss = cross_entropy(tf.zeros_like(fake_output), fake_output)
-	real_loss = cross_entropy(tf.ones_like(real_output), real_output)
+	fake_loss = tf.nn.compute_average_loss(cross_entropy(tf.zeros_like(fake_output), fake_output))
+	real_loss = tf.nn.compute_average_loss(cross_entropy(tf.ones_like(real_output), real_output))
 	return fake_loss + real_loss
 
 def get_dataset():
-	dataset_directory = Path(dataset_path)
+	dataset_directory = Path(get_settings().dataset_path)
 	if not dataset_directory.exists():
 		raise FileNotFoundError(f"Dataset path does not exist: {dataset_directory}")
 
 	dataset = []
 
-	for image_path in tqdm(sorted(dataset_directory.iterdir())):
-		if not image_path.is_file():
-			continue
-
+	for image_path in tqdm(list_dataset_images(dataset_directory)):
 		current_image = _load_image(image_path)
 		dataset.append(img_to_array(current_image))
 
@@ -162,19 +528,83 @@ def get_dataset():
 	return np.stack(dataset, axis = 0)
 
 def _load_image(image_path):
-	read_mode = cv2.IMREAD_COLOR if rgb_images else cv2.IMREAD_GRAYSCALE
-	image = cv2.imread(str(image_path), read_mode)
-	if image is None:
-		raise ValueError(f"Failed to load image: {image_path}")
+	image = read_image(image_path, rgb_images).astype("float32")
+	return (image - 127.5) / 127.5
 
-	if rgb_images:
-		image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+def get_streaming_dataset():
+	dataset_directory = Path(get_settings().dataset_path)
+	if not dataset_directory.exists():
+		raise FileNotFoundError(f"Dataset path does not exist: {dataset_directory}")
 
-	image = image.astype("float32")
-	return (image - 127.5) / 127.5
+	image_paths = [str(path) for path in list_dataset_images(dataset_directory)]
+	if not image_paths:
+		raise ValueError(f"No images found in dataset path {dataset_directory}")
+
+	# Only the file names are shuffled in full, the decoded images go through a bounded buffer
+	return (
+		tf.data.Dataset.from_tensor_slices(image_paths)
+		.shuffle(buffer_size = len(image_paths), reshuffle_each_iteration = True)
+		.map(_decode_image, num_parallel_calls = tf.data.AUTOTUNE)
+		.shuffle(buffer_size = shuffle_buffer_size, reshuffle_each_iteration = True)
+		.batch(batch_size)
+		.prefetch(tf.data.AUTOTUNE)
+	)
+
+def _decode_image(image_path):
+	channels = 3 if rgb_images else 1
+	image = tf.io.decode_image(tf.io.read_file(image_path), channels = channels, expand_animations = False)
+	image_size = int(get_settings().dataset_dimension)
+	image = tf.ensure_shape(image, (image_size, image_size, channels))
+
+	return _normalize_images(image)
 
-def save_generator_samples(generator, epoch, latent_dim, num_samples = 20):
-	root_directory = Path(sample_outputs_root_directory)
+def _normalize_images(images):
+	images = tf.cast(images, tf.float32)
+	return (images - 127.5) / 127.5
+
+def get_cached_dataset():
+	images = load_or_build_dataset_cache(get_settings().dataset_path, rgb_images)
+	image_count = len(images)
+	print(f"==> Dataset cache : {image_count} images of shape {images.shape[1:]}")
+
+	def gather_images(indices):
+		# Sorted indices keep the reads in file order, the order inside a batch does not matter
+		return images[np.sort(indices)]
+
+	def load_batch(indices):
+		batch = tf.numpy_function(gather_images, [indices], tf.uint8)
+		return tf.ensure_shape(batch, (None, *images.shape[1:]))
+
+	# Only the indices are shuffled, the uint8 images stay memory-mapped and are normalized per batch
+	return (
+		tf.data.Dataset.range(image_count)
+		.shuffle(buffer_size = image_count, reshuffle_each_iteration = True)
+		.batch(batch_size)
+		.map(load_batch, num_parallel_calls = tf.data.AUTOTUNE)
+		.map(_normalize_images, num_parallel_calls = tf.data.AUTOTUNE)
+		.prefetch(tf.data.AUTOTUNE)
+	)
+
+def get_dataset_batches():
+	if dataset_loading_mode == "streaming":
+		return get_streaming_dataset()
+
+	if dataset_loading_mode == "cache":
+		return get_cached_dataset()
+
+	if dataset_loading_mode == "in_memory":
+		dataset = get_dataset()
+		return (
+			tf.data.Dataset.from_tensor_slices(dataset)
+			.shuffle(buffer_size = len(dataset), reshuffle_each_iteration = True)
+			.batch(batch_size)
+			.prefetch(tf.data.AUTOTUNE)
+		)
+
+	raise ValueError(f"Unknown dataset loading mode: {dataset_loading_mode}, expected one of {DATASET_LOADING_MODES}")
+
+def save_generator_samples(generator, epoch, latent_dim, num_samples = 20, root_directory = None):
+	root_directory = Path(root_directory or get_settings().sample_outputs_root_directory)
 	target_directory = root_directory / f"{SAMPLE_OUTPUT_PREFIX}{epoch:04d}"
 
 	_cleanup_previous_samples(root_directory, keep = target_directory)
@@ -210,34 +640,56 @@ def _array_to_pil_image(image_array):
 	return Image.fromarray(image_array, mode = "RGB")
 
 def launch_training() -> None:
+	settings = get_settings()
+	ensure_directories(settings.models_directory, settings.sample_outputs_root_directory)
 	current_epoch = get_current_epoch()
-	print("==> will start from epoch  : ", current_epoch)
 
-	dataset = get_dataset()
+	if training_threads is not None:
+		print("==> Training threads : ", training_threads)
+		tf.config.threading.set_intra_op_parallelism_threads(training_threads)
+		tf.config.threading.set_inter_op_parallelism_threads(min(2, training_threads))
+
+	print("==> Distribution strategy : ", distribution_strategy)
+	strategy = build_distribution_strategy(distribution_strategy, number_of_cpu_replicas)
+	if strategy is not None:
+		print("==> Number of replicas : ", strategy.num_replicas_in_sync)
+
+	print("==> Mixed precision policy : ", mixed_precision_policy)
+	configure_mixed_precision(mixed_precision_policy)
+
+	has_training_checkpoint = tf.train.latest_checkpoint(settings.training_checkpoints_directory) is not None
+
+	with strategy_scope(strategy):
+		if current_epoch == 0 or has_training_checkpoint:
+			print("==> Creating models")
+			generator = get_generator()
+			discriminator = get_discriminator()
+		else:
+			# Runs saved before training checkpoints existed only have the .keras files, without optimizer state
+			print("==> Loading latest models")
+			discriminator = load_model(get_saved_model_path("discriminator", current_epoch), cached = False)
+			generator = load_model(get_saved_model_path("generator", current_epoch), cached = False)
+
+		generator.summary()
+		discriminator.summary()
+		if is_chief(strategy):
+			write_run_metadata(settings.model_path, model_name = settings.model_name, image_size = settings.dataset_dimension, latent_dim = settings.latent_dimension_generator, generator = generator, discriminator = discriminator)
+
+		generator_optimizer, discriminator_optimizer = build_optimizers(mixed_precision_policy)
+
+		training_checkpoint = TrainingCheckpoint(generator, discriminator, generator_optimizer, discriminator_optimizer, strategy = strategy)
+		if training_checkpoint.restore():
+			current_epoch = int(training_checkpoint.epoch.numpy())
+		else:
+			training_checkpoint.epoch.assign(current_epoch)
 
-	dataset_batches = (
-		tf.data.Dataset.from_tensor_slices(dataset)
-		.shuffle(buffer_size = len(dataset), reshuffle_each_iteration = True)
-		.batch(batch_size)
-		.prefetch(tf.data.AUTOTUNE)
-	)
-
-	if current_epoch == 0:
-		print("==> Creating models")
-		generator = get_generator()
-		discriminator = get_discriminator()
-	else:
-		print("==> Loading latest models")
-		discriminator = keras.models.load_model(get_discriminator_model_path_at_given_epoch(current_epoch))
-		generator = keras.models.load_model(get_generator_model_path_at_given_epoch(current_epoch))
-
-	generator.summary()
-	discriminator.summary()
+	print("==> will start from epoch  : ", current_epoch)
+	training_checkpoint.seed_dataset_shuffling()
 
-	generator_optimizer = tf.keras.optimizers.RMSprop(learning_rate = 0.0001, clipvalue = 1.0)
-	discriminator_optimizer = tf.keras.optimizers.RMSprop(learning_rate = 0.0001, clipvalue = 1.0)
+	print("==> Dataset loading mode : ", dataset_loading_mode)
+	dataset_batches = get_dataset_batches()
 
-	cross_entropy = tf.keras.losses.BinaryCrossentropy(from_logits = False)
+	cross_entropy = build_cross_entropy()
 
 	cardinality = tf.data.experimental.cardinality(dataset_batches).numpy()
 	if cardinality < 0:
@@ -245,7 +697,16 @@ def launch_training() -> None:
 	else:
 		print(f"==> Number of batches : {int(cardinality)}")
 
-	train(current_epoch, dataset_batches, cross_entropy, latent_dimension_generator, generator, discriminator, generator_optimizer, discriminator_optimizer)
+	if strategy is not None:
+		dataset_batches = strategy.experimental_distribute_dataset(dataset_batches)
 
-if __name__ == "__main__":
+	train(current_epoch, dataset_batches, cross_entropy, settings.latent_dimension_generator, generator, discriminator, generator_optimizer, discriminator_optimizer, training_checkpoint, strategy)
+
+def main():
+	parser = argparse.ArgumentParser(description = "Train the GAN of the configured run, resuming from its latest checkpoint.")
+	add_settings_arguments(parser)
+	configure_from_arguments(parser.parse_args())
 	launch_training()
+
+if __name__ == "__main__":
+	main()
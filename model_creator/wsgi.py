@@ -0,0 +1,12 @@
+"""WSGI entry point of the web GUI.
+
+	waitress :  python serve_web_GUI.py
+	gunicorn :  gunicorn --workers 1 --threads 8 wsgi:app
+
+Sessions live in the memory of the worker process, with several gunicorn workers the clients need
+session affinity (e.g. a proxy hashing X-Session-Id) so that a session always reaches the same worker.
+"""
+
+from ganalyzer.GUIWebPage import create_app
+
+app = create_app()
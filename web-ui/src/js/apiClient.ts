@@ -12,9 +12,19 @@ type ChangeEpochResponse = {
 
 export default class ApiClient {
     baseUrl: string;
+    sessionId: string;
 
     constructor(baseUrl: string) {
         this.baseUrl = baseUrl;
+        // One server side session (run, epochs) per tab
+        this.sessionId = crypto.randomUUID();
+    }
+
+    headers(): Record<string, string> {
+        return {
+            "Content-Type": "application/json",
+            "X-Session-Id": this.sessionId,
+        };
     }
 
     async synchronizeServer(modelName: string, latentSpaceSize: number): Promise<SyncServerResponse | null> {
@@ -22,9 +32,7 @@ export default class ApiClient {
         try {
             const response = await fetch(`${this.baseUrl}/sync-server`, {
                 method: "POST",
-                headers: {
-                    "Content-Type": "application/json",
-                },
+                headers: this.headers(),
                 body: JSON.stringify({
                     model_size: modelName,
                     latent_space_size: latentSpaceSize,
@@ -48,9 +56,7 @@ export default class ApiClient {
             //console.log(shape(input_data))
             const response = await fetch(`${this.baseUrl}/get-model-prediction`, {
                 method: "POST",
-                headers: {
-                    "Content-Type": "application/json",
-                },
+                headers: this.headers(),
                 body: JSON.stringify({
                     input_data: input_data,
                     which_model: which_model,
@@ -73,9 +79,7 @@ export default class ApiClient {
         try {
             const response = await fetch(`${this.baseUrl}/change-epoch`, {
                 method: "POST",
-                headers: {
-                    "Content-Type": "application/json",
-                },
+                headers: this.headers(),
                 body: JSON.stringify({
                     new_epoch: newEpoch,
                     which_model: modelType,